@@ -0,0 +1,160 @@
+"""Simulaciones por lotes sin interfaz: ``POST /api/simulations/batch`` y ``flask simulate-batch``.
+
+Los elementos (proyectos o variables en línea, ya preparados por la
+aplicación) se reparten en un pool de procesos propio, separado de la cola de
+la web, y se devuelven según terminan. Los reportes de los proyectos se
+guardan por grupos: ``BATCH_COMMIT_SIZE`` reportes o ``BATCH_COMMIT_SECONDS``
+segundos por transacción, con un solo flush que inserta todas las filas del
+grupo en lotes. Los elementos en línea no tienen proyecto y no se guardan.
+Si el cliente se desconecta, los reportes ya simulados se guardan igualmente
+y los elementos que no habían empezado se cancelan.
+"""
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cache import result_cache
+from jobs import build_simulation_report, store_charts
+from metrics import metrics
+from models import db
+from utils import simulate_monte_carlo
+
+
+def _run_item(variables, options, timeout):
+    # Dentro del pool: el plazo cuenta desde que empieza la simulación, no desde que se encoló
+    started = time.perf_counter()
+    results = simulate_monte_carlo(variables, deadline=time.time() + timeout, **options)
+    return results, time.perf_counter() - started
+
+
+def _line(item, status, **fields):
+    project = item.get("project")
+    return dict({"index": item["index"], "project_id": project.id if project is not None else None,
+                 "name": item.get("name"), "status": status}, **fields)
+
+
+def _outputs(results):
+    return {"summary": results.get("summary", {}),
+            "outputs": [output["summary"] for output in results.get("outputs") or []]}
+
+
+class BatchRunner:
+    """Pool de procesos para lotes; se crea en el primer uso, como la cola de simulaciones."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("BATCH_POOL_SIZE", 2)
+        app.config.setdefault("BATCH_COMMIT_SIZE", 50)
+        app.config.setdefault("BATCH_COMMIT_SECONDS", 2)
+        app.config.setdefault("BATCH_MAX_ITEMS", 1000)
+        app.config.setdefault("SIM_JOB_TIMEOUT", 300)
+        self.app = app
+        app.extensions["batch_runner"] = self
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._executor is None:
+                ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.app.config["BATCH_POOL_SIZE"], mp_context=ctx)
+                atexit.register(self.shutdown)
+        return self._executor
+
+    def run(self, items):
+        """Ejecuta ``items`` y produce un dict por elemento según termina y uno final con el resumen.
+
+        Cada elemento trae ``index``, ``name``, ``project`` (o None),
+        ``variables``, ``options`` y ``cache_key``, o ``error`` si no se pudo
+        preparar. Necesita contexto de aplicación.
+        """
+        started = time.perf_counter()
+        totals = {"total": len(items), "done": 0, "failed": 0, "cached": 0}
+        futures, ready = {}, []
+        try:
+            for item in items:
+                if item.get("error"):
+                    totals["failed"] += 1
+                    yield _line(item, "failed", error=item["error"])
+                    continue
+                cached = result_cache.get(item["cache_key"]) if item["project"] is not None else None
+                if cached is not None:
+                    ready.append((item, cached, 0.0, True))
+                    continue
+                future = self._ensure_started().submit(_run_item, item["variables"], item["options"],
+                                                       self.app.config["SIM_JOB_TIMEOUT"])
+                futures[future] = item
+
+            last_commit = time.monotonic()
+            while futures or ready:
+                done = ()
+                if futures:
+                    done, _ = wait(futures, timeout=self.app.config["BATCH_COMMIT_SECONDS"],
+                                   return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = futures.pop(future)
+                    try:
+                        results, seconds = future.result()
+                    except Exception as e:
+                        totals["failed"] += 1
+                        yield _line(item, "failed", error=str(e))
+                        continue
+                    metrics.observe_stages(results.get("timings"))
+                    if item["project"] is None:
+                        totals["done"] += 1
+                        yield _line(item, "done", cached=False, report_id=None, seconds=round(seconds, 3),
+                                    **_outputs(results))
+                    else:
+                        ready.append((item, results, seconds, False))
+                due = time.monotonic() - last_commit >= self.app.config["BATCH_COMMIT_SECONDS"]
+                if ready and (not futures or due or len(ready) >= self.app.config["BATCH_COMMIT_SIZE"]):
+                    # `ready` se vacía antes de ceder: si el cliente se va a mitad, el grupo no se guarda dos veces
+                    lines, ready, last_commit = self._persist(ready), [], time.monotonic()
+                    for line in lines:
+                        totals[line["status"]] += 1
+                        totals["cached"] += bool(line.get("cached"))
+                        yield line
+        finally:
+            # Cliente desconectado o error: lo que no empezó no se ejecuta y lo ya simulado se guarda igualmente
+            for future in futures:
+                future.cancel()
+            for future, item in futures.items():
+                if item["project"] is not None and future.done() and not future.cancelled() and not future.exception():
+                    ready.append((item, *future.result(), False))
+            if ready:
+                self._persist(ready)
+        yield {"batch": dict(totals, seconds=round(time.perf_counter() - started, 3))}
+
+    def _persist(self, ready):
+        # Un grupo = una transacción: reportes y resultados se insertan en el mismo flush
+        try:
+            with metrics.timer("simulation_stage_seconds", stage="persist"):
+                stored = [(item, store_charts(results), seconds, cached) for item, results, seconds, cached in ready]
+                # Sin autoflush mientras se construyen: ninguna fila se inserta antes del flush del grupo
+                with db.session.no_autoflush:
+                    reports = [build_simulation_report(item["project"], results) for item, results, _, _ in stored]
+                    db.session.add_all(reports)
+                db.session.flush()
+                for item, results, _, cached in stored:
+                    if not cached:
+                        result_cache.put(item["cache_key"], item["project"].id, results)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return [_line(item, "failed", error=f"Error guardando resultados: {e}") for item, *_ in ready]
+        return [_line(item, "done", cached=cached, report_id=report.id, seconds=round(seconds, 3), **_outputs(results))
+                for (item, results, seconds, cached), report in zip(stored, reports)]
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+
+
+batch_runner = BatchRunner()
@@ -0,0 +1,310 @@
+"""Benchmarks del motor, los gráficos, la vista de reporte y las exportaciones.
+
+    python benchmark.py                      # suite "quick", compara con el historial
+    python benchmark.py --suite full         # hasta 1e8 iteraciones y 200 variables
+    python benchmark.py --filter engine --repeat 3 --threshold 0.15
+
+Cada caso se ejecuta en un proceso nuevo (spawn) para que el pico de RSS sea
+solo suyo; se registra el tiempo de pared (el mínimo de ``--repeat``), el pico
+de RSS del proceso y el pico de memoria reservada según ``tracemalloc`` (numpy
+informa sus buffers a tracemalloc). Los resultados se añaden al historial JSON
+(``--history``) y el script termina con código 1 si algún caso empeora más de
+``--threshold`` (fracción) respecto a la mediana de las últimas ``--baseline``
+ejecuciones. Un caso cuya dependencia opcional no se puede cargar se
+omite; cualquier otro fallo se registra como error y también termina con
+código 1. Funciona sin red contra una base SQLite temporal.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY = os.path.join(APP_DIR, "instance", "benchmarks.json")
+DEFAULT_THRESHOLD = float(os.environ.get("BENCH_THRESHOLD") or 0.25)
+# Métricas que se comparan con el historial (el RSS depende demasiado del sistema)
+CHECKED_METRICS = ("wall_seconds", "alloc_peak_mb")
+# Por debajo de esto el ruido del reloj domina: no se marca como regresión
+MIN_WALL_SECONDS = 0.05
+
+_DISTRIBUTIONS = [
+    ("normal", {"mean": 50, "std": 15}),
+    ("uniform", {"low": 0, "high": 100}),
+    ("triangular", {"left": 10, "mode": 50, "right": 90}),
+    ("lognormal", {"mu": 0, "sigma": 0.5}),
+]
+
+
+def _variables(count):
+    return [{"name": f"v{i}", "distribution": _DISTRIBUTIONS[i % len(_DISTRIBUTIONS)][0],
+             "params": _DISTRIBUTIONS[i % len(_DISTRIBUTIONS)][1]} for i in range(count)]
+
+
+def _engine_cases(suite):
+    grid = [(1_000, 1), (1_000, 10), (1_000, 200),
+            (100_000, 1), (100_000, 10), (100_000, 200),
+            (1_000_000, 1), (1_000_000, 10)]
+    if suite == "full":
+        grid += [(1_000_000, 200), (10_000_000, 1), (10_000_000, 10), (10_000_000, 200),
+                 (100_000_000, 1), (100_000_000, 10), (100_000_000, 200)]
+    return {f"engine/{iterations:.0e}x{count}": ("engine", {"iterations": iterations, "variables": count})
+            for iterations, count in grid}
+
+
+def cases(suite):
+    """Nombre -> (tipo, parámetros) de los casos de la suite."""
+    selected = _engine_cases(suite)
+    selected.update({
+        "engine/lhs-1e+06x10": ("engine", {"iterations": 1_000_000, "variables": 10, "sampling": "lhs"}),
+        "engine/sensitivity-1e+05x10": ("engine", {"iterations": 100_000, "variables": 10, "sensitivity": True}),
+        "charts/histogram": ("charts", {"kind": "histogram"}),
+        "charts/tornado": ("charts", {"kind": "tornado"}),
+        "report/view": ("report", {}),
+        "export/pdf": ("export", {"format": "pdf"}),
+        "export/docx": ("export", {"format": "docx"}),
+    })
+    return selected
+
+
+# --- casos (se ejecutan en el proceso hijo) ---------------------------------------------------
+
+def _bench_engine(params):
+    from utils import simulate_monte_carlo
+
+    variables = _variables(params["variables"])
+    return lambda: simulate_monte_carlo(variables, params["iterations"], seed=1, render_charts=False,
+                                        sampling=params.get("sampling", "random"),
+                                        sensitivity=params.get("sensitivity", False))
+
+
+def _bench_charts(params):
+    from utils import render_histogram_png, render_tornado_png, simulate_monte_carlo
+
+    results = simulate_monte_carlo(_variables(10), 20_000, seed=1, render_charts=False, sensitivity=True)
+    if params["kind"] == "histogram":
+        histogram = results["histogram"]
+        run = lambda: render_histogram_png(histogram["counts"], histogram["edges"])
+    else:
+        run = lambda: render_tornado_png(results["sensitivity"])
+    # matplotlib se importa en el primer gráfico: fuera de la medición
+    run()
+    return run
+
+
+def _bench_report(params):
+    from app import app
+
+    client = app.test_client()
+    client.post("/login", data={"email": _BENCH_USER, "password": _BENCH_PASSWORD})
+    report_id = os.environ["BENCH_REPORT_ID"]
+
+    def run():
+        response = client.get(f"/reports/{report_id}")
+        if response.status_code != 200:
+            raise RuntimeError(f"/reports/{report_id} devolvió {response.status_code}")
+        return response.data
+    return run
+
+
+def _bench_export(params):
+    from flask import render_template
+
+    from app import app
+    from exports import _render_docx, _render_pdf
+    from models import Report, db
+    from storage import artifact_store
+
+    def chart_src(key):
+        # Como en la descarga real: los gráficos se leen del almacén por ruta local
+        return "file://" + os.path.abspath(artifact_store.local_path(key))
+
+    # Las dependencias opcionales se cargan al preparar el caso para que su ausencia lo omita
+    if params["format"] == "pdf":
+        import weasyprint  # noqa: F401
+    else:
+        import docx  # noqa: F401
+    with app.app_context(), app.test_request_context():
+        report = db.session.get(Report, int(os.environ["BENCH_REPORT_ID"]))
+        if params["format"] == "pdf":
+            html = render_template("report_pdf.html", report=report, chart_src=chart_src)
+            return lambda: _render_pdf(html, APP_DIR)
+        data = {"name": report.name, "project": report.project.name, "created_at": str(report.created_at),
+                "summary": report.results.get("summary", {})}
+        return lambda: _render_docx(data)
+
+
+_BENCHES = {"engine": _bench_engine, "charts": _bench_charts, "report": _bench_report, "export": _bench_export}
+_BENCH_USER = "bench@example.com"
+_BENCH_PASSWORD = "bench"
+
+
+def _run_case(kind, params, repeat):
+    """Prepara el caso, lo ejecuta ``repeat`` veces y devuelve sus métricas.
+
+    Solo un ``ImportError``/``OSError`` al preparar el caso lo omite; los demás errores se propagan.
+    """
+    try:
+        run = _BENCHES[kind](params)
+    except (ImportError, OSError) as e:
+        # Dependencia opcional ausente (p. ej. WeasyPrint sin pango, que falla con OSError)
+        return {"skipped": f"{e.__class__.__name__}: {e}"}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    walls, alloc_peak = [], 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        run()
+        walls.append(time.perf_counter() - started)
+        alloc_peak = max(alloc_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    scale = 1 / 1024 if sys.platform != "darwin" else 1 / (1024 * 1024)
+    return {
+        "wall_seconds": min(walls),
+        "rss_peak_mb": rss_peak * scale,
+        "rss_growth_mb": (rss_peak - rss_before) * scale,
+        "alloc_peak_mb": alloc_peak / (1024 * 1024),
+    }
+
+
+# --- preparación, historial y comparación ----------------------------------------------------
+
+def _prepare_database():
+    """Base SQLite temporal con un usuario y un reporte simulado para las vistas y exportaciones."""
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ.setdefault("ARTIFACT_DIR", tempfile.mkdtemp(prefix="bench-artifacts-"))
+    os.environ["SIM_CACHE_ENABLED"] = "0"
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from jobs import save_simulation_report, store_charts
+    from models import Project, User, Variable, db, upgrade_schema
+    from utils import simulate_monte_carlo
+
+    with app.app_context():
+        upgrade_schema()
+        user = User(email=_BENCH_USER, first_name="Bench", last_name="Mark",
+                    password=generate_password_hash(_BENCH_PASSWORD, method="pbkdf2:sha256"))
+        project = Project(name="Benchmark", user_id=None)
+        db.session.add_all([user, project])
+        for var in _variables(10):
+            db.session.add(Variable(project=project, name=var["name"], distribution=var["distribution"],
+                                    params_json=json.dumps(var["params"])))
+        db.session.flush()
+        results = simulate_monte_carlo(_variables(10), 100_000, seed=1, sensitivity=True)
+        report = save_simulation_report(project, store_charts(results))
+        db.session.commit()
+        os.environ["BENCH_REPORT_ID"] = str(report.id)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def regressions(history, results, threshold, baseline=5):
+    """Casos cuya métrica supera la mediana de las últimas ``baseline`` ejecuciones en más de ``threshold``."""
+    found = []
+    for name, metrics in results.items():
+        previous = [run["results"][name] for run in history[-baseline:]
+                    if name in run["results"] and "wall_seconds" in run["results"][name]]
+        if not previous or "wall_seconds" not in metrics:
+            continue
+        for metric in CHECKED_METRICS:
+            reference = statistics.median(p[metric] for p in previous)
+            if metric == "wall_seconds" and metrics[metric] < MIN_WALL_SECONDS:
+                continue
+            if reference > 0 and metrics[metric] > reference * (1 + threshold):
+                found.append((name, metric, reference, metrics[metric]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--suite", choices=("quick", "full"), default="quick")
+    parser.add_argument("--filter", default="", help="solo casos cuyo nombre contenga este texto")
+    parser.add_argument("--repeat", type=int, default=1, help="repeticiones por caso (se toma el mínimo)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="archivo JSON de historial")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="empeoramiento máximo tolerado (0.25 = 25%%)")
+    parser.add_argument("--baseline", type=int, default=5, help="ejecuciones previas para la referencia")
+    parser.add_argument("--no-save", action="store_true", help="no añadir la ejecución al historial")
+    args = parser.parse_args(argv)
+
+    selected = {name: case for name, case in cases(args.suite).items() if args.filter in name}
+    if any(kind in ("report", "export") for kind, _ in selected.values()):
+        _prepare_database()
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for name, (kind, params) in selected.items():
+        # Un proceso por caso: el pico de RSS no arrastra el de casos anteriores
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                results[name] = pool.submit(_run_case, kind, params, max(1, args.repeat)).result()
+            except Exception as e:
+                results[name] = {"error": f"{e.__class__.__name__}: {e}"}
+        metrics = results[name]
+        if "error" in metrics:
+            print(f"{name:34} ERROR ({metrics['error']})")
+        elif "skipped" in metrics:
+            print(f"{name:34} omitido ({metrics['skipped']})")
+        else:
+            print(f"{name:34} {metrics['wall_seconds']:9.3f} s  RSS {metrics['rss_peak_mb']:8.1f} MB"
+                  f"  alloc {metrics['alloc_peak_mb']:8.1f} MB")
+
+    history = load_history(args.history)
+    found = regressions(history, results, args.threshold, args.baseline)
+    if not args.no_save:
+        import numpy
+
+        history.append({
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "suite": args.suite,
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "results": results,
+        })
+        save_history(args.history, history)
+
+    for name, metric, reference, value in found:
+        print(f"REGRESIÓN {name} {metric}: {value:.3f} frente a {reference:.3f} "
+              f"(+{(value / reference - 1) * 100:.0f}%, límite {args.threshold * 100:.0f}%)")
+    failed = any("error" in metrics for metrics in results.values())
+    return 1 if found or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Caché de resultados de simulación direccionada por contenido.
+
+La clave es un hash SHA-256 de la definición canónica de las variables, las
+opciones del motor (iteraciones, semilla, muestreo...) y ``ENGINE_VERSION``.
+Hay dos niveles: un LRU en memoria por proceso y la tabla
+``simulation_cache`` compartida entre workers, acotada por tamaño total.
+Solo se cachean ejecuciones deterministas (con semilla y sin límite de tiempo).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event
+
+from distributions import get_distribution
+from engine import ENGINE_VERSION
+from models import db, ProjectOutput, SimulationCacheEntry, Variable, VariableCorrelation
+
+
+def cache_key(variables, options):
+    """Clave canónica o None si la ejecución no es reproducible."""
+    if options.get("seed") is None or options.get("max_seconds"):
+        return None
+    options = dict(options, seed=int(options["seed"]))
+    canonical = {
+        "engine": ENGINE_VERSION,
+        "variables": [],
+        "options": {key: value for key, value in sorted(options.items()) if value is not None},
+    }
+    for var in variables:
+        dist = get_distribution(var.get("distribution"))
+        canonical["variables"].append({
+            "name": var.get("name"),
+            "distribution": dist.name,
+            "params": dist.parse_params(var.get("params")),
+        })
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, app=None):
+        self.app = None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SIM_CACHE_ENABLED", True)
+        app.config.setdefault("SIM_CACHE_MEMORY_ITEMS", 64)
+        app.config.setdefault("SIM_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+        self.app = app
+        app.extensions["result_cache"] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config["SIM_CACHE_ENABLED"]
+
+    def get(self, key):
+        """Devuelve los resultados cacheados o None."""
+        if not key or not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+
+        row = db.session.get(SimulationCacheEntry, key)
+        if row is None:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+        row.hits = (row.hits or 0) + 1
+        row.last_used_at = datetime.utcnow()
+        results = json.loads(row.payload)
+        self._remember(key, row.project_id, results)
+        with self._lock:
+            self.counters["db_hits"] += 1
+        return results
+
+    def put(self, key, project_id, results):
+        """Guarda en ambos niveles; la sesión la confirma quien llama."""
+        if not key or not self.enabled:
+            return
+        # Solo claves de gráficos: las imágenes ya están en el almacén de artefactos
+        results = {"summary": results.get("summary", {}), "chart_keys": results.get("chart_keys", {}),
+                   "histogram": results.get("histogram"), "sensitivity": results.get("sensitivity"),
+                   "outputs": results.get("outputs") or [], "scenarios": results.get("scenarios")}
+        payload = json.dumps(results)
+        self._remember(key, project_id, results)
+        row = db.session.get(SimulationCacheEntry, key)
+        if row is None:
+            row = SimulationCacheEntry(key=key, project_id=project_id)
+            db.session.add(row)
+        row.payload = payload
+        row.size_bytes = len(payload)
+        row.last_used_at = datetime.utcnow()
+        db.session.flush()
+        self._evict()
+        with self._lock:
+            self.counters["stores"] += 1
+
+    def _remember(self, key, project_id, results):
+        with self._lock:
+            self._memory[key] = (project_id, results)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.app.config["SIM_CACHE_MEMORY_ITEMS"]:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        # Borra las entradas usadas hace más tiempo hasta volver bajo el límite de bytes
+        limit = self.app.config["SIM_CACHE_MAX_BYTES"]
+        total = db.session.query(db.func.coalesce(db.func.sum(SimulationCacheEntry.size_bytes), 0)).scalar()
+        if total <= limit:
+            return
+        oldest = (SimulationCacheEntry.query
+                  .with_entities(SimulationCacheEntry.key, SimulationCacheEntry.size_bytes)
+                  .order_by(SimulationCacheEntry.last_used_at.asc()))
+        doomed = []
+        for key, size in oldest:
+            if total <= limit:
+                break
+            doomed.append(key)
+            total -= size or 0
+        SimulationCacheEntry.query.filter(SimulationCacheEntry.key.in_(doomed)).delete(synchronize_session=False)
+        with self._lock:
+            for key in doomed:
+                self._memory.pop(key, None)
+
+    def invalidate_project(self, project_id, connection=None):
+        """Descarta las entradas de un proyecto (se llama al cambiar sus variables)."""
+        with self._lock:
+            for key in [k for k, (pid, _) in self._memory.items() if pid == project_id]:
+                del self._memory[key]
+            self.counters["invalidations"] += 1
+        table = SimulationCacheEntry.__table__
+        statement = table.delete().where(table.c.project_id == project_id)
+        if connection is not None:
+            connection.execute(statement)
+        else:
+            db.session.execute(statement)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters, memory_entries=len(self._memory))
+        lookups = data["memory_hits"] + data["db_hits"] + data["misses"]
+        data["hit_ratio"] = (data["memory_hits"] + data["db_hits"]) / lookups if lookups else None
+        data["db_entries"], data["db_bytes"] = db.session.query(
+            db.func.count(SimulationCacheEntry.key),
+            db.func.coalesce(db.func.sum(SimulationCacheEntry.size_bytes), 0),
+        ).one()
+        return data
+
+
+result_cache = ResultCache()
+
+
+@event.listens_for(Variable, "after_insert")
+@event.listens_for(Variable, "after_update")
+@event.listens_for(Variable, "after_delete")
+@event.listens_for(VariableCorrelation, "after_insert")
+@event.listens_for(VariableCorrelation, "after_update")
+@event.listens_for(VariableCorrelation, "after_delete")
+@event.listens_for(ProjectOutput, "after_insert")
+@event.listens_for(ProjectOutput, "after_update")
+@event.listens_for(ProjectOutput, "after_delete")
+def _invalidate_on_variable_change(mapper, connection, target):
+    if result_cache.app is not None and target.project_id is not None:
+        result_cache.invalidate_project(target.project_id, connection)
@@ -0,0 +1,195 @@
+"""Caché en disco de columnas de muestras por variable (re-simulación incremental).
+
+En modo incremental cada variable se muestrea con su propio generador,
+derivado de la semilla y del id de la variable, así que su columna depende
+solo de (semilla, id, distribución, parámetros, iteraciones, muestreo) y no
+de las demás variables ni de su orden. Las columnas se guardan como ``.npy``
+float64 bajo ``SIM_COLUMNS_DIR``: al añadir o cambiar una variable solo se
+muestrea esa columna.
+
+El total (suma de las variables) también se guarda. El siguiente se deriva
+del guardado más parecido restando las columnas que salen y sumando las que
+entran; para que el redondeo no se acumule, tras ``MAX_DERIVATIONS``
+derivaciones encadenadas se vuelve a sumar desde cero.
+
+Solo depende de numpy: se usa dentro de los procesos del pool. Los archivos
+se escriben con ``os.replace``, así que varios procesos pueden compartir el
+directorio; el manifiesto de totales es solo una pista y si se pierde una
+actualización el total se vuelve a sumar.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+# Espacio propio en el spawn_key: no coincide con los hijos de SeedSequence.spawn del modo normal
+COLUMN_STREAM = 0x636F6C
+MAX_DERIVATIONS = 16
+MANIFEST_ENTRIES = 8
+# Temporales de ``create`` más antiguos que esto son de procesos que murieron a medio escribir
+STALE_TMP_SECONDS = 3600
+
+
+def column_seed(seed, variable_id):
+    """SeedSequence de la columna de una variable, independiente de las demás."""
+    return np.random.SeedSequence(int(seed), spawn_key=(COLUMN_STREAM, int(variable_id)))
+
+
+def digest(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=float, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ColumnStore:
+    """Columnas y totales por clave; sin ``root`` todo vive en memoria y no se reutiliza nada."""
+
+    def __init__(self, root=None, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.root is not None
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.npy")
+
+    def get(self, key):
+        """Memmap de solo lectura de la columna ``key`` o None."""
+        if not self.enabled:
+            return None
+        try:
+            column = np.load(self.path(key), mmap_mode="r")
+            # mtime = último uso, para el desalojo
+            os.utime(self.path(key))
+        except (FileNotFoundError, ValueError):
+            return None
+        return column
+
+    def create(self, key, size):
+        """Buffer donde escribir una columna nueva; ``commit`` la publica bajo ``key``."""
+        if not self.enabled:
+            return np.empty(size)
+        return np.lib.format.open_memmap(self.path(key) + f".{os.getpid()}.tmp", mode="w+",
+                                         dtype=np.float64, shape=(size,))
+
+    def commit(self, key, column):
+        if not self.enabled:
+            return column
+        column.flush()
+        tmp = column.filename
+        del column
+        os.replace(tmp, self.path(key))
+        return np.load(self.path(key), mmap_mode="r")
+
+    def total(self, scope, keys, columns, chunk_size):
+        """Suma de ``columns`` (claves ``keys``) y cómo se obtuvo: cached, derived o summed."""
+        key = digest("total", scope, sorted(keys))
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "cached"
+        size = columns[0].shape[0]
+        target = self.create(key, size)
+        base = self._closest(scope, keys)
+        if base is not None:
+            base_total, removed, added, generation = base
+            added = [columns[keys.index(k)] for k in added]
+            for start in range(0, size, chunk_size):
+                stop = min(start + chunk_size, size)
+                block = np.array(base_total[start:stop])
+                for column in removed:
+                    block -= column[start:stop]
+                for column in added:
+                    block += column[start:stop]
+                target[start:stop] = block
+            how = "derived"
+        else:
+            for start in range(0, size, chunk_size):
+                stop = min(start + chunk_size, size)
+                block = np.zeros(stop - start)
+                for column in columns:
+                    block += column[start:stop]
+                target[start:stop] = block
+            generation, how = 0, "summed"
+        total = self.commit(key, target)
+        self._remember(scope, key, keys, generation)
+        return total, how
+
+    # --- manifiesto de totales por ámbito (semilla, iteraciones, muestreo) -----------------------
+    def _manifest_path(self, scope):
+        return os.path.join(self.root, f"{scope}.json")
+
+    def _manifest(self, scope):
+        try:
+            with open(self._manifest_path(scope)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _closest(self, scope, keys):
+        # Total guardado que menos columnas cambia; solo si es más barato que sumar todo
+        if not self.enabled:
+            return None
+        wanted = set(keys)
+        candidates = sorted(self._manifest(scope), key=lambda e: len(wanted.symmetric_difference(e["columns"])))
+        for entry in candidates:
+            removed = [k for k in entry["columns"] if k not in wanted]
+            added = [k for k in keys if k not in set(entry["columns"])]
+            if entry["generation"] + 1 >= MAX_DERIVATIONS or 1 + len(removed) + len(added) >= len(keys):
+                continue
+            base_total = self.get(entry["total"])
+            removed_columns = [self.get(k) for k in removed]
+            if base_total is None or any(column is None for column in removed_columns):
+                continue
+            return base_total, removed_columns, added, entry["generation"] + 1
+        return None
+
+    def _remember(self, scope, key, keys, generation):
+        if not self.enabled:
+            return
+        entries = [e for e in self._manifest(scope) if e["total"] != key]
+        entries.insert(0, {"total": key, "columns": list(keys), "generation": generation})
+        tmp = self._manifest_path(scope) + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries[:MANIFEST_ENTRIES], f)
+        os.replace(tmp, self._manifest_path(scope))
+
+    def prune(self, keep=()):
+        """Borra los temporales abandonados y las columnas usadas hace más tiempo hasta quedar bajo ``max_bytes``."""
+        if not self.enabled:
+            return 0
+        keep = {f"{key}.npy" for key in keep}
+        files, writing, removed = [], 0, 0
+        stale = time.time() - STALE_TMP_SECONDS
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".tmp"):
+                # ``<clave>.npy.<pid>.tmp``: los recientes pueden estar escribiéndose en otro proceso
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime >= stale:
+                        writing += stat.st_size
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass  # publicado con os.replace mientras se recorría
+            elif entry.name.endswith(".npy") and entry.name not in keep:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        used = writing + sum(size for _, size, _ in files) + sum(
+            os.path.getsize(os.path.join(self.root, name)) for name in keep
+            if os.path.exists(os.path.join(self.root, name)))
+        for _, size, path in sorted(files):
+            if used <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+            removed += 1
+        return removed
@@ -0,0 +1,130 @@
+"""Comparación de reportes a partir de los histogramas y resúmenes guardados.
+
+No relee muestras ni imágenes: cada reporte aporta su histograma de bins
+uniformes (``SimulationResult.histogram_json``) y sus estadísticas. Los
+histogramas se reparten sobre una malla común suponiendo masa uniforme dentro
+de cada bin (la misma interpolación lineal de la CDF que usa ``TDigest``), todo
+a la vez con operaciones sobre la matriz reportes x bins.
+
+Solo depende de numpy. Las respuestas se memorizan por conjunto de reportes:
+los bins de un reporte no cambian nunca.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+COMPARE_CACHE_SIZE = 64
+DEFAULT_BINS = 60
+MAX_BINS = 200
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _stack(histograms):
+    # Conteos (rellenos con ceros), acumulados, límites y nº de bins de cada histograma
+    sizes = np.array([len(counts) for counts, _ in histograms])
+    width = sizes.max()
+    counts = np.zeros((len(histograms), width))
+    for row, (c, _) in enumerate(histograms):
+        counts[row, :len(c)] = c
+    cumulative = np.concatenate([np.zeros((len(histograms), 1)), np.cumsum(counts, axis=1)], axis=1)
+    lo = np.array([edges[0] for _, edges in histograms], dtype=np.float64)
+    hi = np.array([edges[-1] for _, edges in histograms], dtype=np.float64)
+    return counts, cumulative, lo, hi, sizes
+
+
+def cdf_at(histograms, grid):
+    """Fracción acumulada de cada histograma en los puntos ``grid``: matriz reportes x puntos."""
+    counts, cumulative, lo, hi, sizes = _stack(histograms)
+    total = np.maximum(cumulative[:, -1], 1e-300)[:, None]
+    span = (hi - lo)[:, None]
+    # Posición fraccionaria del punto en los bins de cada histograma
+    position = np.clip((grid[None, :] - lo[:, None]) / np.where(span > 0, span, 1) * sizes[:, None],
+                       0, sizes[:, None])
+    index = np.minimum(position.astype(np.int64), sizes[:, None] - 1)
+    below = np.take_along_axis(cumulative, index, axis=1)
+    inside = np.take_along_axis(counts, index, axis=1)
+    cdf = (below + (position - index) * inside) / total
+    # Histograma degenerado (mín == máx): toda la masa en un punto
+    cdf = np.where(span > 0, cdf, (grid[None, :] >= lo[:, None]).astype(np.float64))
+    return cdf
+
+
+def quantiles(histograms, percents):
+    """Percentiles (0-100) de cada histograma invirtiendo su CDF lineal: matriz reportes x percentiles."""
+    counts, cumulative, lo, hi, sizes = _stack(histograms)
+    targets = cumulative[:, -1:] * (np.asarray(percents, dtype=np.float64)[None, :] / 100)
+    # Bin donde cae cada objetivo: nº de acumulados (sin el 0 inicial) por debajo
+    index = np.minimum((cumulative[:, None, 1:] < targets[:, :, None]).sum(axis=2), sizes[:, None] - 1)
+    below = np.take_along_axis(cumulative, index, axis=1)
+    inside = np.take_along_axis(counts, index, axis=1)
+    fraction = np.clip((targets - below) / np.where(inside > 0, inside, 1), 0, 1)
+    return lo[:, None] + (index + fraction) * ((hi - lo) / sizes)[:, None]
+
+
+def compare(rows, bins=DEFAULT_BINS, percents=DEFAULT_PERCENTILES):
+    """Superposición de distribuciones y tendencias de ``rows`` (en orden cronológico).
+
+    Cada fila trae ``id``, ``name``, ``created_at``, ``summary`` y
+    ``histogram`` = (conteos, bordes) o None en reportes antiguos; esos
+    aparecen en las tendencias pero no en la superposición.
+    """
+    with_bins = [row for row in rows if row["histogram"] is not None]
+    result = {
+        "reports": [{"id": row["id"], "name": row["name"], "created_at": row["created_at"],
+                     "has_histogram": row["histogram"] is not None} for row in rows],
+        "trend": {key: [row["summary"][key] for row in rows]
+                  for key in ("mean", "median", "percentile_5", "percentile_95", "std")},
+        "drift": drift([row["summary"]["percentile_95"] for row in rows]),
+    }
+    if not with_bins:
+        result.update(edges=[], densities={}, pooled=[], percentiles={})
+        return result
+    histograms = [row["histogram"] for row in with_bins]
+    lo = min(edges[0] for _, edges in histograms)
+    hi = max(edges[-1] for _, edges in histograms)
+    grid = np.linspace(lo, hi if hi > lo else lo + 1, bins + 1)
+    # Probabilidad de cada bin común por reporte y densidad (área 1) para superponerlas
+    mass = np.diff(cdf_at(histograms, grid), axis=1)
+    density = mass / np.diff(grid)[None, :]
+    values = quantiles(histograms, percents)
+    result.update(
+        edges=grid.tolist(),
+        densities={str(row["id"]): density[i].tolist() for i, row in enumerate(with_bins)},
+        # Mezcla con el mismo peso por reporte: la distribución "típica" del conjunto
+        pooled=density.mean(axis=0).tolist(),
+        percentiles={f"{q:g}": {str(row["id"]): float(values[i, j]) for i, row in enumerate(with_bins)}
+                     for j, q in enumerate(percents)},
+    )
+    return result
+
+
+def drift(values):
+    """Cambio entre la primera y la última ejecución y pendiente por ejecución (mínimos cuadrados)."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return None
+    first, last = float(values[0]), float(values[-1])
+    slope = float(np.polyfit(np.arange(values.size), values, 1)[0]) if values.size > 1 else 0.0
+    return {"first": first, "last": last, "change": last - first,
+            "relative_change": (last - first) / abs(first) if first else None,
+            "slope_per_run": slope, "min": float(values.min()), "max": float(values.max())}
+
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+def cached_comparison(key, build):
+    """``build()`` memorizado por ``key`` (conjunto de reportes y opciones)."""
+    with _responses_lock:
+        body = _responses.get(key)
+        if body is not None:
+            _responses.move_to_end(key)
+            return body
+    body = build()
+    with _responses_lock:
+        _responses[key] = body
+        while len(_responses) > COMPARE_CACHE_SIZE:
+            _responses.popitem(last=False)
+    return body
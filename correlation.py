@@ -0,0 +1,121 @@
+"""Correlación entre variables de entrada.
+
+Dos métodos, ambos aplicados bloque a bloque dentro del motor:
+
+- ``cholesky``: cópula gaussiana. Las normales estándar (o las uniformes del
+  LHS/Sobol/antitético pasadas por ``ndtri``) se multiplican por el factor
+  L (C = L·Lᵀ), vuelven a uniformes con ``ndtr`` y cada variable aplica su
+  inversa de la CDF.
+- ``iman_conover``: se muestrea cada marginal de forma independiente y se
+  reordenan sus valores para imponer la correlación de rangos; conserva las
+  marginales exactas (y la estratificación del LHS).
+
+La matriz se comprueba antes de factorizar: si no es semidefinida positiva se
+sustituye por la más cercana (proyecciones alternadas de Higham). El factor se
+memoriza por proyecto y contenido de la matriz.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import special
+
+CORRELATION_METHODS = {
+    "cholesky": "Cópula gaussiana (Cholesky)",
+    "iman_conover": "Iman-Conover (rangos)",
+}
+# Factores memorizados por proceso
+FACTOR_CACHE_SIZE = 128
+
+
+def correlation_matrix(size, entries):
+    """Matriz ``size x size`` con unos en la diagonal y ``(i, j, coeficiente)`` simétricos."""
+    matrix = np.eye(size)
+    for i, j, coefficient in entries:
+        matrix[i, j] = matrix[j, i] = coefficient
+    return matrix
+
+
+def is_psd(matrix, tol=1e-8):
+    return bool(np.linalg.eigvalsh(matrix).min() >= -tol)
+
+
+def nearest_psd(matrix, max_iter=100, tol=1e-9):
+    """Matriz de correlación semidefinida positiva más cercana (Higham 2002)."""
+    y = np.array(matrix, dtype=np.float64)
+    correction = np.zeros_like(y)
+    for _ in range(max_iter):
+        r = y - correction
+        values, vectors = np.linalg.eigh((r + r.T) / 2)
+        x = (vectors * np.maximum(values, 0)) @ vectors.T
+        correction = x - r
+        previous, y = y, x.copy()
+        np.fill_diagonal(y, 1.0)
+        if np.linalg.norm(y - previous, "fro") < tol * np.linalg.norm(y, "fro"):
+            break
+    return y
+
+
+def factorize(matrix):
+    """Comprueba/repara la matriz y devuelve su factor L con C = L·Lᵀ."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    repaired = not is_psd(matrix)
+    if repaired:
+        matrix = nearest_psd(matrix)
+    try:
+        lower = np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        # Semidefinida pero singular (p. ej. correlación 1): factor por autovalores
+        values, vectors = np.linalg.eigh(matrix)
+        lower = vectors * np.sqrt(np.maximum(values, 0))
+    return {"matrix": matrix, "lower": lower, "repaired": repaired,
+            "min_eigenvalue": float(np.linalg.eigvalsh(matrix).min())}
+
+
+_factors = OrderedDict()
+_factors_lock = threading.Lock()
+
+
+def cached_factor(project_id, matrix):
+    """``factorize`` memorizado por proyecto y contenido de la matriz."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    key = (project_id, matrix.shape[0], hashlib.sha1(matrix.tobytes()).hexdigest())
+    with _factors_lock:
+        factor = _factors.get(key)
+        if factor is not None:
+            _factors.move_to_end(key)
+            return factor
+    factor = factorize(matrix)
+    with _factors_lock:
+        _factors[key] = factor
+        while len(_factors) > FACTOR_CACHE_SIZE:
+            _factors.popitem(last=False)
+    return factor
+
+
+def apply_copula(normals, lower, scratch):
+    """Normales independientes (variables x n) -> uniformes correlacionadas, en sitio."""
+    np.matmul(lower, normals, out=scratch)
+    special.ndtr(scratch, out=normals)
+
+
+def iman_conover(samples, lower, rng):
+    """Reordena cada fila de ``samples`` para imponer la correlación de rangos L·Lᵀ."""
+    dims, size = samples.shape
+    if size < 3:
+        return
+    scores = special.ndtri(np.arange(1, size + 1) / (size + 1))
+    target = np.empty((dims, size))
+    for row in target:
+        row[:] = rng.permutation(scores)
+    # Se corrige la correlación muestral de las puntuaciones antes de aplicar L
+    try:
+        current = np.linalg.cholesky(np.corrcoef(target))
+    except np.linalg.LinAlgError:
+        current = np.eye(dims)
+    target = lower @ np.linalg.solve(current, target)
+    for row, wanted in zip(samples, target):
+        ranks = np.empty(size, dtype=np.intp)
+        ranks[np.argsort(wanted, kind="stable")] = np.arange(size)
+        row[:] = np.sort(row)[ranks]
@@ -0,0 +1,98 @@
+"""Opciones del engine de SQLAlchemy: pool, pgbouncer, timeouts y modo local.
+
+``engine_options`` produce ``SQLALCHEMY_ENGINE_OPTIONS`` según el dialecto:
+
+- Postgres con pool propio (``DB_POOL_MODE=queue``): tamaño y overflow por
+  proceso, ``pool_pre_ping`` para descartar conexiones cortadas por el
+  servidor o un balanceador, ``pool_recycle`` y ``statement_timeout`` como
+  parámetro de arranque de la conexión.
+- Postgres detrás de pgbouncer en modo transacción (``DB_POOL_MODE=null``):
+  ``NullPool`` (el pool es pgbouncer) y, como pgbouncer rechaza parámetros de
+  arranque, el timeout se fija con ``SET LOCAL`` al empezar cada transacción.
+- SQLite (pruebas sin red): WAL y ``busy_timeout`` para que el planificador y
+  las peticiones no se bloqueen entre sí.
+
+Los contadores de ``pool_stats`` son por proceso, como el propio pool.
+"""
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, QueuePool
+
+POOL_MODES = ("queue", "null")
+
+# engine -> contadores de eventos del pool
+_counters = WeakKeyDictionary()
+
+
+def database_url(url):
+    """Normaliza ``postgres://`` (Render, Heroku) al nombre de dialecto de SQLAlchemy."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url, pool_mode="queue", pool_size=5, max_overflow=5, pool_timeout=30, pool_recycle=1800,
+                   pre_ping=True, statement_timeout_ms=0, connect_timeout=10):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` para ``url`` con la configuración del pool."""
+    if pool_mode not in POOL_MODES:
+        raise ValueError(f"Modo de pool desconocido: {pool_mode}")
+    if url.startswith("sqlite"):
+        # Espera hasta `timeout` s a que se libere el bloqueo de escritura en lugar de fallar
+        return {"connect_args": {"timeout": 30}}
+    connect_args = {"connect_timeout": connect_timeout, "application_name": "montecarlo"}
+    if pool_mode == "null":
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    if statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    return {
+        "poolclass": QueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pre_ping,
+        "connect_args": connect_args,
+    }
+
+
+def configure_engine(engine, pool_mode="queue", statement_timeout_ms=0):
+    """Instala los eventos que ``engine_options`` no puede expresar y los contadores del pool."""
+    counters = _counters[engine] = {"connects": 0, "checkouts": 0, "invalidated": 0}
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, record):
+        counters["connects"] += 1
+        if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, proxy):
+        counters["checkouts"] += 1
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, record, exception):
+        # p. ej. pool_pre_ping encontró la conexión cerrada
+        counters["invalidated"] += 1
+
+    if pool_mode == "null" and statement_timeout_ms and engine.dialect.name == "postgresql":
+        @event.listens_for(Session, "after_begin")
+        def _statement_timeout(session, transaction, connection):
+            if connection.engine is engine:
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+    return engine
+
+
+def pool_stats(engine):
+    """Estado del pool de este proceso: ocupación y contadores acumulados."""
+    pool = engine.pool
+    stats = {"dialect": engine.dialect.name, "pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                     overflow=pool.overflow(), timeout=pool.timeout())
+    stats.update(_counters.get(engine, {}))
+    return stats
@@ -0,0 +1,282 @@
+"""Registro de distribuciones para el motor Monte Carlo.
+
+Cada distribución se registra con ``register_distribution`` indicando sus
+parámetros por defecto y una función que rellena *en sitio* un buffer de
+float64 con muestras de un ``np.random.Generator``. ``register_inverse``
+añade la inversa de la CDF, que usan los muestreos LHS, Sobol y antitético
+para transformar uniformes en muestras. Para añadir una
+distribución basta con registrarla aquí: el motor, el formulario de variables
+y ``Variable.params`` la descubren desde ``DISTRIBUTIONS``.
+"""
+import numpy as np
+from scipy import special
+
+DISTRIBUTIONS = {}
+
+
+class Distribution:
+    def __init__(self, name, sampler, defaults, label=None, fields=None, validate=None):
+        self.name = name
+        self.sampler = sampler
+        self.defaults = defaults
+        self.label = label or name.title()
+        # (parámetro, etiqueta) para el formulario de variables
+        self.fields = fields or [(key, key) for key in defaults]
+        self.validate = validate
+        self.inverse = None
+
+    def parse_params(self, raw):
+        """Normaliza parámetros (dict de la BD o del formulario) y los valida.
+
+        Los parámetros ausentes toman el valor por defecto; las listas pueden
+        venir como texto separado por comas.
+        """
+        raw = raw or {}
+        params = {}
+        for key, default in self.defaults.items():
+            value = raw.get(key)
+            if value is None or value == "":
+                value = default
+            if isinstance(default, list):
+                if isinstance(value, str):
+                    value = [item for item in value.replace(";", ",").split(",") if item.strip()]
+                params[key] = [float(item) for item in value]
+            else:
+                params[key] = float(value)
+        if self.validate is not None:
+            error = self.validate(params)
+            if error:
+                raise ValueError(f"{self.label}: {error}")
+        return params
+
+    def sample(self, rng, params, out):
+        self.sampler(rng, params, out)
+        return out
+
+    def ppf(self, params, u, out):
+        """Inversa de la CDF aplicada a ``u`` (puede ser el mismo buffer que ``out``)."""
+        if self.inverse is None:
+            raise ValueError(f"{self.label}: no admite muestreo por inversa de la CDF")
+        self.inverse(params, u, out)
+        return out
+
+
+def register_distribution(name, defaults, label=None, fields=None, validate=None):
+    """Decorador: registra ``sampler(rng, params, out)`` bajo ``name``."""
+    def decorator(sampler):
+        DISTRIBUTIONS[name] = Distribution(name, sampler, defaults, label, fields, validate)
+        return sampler
+    return decorator
+
+
+def register_inverse(name):
+    """Decorador: registra ``inverse(params, u, out)`` para la distribución ``name``."""
+    def decorator(inverse):
+        DISTRIBUTIONS[name].inverse = inverse
+        return inverse
+    return decorator
+
+
+def get_distribution(name):
+    try:
+        return DISTRIBUTIONS[(name or "").strip().lower()]
+    except KeyError:
+        raise ValueError(f"Distribución desconocida: {name}") from None
+
+
+def _bounded(low_key, high_key):
+    def validate(p):
+        if p[low_key] > p[high_key]:
+            return f"{low_key} debe ser menor o igual que {high_key}"
+    return validate
+
+
+def _three_point(p):
+    if not p["left"] <= p["mode"] <= p["right"] or p["left"] == p["right"]:
+        return "se requiere mínimo <= moda <= máximo y mínimo < máximo"
+
+
+def _positive(*keys):
+    def validate(p):
+        for key in keys:
+            if p[key] <= 0:
+                return f"{key} debe ser mayor que 0"
+    return validate
+
+
+@register_distribution("normal", {"mean": 50, "std": 15}, "Normal",
+                       [("mean", "Media"), ("std", "Desv. Est.")],
+                       lambda p: "std no puede ser negativa" if p["std"] < 0 else None)
+def _normal(rng, p, out):
+    rng.standard_normal(out=out)
+    out *= p["std"]
+    out += p["mean"]
+
+
+@register_inverse("normal")
+def _normal_ppf(p, u, out):
+    special.ndtri(u, out=out)
+    out *= p["std"]
+    out += p["mean"]
+
+
+@register_distribution("uniform", {"low": 0, "high": 100}, "Uniforme",
+                       [("low", "Mínimo"), ("high", "Máximo")], _bounded("low", "high"))
+def _uniform(rng, p, out):
+    rng.random(out=out)
+    out *= p["high"] - p["low"]
+    out += p["low"]
+
+
+@register_inverse("uniform")
+def _uniform_ppf(p, u, out):
+    np.multiply(u, p["high"] - p["low"], out=out)
+    out += p["low"]
+
+
+@register_distribution("triangular", {"left": 10, "mode": 50, "right": 90}, "Triangular",
+                       [("left", "Mínimo"), ("mode", "Moda"), ("right", "Máximo")], _three_point)
+def _triangular(rng, p, out):
+    out[:] = rng.triangular(p["left"], p["mode"], p["right"], size=out.size)
+
+
+@register_inverse("triangular")
+def _triangular_ppf(p, u, out):
+    left, mode, right = p["left"], p["mode"], p["right"]
+    split = (mode - left) / (right - left)
+    lower = left + np.sqrt(u * (right - left) * (mode - left))
+    upper = right - np.sqrt((1 - u) * (right - left) * (right - mode))
+    np.copyto(out, np.where(u < split, lower, upper))
+
+
+@register_distribution("lognormal", {"mu": 0, "sigma": 1}, "Lognormal",
+                       [("mu", "μ (log)"), ("sigma", "σ (log)")], _positive("sigma"))
+def _lognormal(rng, p, out):
+    rng.standard_normal(out=out)
+    out *= p["sigma"]
+    out += p["mu"]
+    np.exp(out, out=out)
+
+
+@register_inverse("lognormal")
+def _lognormal_ppf(p, u, out):
+    special.ndtri(u, out=out)
+    out *= p["sigma"]
+    out += p["mu"]
+    np.exp(out, out=out)
+
+
+@register_distribution("beta", {"alpha": 2, "beta": 5, "low": 0, "high": 1}, "Beta",
+                       [("alpha", "α"), ("beta", "β"), ("low", "Mínimo"), ("high", "Máximo")],
+                       lambda p: _positive("alpha", "beta")(p) or _bounded("low", "high")(p))
+def _beta(rng, p, out):
+    out[:] = rng.beta(p["alpha"], p["beta"], size=out.size)
+    out *= p["high"] - p["low"]
+    out += p["low"]
+
+
+@register_inverse("beta")
+def _beta_ppf(p, u, out):
+    special.betaincinv(p["alpha"], p["beta"], u, out=out)
+    out *= p["high"] - p["low"]
+    out += p["low"]
+
+
+def pert_shape(p):
+    """Parámetros (α, β) de la Beta equivalente a una PERT mínimo/moda/máximo."""
+    span = p["right"] - p["left"]
+    return 1 + 4 * (p["mode"] - p["left"]) / span, 1 + 4 * (p["right"] - p["mode"]) / span
+
+
+@register_distribution("pert", {"left": 10, "mode": 50, "right": 90}, "PERT",
+                       [("left", "Mínimo"), ("mode", "Más probable"), ("right", "Máximo")], _three_point)
+def _pert(rng, p, out):
+    alpha, beta = pert_shape(p)
+    out[:] = rng.beta(alpha, beta, size=out.size)
+    out *= p["right"] - p["left"]
+    out += p["left"]
+
+
+@register_inverse("pert")
+def _pert_ppf(p, u, out):
+    alpha, beta = pert_shape(p)
+    special.betaincinv(alpha, beta, u, out=out)
+    out *= p["right"] - p["left"]
+    out += p["left"]
+
+
+@register_distribution("gamma", {"shape": 2, "scale": 1}, "Gamma",
+                       [("shape", "Forma (k)"), ("scale", "Escala (θ)")], _positive("shape", "scale"))
+def _gamma(rng, p, out):
+    rng.standard_gamma(p["shape"], out=out)
+    out *= p["scale"]
+
+
+@register_inverse("gamma")
+def _gamma_ppf(p, u, out):
+    special.gammaincinv(p["shape"], u, out=out)
+    out *= p["scale"]
+
+
+@register_distribution("poisson", {"lam": 5}, "Poisson", [("lam", "λ (media)")],
+                       lambda p: "lam no puede ser negativa" if p["lam"] < 0 else None)
+def _poisson(rng, p, out):
+    out[:] = rng.poisson(p["lam"], size=out.size)
+
+
+@register_inverse("poisson")
+def _poisson_ppf(p, u, out):
+    from scipy.stats import poisson
+    np.copyto(out, poisson.ppf(u, p["lam"]))
+
+
+@register_distribution("empirical", {"values": []}, "Empírica",
+                       [("values", "Valores observados (separados por comas)")],
+                       lambda p: "se requiere al menos un valor" if not p["values"] else None)
+def _empirical(rng, p, out):
+    # Remuestreo con reemplazo (bootstrap) de los valores observados
+    values = np.asarray(p["values"], dtype=np.float64)
+    np.take(values, rng.integers(0, values.size, size=out.size), out=out)
+
+
+@register_inverse("empirical")
+def _empirical_ppf(p, u, out):
+    values = np.sort(np.asarray(p["values"], dtype=np.float64))
+    index = (u * values.size).astype(np.intp)
+    np.minimum(index, values.size - 1, out=index)
+    np.take(values, index, out=out)
+
+
+def _discrete_check(p):
+    if not p["values"]:
+        return "se requiere al menos un valor"
+    if p["probs"] and (len(p["probs"]) != len(p["values"]) or min(p["probs"]) < 0 or sum(p["probs"]) <= 0):
+        return "probs debe tener una probabilidad no negativa por valor"
+
+
+def discrete_cumulative(p):
+    probs = np.asarray(p["probs"] or [1.0] * len(p["values"]), dtype=np.float64)
+    cumulative = np.cumsum(probs)
+    return cumulative / cumulative[-1]
+
+
+@register_distribution("discrete", {"values": [], "probs": []}, "Discreta",
+                       [("values", "Valores (separados por comas)"), ("probs", "Probabilidades (opcional)")],
+                       _discrete_check)
+def _discrete(rng, p, out):
+    values = np.asarray(p["values"], dtype=np.float64)
+    rng.random(out=out)
+    index = np.searchsorted(discrete_cumulative(p), out, side="right")
+    np.minimum(index, values.size - 1, out=index)
+    np.take(values, index, out=out)
+
+
+@register_inverse("discrete")
+def _discrete_ppf(p, u, out):
+    values = np.asarray(p["values"], dtype=np.float64)
+    probs = np.asarray(p["probs"] or [1.0] * values.size, dtype=np.float64)
+    order = np.argsort(values, kind="stable")
+    cumulative = np.cumsum(probs[order])
+    index = np.searchsorted(cumulative / cumulative[-1], u, side="right")
+    np.minimum(index, values.size - 1, out=index)
+    np.take(values[order], index, out=out)
@@ -0,0 +1,587 @@
+"""Núcleo de muestreo del motor Monte Carlo.
+
+Este módulo solo depende de numpy, del registro de ``distributions`` y de los
+acumuladores de ``stats`` para que los procesos del modo paralelo arranquen
+rápido (no importan matplotlib ni pandas).
+"""
+import itertools
+import os
+import time
+import warnings
+
+import numpy as np
+from scipy import special
+
+from columns import ColumnStore, column_seed, digest
+from correlation import apply_copula, iman_conover
+from distributions import get_distribution
+from formulas import compile_outputs
+from stats import CoMoments, StreamingStats, TDigest
+
+
+# Forma parte de la clave de caché de resultados: incrementar al cambiar
+# cualquier cosa que altere los números que produce una misma semilla
+ENGINE_VERSION = "9"
+# Tamaño de bloque por variable: acota la memoria pico independientemente de `iterations`
+CHUNK_SIZE = 65536
+# Iteraciones por lote en el modo de precisión objetivo
+ADAPTIVE_BATCH = 10000
+# Filas de la matriz de muestras que se conservan para las correlaciones de Spearman
+SENSITIVITY_HEAD = 20000
+
+
+def prepare_variables(variables):
+    """Resuelve distribución y parámetros validados de cada variable."""
+    prepared = []
+    for var in variables:
+        dist = get_distribution(var.get("distribution"))
+        prepared.append((dist, dist.parse_params(var.get("params"))))
+    return prepared
+
+
+SAMPLING_METHODS = {
+    "random": "Pseudoaleatorio",
+    "lhs": "Latin Hypercube",
+    "sobol": "Sobol (QMC)",
+    "antithetic": "Variables antitéticas",
+}
+STOP_REASONS = {
+    "fixed": "Iteraciones fijas",
+    "precision": "Precisión objetivo alcanzada",
+    "max_iterations": "Máximo de iteraciones",
+    "time_budget": "Tiempo máximo",
+}
+# Réplicas independientes para estimar el error estándar de LHS y Sobol
+QMC_REPLICATES = 10
+# Métodos en los que cada variable puede muestrearse por separado (Sobol acopla las dimensiones)
+INCREMENTAL_SAMPLING = ("random", "lhs", "antithetic")
+# Evita 0 y 1 exactos en la inversa de la CDF (p. ej. ndtri(0) = -inf)
+_U_EPS = 1e-12
+
+
+class PartialResult:
+    """Acumuladores de una ejecución parcial; se fusionan en orden de worker.
+
+    Corresponde a la salida principal; ``outputs`` tiene los de las demás salidas.
+    """
+
+    def __init__(self):
+        self.stats = StreamingStats()
+        self.digest = TDigest()
+        self.preview = None
+        # (iteraciones, media) de cada réplica independiente (LHS / Sobol)
+        self.replicates = []
+        # Medias de cada par antitético
+        self.pairs = StreamingStats()
+        # Sensibilidad: co-momentos entradas/total y primeras muestras (variables + total)
+        self.comoments = None
+        self.head = None
+        self.outputs = []
+        # Segundos por etapa (sampling, evaluation, aggregation), sumados al fusionar
+        self.timings = {}
+
+    def update(self, total):
+        self.stats.update(total)
+        self.digest.update(total)
+        if self.preview is None:
+            self.preview = total[:200].tolist()
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.digest.merge(other.digest)
+        if self.preview is None:
+            self.preview = other.preview
+        self.replicates.extend(other.replicates)
+        self.pairs.merge(other.pairs)
+        for mine, theirs in zip(self.outputs, other.outputs):
+            mine.merge(theirs)
+        for stage, seconds in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if other.comoments is not None:
+            if self.comoments is None:
+                self.comoments, self.head = other.comoments, other.head
+            else:
+                self.comoments.merge(other.comoments)
+                missing = SENSITIVITY_HEAD - self.head.shape[1]
+                if missing > 0:
+                    self.head = np.hstack((self.head, other.head[:, :missing]))
+
+    def add_time(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def track_inputs(self, samples, total):
+        """Acumula lo necesario para el análisis de sensibilidad de este bloque."""
+        if self.comoments is None:
+            self.comoments = CoMoments(samples.shape[0])
+            self.head = np.empty((samples.shape[0] + 1, 0))
+        self.comoments.update(samples, total)
+        missing = SENSITIVITY_HEAD - self.head.shape[1]
+        if missing > 0:
+            self.head = np.hstack((self.head, np.vstack((samples[:, :missing], total[None, :missing]))))
+
+    def standard_error(self, sampling):
+        """Error estándar de la media alcanzado con el método de muestreo."""
+        if sampling == "antithetic":
+            return self.pairs.std / np.sqrt(self.pairs.count) if self.pairs.count > 1 else float("nan")
+        if sampling in ("lhs", "sobol"):
+            if len(self.replicates) < 2:
+                return float("nan")
+            means = np.array([mean for _, mean in self.replicates])
+            return float(means.std(ddof=1) / np.sqrt(means.size))
+        return self.stats.std / np.sqrt(self.stats.count)
+
+    def relative_error(self, sampling, quantiles=(0.05, 0.95), z=1.96):
+        """Mayor semiancho relativo del IC entre la media y los cuantiles.
+
+        El IC de cada cuantil es el de orden estadístico (libre de
+        distribución): cuantiles q ± z·sqrt(q(1-q)/n) leídos del t-digest.
+        Un valor menor que la desviación típica (p. ej. una media cercana a
+        cero) se compara con la desviación típica: si no, el error relativo
+        no bajaría nunca del objetivo.
+        """
+        n = self.stats.count
+        if n < 2:
+            return float("inf")
+        scale = max(float(self.stats.std), 1e-12)
+        errors = [z * self.standard_error(sampling) / max(abs(self.stats.mean), scale)]
+        for q in quantiles:
+            spread = z * np.sqrt(q * (1 - q) / n)
+            low, mid, high = self.digest.quantile([max(q - spread, 0.0), q, min(q + spread, 1.0)])
+            errors.append((high - low) / 2 / max(abs(mid), scale))
+        errors = np.asarray(errors, dtype=np.float64)
+        return float(np.nanmax(errors)) if not np.isnan(errors).all() else float("inf")
+
+
+def _uniform_block(sampling, rng, u, sobol=None):
+    """Rellena ``u`` (variables x iteraciones) con uniformes según el método."""
+    dims, size = u.shape
+    if sampling == "lhs":
+        # Un estrato por iteración y dimensión, permutado de forma independiente
+        rng.random(out=u)
+        u += rng.permuted(np.broadcast_to(np.arange(size, dtype=np.float64), (dims, size)), axis=1)
+        u /= size
+    elif sampling == "sobol":
+        with warnings.catch_warnings():
+            # Los bloques no siempre son potencia de 2; se acepta la pérdida de balance
+            warnings.simplefilter("ignore", UserWarning)
+            u[:] = sobol.random(size).T
+    elif sampling == "antithetic":
+        half = size // 2
+        for row in u:
+            rng.random(out=row[:half])
+            np.subtract(1.0, row[:half], out=row[half:2 * half])
+            if size % 2:
+                row[-1] = rng.random()
+    np.clip(u, _U_EPS, 1 - _U_EPS, out=u)
+
+
+def _sobol_engine(dims, rng):
+    from scipy.stats import qmc
+
+    return qmc.Sobol(dims, scramble=True, seed=rng)
+
+
+def create_sample_file(path, columns, iterations):
+    """Crea el .npy (columnas x iteraciones, float32) que rellenan los workers."""
+    np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(columns, iterations)).flush()
+
+
+def truncate_sample_file(path, count, chunk_size=CHUNK_SIZE):
+    """Recorta el archivo a ``count`` iteraciones (el modo adaptativo reserva el máximo)."""
+    source = np.lib.format.open_memmap(path, mode="r")
+    if source.shape[1] == count:
+        return
+    tmp = path + ".tmp"
+    try:
+        target = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(source.shape[0], count))
+        for start in range(0, count, chunk_size):
+            stop = min(start + chunk_size, count)
+            target[:, start:stop] = source[:, start:stop]
+        target.flush()
+        del source, target
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def simulate_partial(variables, iterations, seed_seq, chunk_size=CHUNK_SIZE, progress=None, deadline=None,
+                     sampling="random", replicates=1, sample_file=None, sensitivity=False, correlation=None,
+                     outputs=None):
+    """Ejecuta `iterations` iteraciones con su propio Generator y devuelve
+    un PartialResult. LHS y Sobol reparten las iteraciones en `replicates`
+    diseños independientes para poder estimar el error estándar.
+
+    Con ``sample_file=(ruta, desplazamiento)`` las muestras de cada variable y el
+    total se escriben en su tramo del archivo creado por ``create_sample_file``.
+    Con ``sensitivity`` se acumulan además los datos de ``PartialResult.track_inputs``.
+    ``correlation`` ({"method", "lower"}) correlaciona las variables (ver correlation.py).
+    ``outputs`` ([{"name", "expression"}], ver formulas.py) sustituye a la suma de las
+    variables; la primera es la salida principal (sensibilidad y precisión).
+    """
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Método de muestreo desconocido: {sampling}")
+    rng = np.random.default_rng(seed_seq)
+    prepared = prepare_variables(variables)
+    formulas = compile_outputs(outputs, variables)
+    store, offset = None, 0
+    if sample_file is not None:
+        store, offset = np.lib.format.open_memmap(sample_file[0], mode="r+"), sample_file[1]
+    # Buffers reutilizados en cada bloque: una fila por variable y el total
+    width = min(chunk_size, iterations)
+    buffer = np.empty(len(prepared) * width)
+    values = np.empty((len(formulas), width))
+    registers = max([formula.registers for _, formula in formulas if formula is not None] or [0])
+    registers = np.empty((registers, width))
+    method = lower = scratch = None
+    if correlation is not None and prepared:
+        method, lower = correlation["method"], np.asarray(correlation["lower"], dtype=np.float64)
+        if method == "cholesky":
+            scratch = np.empty_like(buffer)
+    results = [PartialResult() for _ in formulas]
+    result = results[0]
+    result.outputs = results[1:]
+    done = 0
+    for replicate_size in split_iterations(iterations, max(1, replicates)):
+        sobol = _sobol_engine(len(prepared), rng) if sampling == "sobol" and prepared else None
+        replicate = [StreamingStats() for _ in formulas]
+        replicate_done = 0
+        while replicate_done < replicate_size:
+            size = min(chunk_size, replicate_size - replicate_done)
+            started = time.perf_counter()
+            # Vista contigua (variables x size) sobre el buffer preasignado
+            samples = buffer[:len(prepared) * size].reshape(len(prepared), size)
+            if method == "cholesky":
+                # Cópula gaussiana: normales -> L·z -> uniformes correlacionadas -> inversa de la CDF
+                if sampling == "random":
+                    rng.standard_normal(out=samples)
+                else:
+                    _uniform_block(sampling, rng, samples, sobol)
+                    special.ndtri(samples, out=samples)
+                apply_copula(samples, lower, scratch[:samples.size].reshape(samples.shape))
+                np.clip(samples, _U_EPS, 1 - _U_EPS, out=samples)
+                for row, (dist, params) in zip(samples, prepared):
+                    dist.ppf(params, row, row)
+            elif sampling == "random":
+                for row, (dist, params) in zip(samples, prepared):
+                    dist.sample(rng, params, row)
+            else:
+                _uniform_block(sampling, rng, samples, sobol)
+                for row, (dist, params) in zip(samples, prepared):
+                    dist.ppf(params, row, row)
+            if method == "iman_conover":
+                iman_conover(samples, lower, rng)
+            sampled = time.perf_counter()
+            # Salidas por iteración: suma de las variables o fórmulas compiladas
+            block = values[:, :size]
+            for out, (_, formula) in zip(block, formulas):
+                if formula is None:
+                    np.sum(samples, axis=0, out=out)
+                else:
+                    formula.evaluate(samples, out, registers)
+            total = block[0]
+            evaluated = time.perf_counter()
+
+            if store is not None:
+                position = offset + done
+                store[:len(prepared), position:position + size] = samples
+                store[len(prepared):, position:position + size] = block
+
+            _update_outputs(results, replicate, block, sampling)
+            if sensitivity and prepared:
+                result.track_inputs(samples, total)
+            result.add_time("sampling", sampled - started)
+            result.add_time("evaluation", evaluated - sampled)
+            result.add_time("aggregation", time.perf_counter() - evaluated)
+            replicate_done += size
+            done += size
+
+            if progress is not None:
+                progress(done / iterations)
+            if deadline is not None and done < iterations and time.time() > deadline:
+                raise TimeoutError("La simulación superó el tiempo máximo permitido")
+        for partial, stats in zip(results, replicate):
+            partial.replicates.append((stats.count, stats.mean))
+    if store is not None:
+        store.flush()
+    return result
+
+
+def simulate_incremental(variables, iterations, seed, store=None, chunk_size=CHUNK_SIZE, progress=None,
+                         deadline=None, sampling="random", replicates=1, sample_file=None, sensitivity=False,
+                         outputs=None):
+    """Como ``simulate_partial`` pero con una columna por variable reutilizable entre ejecuciones.
+
+    Cada variable (``variables[i]["id"]`` obligatorio) se muestrea con
+    ``column_seed(seed, id)``, así que su columna solo depende de ella; las que
+    ya están en ``store`` (un ``ColumnStore``) no se vuelven a muestrear. La
+    suma de las variables se deriva del total guardado más parecido y las
+    fórmulas se evalúan sobre las columnas; las estadísticas se recalculan
+    siempre a partir del resultado. ``result.columns`` indica qué se reutilizó.
+    """
+    if sampling not in INCREMENTAL_SAMPLING:
+        raise ValueError(f"El muestreo {sampling} no admite re-simulación incremental")
+    store = store or ColumnStore()
+    prepared = prepare_variables(variables)
+    formulas = compile_outputs(outputs, variables)
+    replicates = max(1, replicates)
+    scope = digest("scope", ENGINE_VERSION, int(seed), iterations, sampling, replicates, chunk_size)
+    keys = [digest("column", scope, var["id"], var.get("distribution"), params)
+            for var, (_, params) in zip(variables, prepared)]
+
+    started = time.perf_counter()
+    columns, sampled = [], []
+    missing = sum(1 for key in keys if store.get(key) is None)
+    for var, (dist, params), key in zip(variables, prepared, keys):
+        column = store.get(key)
+        if column is None:
+            column = store.create(key, iterations)
+            _sample_column(dist, params, column, column_seed(seed, var["id"]), sampling, replicates, chunk_size,
+                           deadline)
+            column = store.commit(key, column)
+            sampled.append(var.get("name"))
+            if progress is not None:
+                # El muestreo de las columnas nuevas es casi todo el trabajo
+                progress(0.9 * len(sampled) / (missing + 1))
+        columns.append(column)
+    total, how = None, None
+    if prepared and any(formula is None for _, formula in formulas):
+        total, how = store.total(scope, keys, columns, chunk_size)
+    sampled_at = time.perf_counter()
+
+    store_file, offset = None, 0
+    if sample_file is not None:
+        store_file, offset = np.lib.format.open_memmap(sample_file[0], mode="r+"), sample_file[1]
+    width = min(chunk_size, iterations)
+    buffer = np.empty(len(prepared) * width)
+    values = np.empty((len(formulas), width))
+    registers = max([formula.registers for _, formula in formulas if formula is not None] or [0])
+    registers = np.empty((registers, width))
+    results = [PartialResult() for _ in formulas]
+    result = results[0]
+    result.outputs = results[1:]
+    # Mismos bloques que al muestrear: LHS y antitéticas se estratifican/emparejan por bloque
+    position = 0
+    for replicate_size in split_iterations(iterations, replicates):
+        replicate = [StreamingStats() for _ in formulas]
+        for start in range(0, replicate_size, chunk_size):
+            size = min(chunk_size, replicate_size - start)
+            samples = buffer[:len(prepared) * size].reshape(len(prepared), size)
+            for row, column in zip(samples, columns):
+                row[:] = column[position:position + size]
+            block = values[:, :size]
+            for out, (_, formula) in zip(block, formulas):
+                if formula is None:
+                    if total is None:
+                        out.fill(0.0)
+                    else:
+                        out[:] = total[position:position + size]
+                else:
+                    formula.evaluate(samples, out, registers)
+            if store_file is not None:
+                store_file[:len(prepared), offset + position:offset + position + size] = samples
+                store_file[len(prepared):, offset + position:offset + position + size] = block
+            _update_outputs(results, replicate, block, sampling)
+            if sensitivity and prepared:
+                result.track_inputs(samples, block[0])
+            position += size
+        for partial, stats in zip(results, replicate):
+            partial.replicates.append((stats.count, stats.mean))
+    if store_file is not None:
+        store_file.flush()
+    store.prune(keep=keys)
+    if progress is not None:
+        progress(1.0)
+    result.add_time("sampling", sampled_at - started)
+    result.add_time("aggregation", time.perf_counter() - sampled_at)
+    result.columns = {"reused": len(keys) - len(sampled), "sampled": sampled, "total": how}
+    return result
+
+
+def _sample_column(dist, params, out, seed_seq, sampling, replicates, chunk_size, deadline):
+    # Los mismos bloques y réplicas que simulate_partial, con un generador propio de la variable
+    rng = np.random.default_rng(seed_seq)
+    position = 0
+    for replicate_size in split_iterations(out.shape[0], replicates):
+        for start in range(0, replicate_size, chunk_size):
+            size = min(chunk_size, replicate_size - start)
+            row = out[position:position + size]
+            if sampling == "random":
+                dist.sample(rng, params, row)
+            else:
+                _uniform_block(sampling, rng, row[None, :])
+                dist.ppf(params, row, row)
+            position += size
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError("La simulación superó el tiempo máximo permitido")
+
+
+def _update_outputs(results, replicate, block, sampling):
+    # Un PartialResult y un StreamingStats de réplica por salida (filas de `block`)
+    for partial, stats, out in zip(results, replicate, block):
+        partial.update(out)
+        stats.update(out)
+        if sampling == "antithetic":
+            half = out.size // 2
+            partial.pairs.update((out[:half] + out[half:2 * half]) / 2)
+
+
+def expand_grid(variables, grid, limit=None):
+    """Escenarios del producto cartesiano de ``grid``, precedidos por el base.
+
+    Cada eje es ``{"variable", "param", "values": [...]}`` o ``{"variable",
+    "param", "factors": [...]}`` (multiplica el valor base). Devuelve
+    ``[{"label", "overrides": {variable: {parámetro: valor}}}]``; las
+    combinaciones iguales al base se omiten y los parámetros se validan.
+    """
+    by_name = {var.get("name"): var for var in variables}
+    axes = []
+    for axis in grid or []:
+        var = by_name.get(axis.get("variable"))
+        if var is None:
+            raise ValueError(f"Variable desconocida: {axis.get('variable')}")
+        dist = get_distribution(var.get("distribution"))
+        base = dist.parse_params(var.get("params"))
+        key = axis.get("param")
+        if key not in base or isinstance(base[key], list):
+            raise ValueError(f"{dist.label}: parámetro no variable: {key}")
+        if axis.get("factors"):
+            points = [(base[key] * float(f), f"{var['name']}.{key} ×{float(f):g}") for f in axis["factors"]]
+        elif axis.get("values"):
+            points = [(float(v), f"{var['name']}.{key} = {float(v):g}") for v in axis["values"]]
+        else:
+            raise ValueError(f"Indique values o factors para {var['name']}.{key}")
+        axes.append([(var["name"], key, value, label, value == base[key]) for value, label in points])
+
+    scenarios = [{"label": "Base", "overrides": {}}]
+    for combination in itertools.product(*axes) if axes else []:
+        if all(unchanged for *_, unchanged in combination):
+            continue
+        overrides = {}
+        for name, key, value, _, unchanged in combination:
+            if not unchanged:
+                overrides.setdefault(name, {})[key] = value
+        for name, params in overrides.items():
+            var = by_name[name]
+            get_distribution(var.get("distribution")).parse_params(dict(var.get("params") or {}, **params))
+        label = ", ".join(label for *_, label, unchanged in combination if not unchanged)
+        scenarios.append({"label": label, "overrides": overrides})
+        if limit is not None and len(scenarios) > limit:
+            raise ValueError(f"La rejilla supera el máximo de {limit} escenarios")
+    return scenarios
+
+
+def stack_scenarios(variables, scenarios):
+    """Distribución y parámetros de cada variable con un eje de escenarios.
+
+    ``scenarios`` es una lista de ``{nombre de variable: {parámetro: valor}}``.
+    Los parámetros que cambian entre escenarios pasan a ser columnas (escenarios x 1)
+    que la inversa de la CDF difunde sobre el bloque; devuelve ``(dist, params, varía)``.
+    """
+    stacked = []
+    for var in variables:
+        dist = get_distribution(var.get("distribution"))
+        base = dist.parse_params(var.get("params"))
+        per_scenario = [dist.parse_params(dict(base, **(scenario.get(var.get("name")) or {})))
+                        for scenario in scenarios]
+        params, varies = dict(base), False
+        for key, default in base.items():
+            column = [params_s[key] for params_s in per_scenario]
+            if not isinstance(default, list) and any(value != column[0] for value in column):
+                params[key] = np.asarray(column, dtype=np.float64)[:, None]
+                varies = True
+        stacked.append((dist, params, varies))
+    return stacked
+
+
+def simulate_scenarios(variables, scenarios, iterations, seed_seq, chunk_size=CHUNK_SIZE, progress=None,
+                       deadline=None, sampling="random", replicates=1, correlation=None, outputs=None):
+    """Ejecuta todos los escenarios a la vez con números aleatorios comunes.
+
+    Cada bloque genera una sola matriz de uniformes (variables x n) y cada
+    escenario la transforma con la inversa de la CDF de sus parámetros, así
+    que las diferencias entre escenarios no tienen ruido de muestreo propio.
+    Devuelve una lista de PartialResult, una por escenario.
+    """
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Método de muestreo desconocido: {sampling}")
+    rng = np.random.default_rng(seed_seq)
+    stacked = stack_scenarios(variables, scenarios)
+    formulas = compile_outputs(outputs, variables)
+    dims, count = len(stacked), len(scenarios)
+    # El bloque tiene un eje más (escenarios): se reduce para acotar la memoria
+    chunk_size = max(1024, chunk_size // count)
+    width = min(chunk_size, iterations)
+    buffer = np.empty(dims * width)
+    samples = np.empty((count, dims, width))
+    values = np.empty((count, len(formulas), width))
+    registers = max([formula.registers for _, formula in formulas if formula is not None] or [0])
+    registers = np.empty((registers, width))
+    method = lower = scratch = None
+    if correlation is not None and dims:
+        method, lower = correlation["method"], np.asarray(correlation["lower"], dtype=np.float64)
+        scratch = np.empty_like(buffer)
+    results = []
+    for _ in scenarios:
+        scenario = [PartialResult() for _ in formulas]
+        scenario[0].outputs = scenario[1:]
+        results.append(scenario)
+    done = 0
+    for replicate_size in split_iterations(iterations, max(1, replicates)):
+        sobol = _sobol_engine(dims, rng) if sampling == "sobol" and dims else None
+        replicate = [[StreamingStats() for _ in formulas] for _ in scenarios]
+        replicate_done = 0
+        while replicate_done < replicate_size:
+            size = min(chunk_size, replicate_size - replicate_done)
+            started = time.perf_counter()
+            u = buffer[:dims * size].reshape(dims, size)
+            if sampling == "random":
+                rng.random(out=u)
+                np.clip(u, _U_EPS, 1 - _U_EPS, out=u)
+            else:
+                _uniform_block(sampling, rng, u, sobol)
+            # La correlación se impone sobre las uniformes: vale igual para todos los escenarios
+            if method == "cholesky":
+                special.ndtri(u, out=u)
+                apply_copula(u, lower, scratch[:u.size].reshape(u.shape))
+                np.clip(u, _U_EPS, 1 - _U_EPS, out=u)
+            elif method == "iman_conover":
+                iman_conover(u, lower, rng)
+
+            block = samples[:, :, :size]
+            for row, (dist, params, varies) in zip(range(dims), stacked):
+                if varies:
+                    dist.ppf(params, u[row], block[:, row])
+                else:
+                    dist.ppf(params, u[row], block[0, row])
+                    block[1:, row] = block[0, row]
+            sampled = time.perf_counter()
+            for scenario, scenario_samples, scenario_values, stats in zip(results, block, values, replicate):
+                out_block = scenario_values[:, :size]
+                for out, (_, formula) in zip(out_block, formulas):
+                    if formula is None:
+                        np.sum(scenario_samples, axis=0, out=out)
+                    else:
+                        formula.evaluate(scenario_samples, out, registers)
+                _update_outputs(scenario, stats, out_block, sampling)
+            # Evaluación y agregación van intercaladas por escenario: se cuentan juntas
+            results[0][0].add_time("sampling", sampled - started)
+            results[0][0].add_time("aggregation", time.perf_counter() - sampled)
+            replicate_done += size
+            done += size
+
+            if progress is not None:
+                progress(done / iterations)
+            if deadline is not None and done < iterations and time.time() > deadline:
+                raise TimeoutError("La simulación superó el tiempo máximo permitido")
+        for scenario, stats in zip(results, replicate):
+            for partial, replicate_stats in zip(scenario, stats):
+                partial.replicates.append((replicate_stats.count, replicate_stats.mean))
+    return [scenario[0] for scenario in results]
+
+
+def split_iterations(total, parts):
+    """Reparte `total` en `parts` enteros que difieren como mucho en 1."""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
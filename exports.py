@@ -0,0 +1,221 @@
+"""Exportación de reportes a PDF y DOCX en segundo plano.
+
+Cada exportación se genera una sola vez por reporte y versión de plantilla:
+``report_exports`` guarda (reporte, formato, hash de plantilla) -> clave del
+artefacto en el almacén. WeasyPrint y python-docx se ejecutan en un pool de
+procesos y solo se importan allí, así que no cuestan nada al arrancar la web.
+"""
+import atexit
+import hashlib
+import inspect
+import io
+import logging
+import multiprocessing
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from flask import render_template
+from sqlalchemy.exc import IntegrityError
+
+from metrics import metrics
+from models import db, ReportExport
+from storage import artifact_store
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "pdf": ("application/pdf", "report_pdf.html"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", None),
+}
+# Entrada del zip con los reportes cuyo archivo ya no está en el almacén
+MISSING_ENTRY = "MISSING.txt"
+
+
+def _timed(render, *args):
+    # Tiempo de generación medido en el pool, sin la espera en la cola
+    started = time.perf_counter()
+    data = render(*args)
+    return time.perf_counter() - started, data
+
+
+def _render_pdf(html, base_url):
+    # Se ejecuta en el pool: import perezoso, WeasyPrint tarda en cargar
+    from weasyprint import HTML
+
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def _render_docx(data):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(data["name"], level=1)
+    doc.add_paragraph(f"Proyecto: {data['project']}")
+    doc.add_paragraph(f"Creado: {data['created_at']}")
+    doc.add_heading("Resumen", level=2)
+    for k, v in data["summary"].items():
+        doc.add_paragraph(f"{k}: {v}")
+    bio = io.BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
+
+def export_filename(report, fmt):
+    return f"report_{report.id}.{fmt}"
+
+
+class _ZipStream:
+    """Destino de ``zipfile`` sin ``seek``: acumula lo escrito hasta que se consume."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(entries, chunk_size=65536):
+    """Genera un zip por trozos a partir de ``(nombre, archivo)``; nunca lo guarda entero.
+
+    Las entradas sin archivo (artefacto borrado del almacén) se listan en ``MISSING.txt``.
+    """
+    stream = _ZipStream()
+    missing = []
+    # ZIP_STORED: PDF y DOCX ya van comprimidos
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, source in entries:
+            if source is None:
+                missing.append(name)
+                continue
+            with source, archive.open(name, "w", force_zip64=True) as dest:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    dest.write(block)
+                    yield stream.drain()
+            yield stream.drain()
+        if missing:
+            logger.warning("Zip de exportaciones sin %d archivo(s): %s", len(missing), ", ".join(missing))
+            archive.writestr(MISSING_ENTRY, "No se encontró el archivo exportado de:\n" + "\n".join(missing) + "\n")
+    yield stream.drain()
+
+
+class ExportQueue:
+    """Pool de procesos para exportaciones; el resultado se guarda al terminar cada una."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._hashes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("EXPORT_POOL_SIZE", 1)
+        app.config.setdefault("EXPORT_TIMEOUT", 120)
+        self.app = app
+        app.extensions["export_queue"] = self
+
+    def _ensure_started(self):
+        if self._executor is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.app.config["EXPORT_POOL_SIZE"], mp_context=ctx)
+            atexit.register(self.shutdown)
+
+    def template_hash(self, fmt):
+        """Hash de la plantilla (PDF) o del generador (DOCX): cambia la versión de la exportación."""
+        if fmt not in self._hashes:
+            template = EXPORT_FORMATS[fmt][1]
+            if template:
+                source = self.app.jinja_env.loader.get_source(self.app.jinja_env, template)[0]
+            else:
+                source = inspect.getsource(_render_docx)
+            self._hashes[fmt] = hashlib.sha256(source.encode()).hexdigest()
+        return self._hashes[fmt]
+
+    def lookup(self, report, fmt):
+        return ReportExport.query.filter_by(report_id=report.id, format=fmt,
+                                            template_hash=self.template_hash(fmt)).first()
+
+    def request(self, report, fmt, retry=False, chart_src=None, base_url=None):
+        """Devuelve la exportación vigente, encolándola si falta (o si ``retry`` y falló)."""
+        export = self.lookup(report, fmt)
+        if export is not None:
+            # Un worker que murió deja la fila en "queued" para siempre
+            stale = (export.status == "queued" and export.created_at
+                     < datetime.utcnow() - timedelta(seconds=self.app.config["EXPORT_TIMEOUT"]))
+            missing = export.status == "done" and not artifact_store.exists(export.artifact_key)
+            if not (stale or missing or (retry and export.status == "failed")):
+                return export
+        else:
+            export = ReportExport(report_id=report.id, format=fmt, template_hash=self.template_hash(fmt))
+            db.session.add(export)
+        export.status = "queued"
+        export.error = None
+        export.artifact_key = None
+        export.created_at = datetime.utcnow()
+        export.finished_at = None
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición la encoló a la vez
+            db.session.rollback()
+            return self.lookup(report, fmt)
+
+        if fmt == "pdf":
+            html = render_template("report_pdf.html", report=report, chart_src=chart_src)
+            task = partial(_timed, _render_pdf, html, base_url)
+        else:
+            data = {"name": report.name, "project": report.project.name, "created_at": str(report.created_at),
+                    "summary": report.results.get("summary", {})}
+            task = partial(_timed, _render_docx, data)
+        with self._lock:
+            self._ensure_started()
+            future = self._executor.submit(task)
+        future.add_done_callback(partial(self._finish, export.id))
+        return export
+
+    def _finish(self, export_id, future):
+        # Callback en un hilo del pool: necesita su propio contexto de aplicación
+        with self.app.app_context():
+            export = db.session.get(ReportExport, export_id)
+            if export is None:
+                return
+            try:
+                seconds, data = future.result()
+                metrics.observe("export_render_seconds", seconds, format=export.format)
+                export.artifact_key = artifact_store.put(data, EXPORT_FORMATS[export.format][0])
+                export.status = "done"
+            except Exception as e:
+                export.status = "failed"
+                export.error = str(e) or e.__class__.__name__
+            export.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor = None
+
+
+export_queue = ExportQueue()
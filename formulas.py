@@ -0,0 +1,278 @@
+"""Fórmulas de salida definidas por el usuario sobre las variables del proyecto.
+
+Una expresión como ``ingresos * unidades - costo_fijo`` o
+``max(0, demanda - capacidad)`` se analiza con ``ast`` admitiendo solo una
+lista blanca de nodos (números, nombres de variables, operadores aritméticos,
+comparaciones y las funciones de ``FUNCTIONS``) y se compila una vez a:
+
+- una expresión de numexpr, que evalúa por bloques en
+  caché sin arrays temporales del tamaño del bloque, o
+- un programa de ufuncs de numpy con ``out=``: cada resultado intermedio se
+  escribe en un registro preasignado que se reutiliza en cuanto deja de
+  usarse, así que evaluar no reserva memoria.
+
+Los nombres de variables que no son identificadores válidos ("Costo fijo")
+se escriben con ``_`` en lugar de los caracteres no válidos (``Costo_fijo``);
+si dos variables quedan con el mismo identificador las fórmulas se rechazan.
+"""
+import ast
+import re
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:  # entorno sin requirements.txt completo: se usa el programa de ufuncs
+    numexpr = None
+
+# Nombre de la salida por defecto (suma de todas las variables)
+DEFAULT_OUTPUT = "total"
+MAX_EXPRESSION_LENGTH = 500
+COMPILE_CACHE_SIZE = 256
+
+_BINARY = {
+    ast.Add: (np.add, "+"),
+    ast.Sub: (np.subtract, "-"),
+    ast.Mult: (np.multiply, "*"),
+    ast.Div: (np.true_divide, "/"),
+    ast.Pow: (np.power, "**"),
+    ast.Mod: (np.mod, "%"),
+}
+_COMPARE = {
+    ast.Lt: (np.less, "<"),
+    ast.LtE: (np.less_equal, "<="),
+    ast.Gt: (np.greater, ">"),
+    ast.GtE: (np.greater_equal, ">="),
+    ast.Eq: (np.equal, "=="),
+    ast.NotEq: (np.not_equal, "!="),
+}
+# nombre -> (ufunc o None, aridad mínima, aridad máxima, disponible en numexpr)
+FUNCTIONS = {
+    "max": (np.maximum, 2, None, True),
+    "min": (np.minimum, 2, None, True),
+    "abs": (np.absolute, 1, 1, True),
+    "exp": (np.exp, 1, 1, True),
+    "log": (np.log, 1, 1, True),
+    "sqrt": (np.sqrt, 1, 1, True),
+    "floor": (np.floor, 1, 1, False),
+    "ceil": (np.ceil, 1, 1, False),
+    "where": (None, 3, 3, True),
+    "clip": (None, 3, 3, True),
+}
+CONSTANTS = {"pi": np.pi, "e": np.e}
+
+
+def identifier(name):
+    """Nombre de una variable tal como se escribe en las fórmulas."""
+    name = re.sub(r"\W", "_", (name or "").strip())
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class CompiledFormula:
+    """Fórmula validada; ``evaluate`` escribe el resultado en ``out`` sin reservar memoria."""
+
+    def __init__(self, expression, names):
+        self.expression = expression
+        self.names = names
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise FormulaError(f"Fórmula inválida: {e.msg}") from None
+        self.program = []
+        self.registers = 0
+        self._free = []
+        self._fused = True
+        self.result = self._compile(tree.body)
+        self.uses = sorted({arg[1] for _, args, _ in self.program for arg in args if arg[0] == "var"}
+                           | ({self.result[1]} if self.result[0] == "var" else set()))
+        self.numexpr = self._numexpr(tree.body) if numexpr is not None and self._fused else None
+
+    # --- compilación a programa de ufuncs -------------------------------------------------
+    def _register(self):
+        if self._free:
+            return self._free.pop()
+        self.registers += 1
+        return self.registers - 1
+
+    def _release(self, *operands):
+        for kind, value in operands:
+            if kind == "reg" and value not in self._free:
+                self._free.append(value)
+
+    def _emit(self, func, *args, in_place=True):
+        # Las ufuncs admiten que la salida sea una de sus entradas: se libera antes de asignar
+        if in_place:
+            self._release(*args)
+        dest = self._register()
+        if not in_place:
+            self._release(*args)
+        self.program.append((func, args, dest))
+        return ("reg", dest)
+
+    def _compile(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return ("const", float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id in self.names:
+                return ("var", self.names.index(node.id))
+            if node.id in CONSTANTS:
+                return ("const", CONSTANTS[node.id])
+            raise FormulaError(f"Variable desconocida: {node.id}")
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if operand[0] == "const":
+                return ("const", -operand[1])
+            return self._emit(np.negative, operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            left, right = self._compile(node.left), self._compile(node.right)
+            func = _BINARY[type(node.op)][0]
+            if left[0] == right[0] == "const":
+                return ("const", float(func(left[1], right[1])))
+            return self._emit(func, left, right)
+        if isinstance(node, ast.Compare):
+            if len(node.ops) != 1 or type(node.ops[0]) not in _COMPARE:
+                raise FormulaError("Solo se admiten comparaciones simples (a < b)")
+            return self._emit(_COMPARE[type(node.ops[0])][0], self._compile(node.left),
+                              self._compile(node.comparators[0]))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name = node.func.id
+            if name not in FUNCTIONS:
+                raise FormulaError(f"Función no permitida: {name}")
+            func, low, high, fused = FUNCTIONS[name]
+            if len(node.args) < low or (high is not None and len(node.args) > high):
+                raise FormulaError(f"Número de argumentos inválido en {name}()")
+            self._fused = self._fused and fused
+            args = [self._compile(arg) for arg in node.args]
+            if name == "where":
+                return self._emit(_where, *args, in_place=False)
+            if name == "clip":
+                return self._emit(np.minimum, self._emit(np.maximum, args[0], args[1]), args[2])
+            if high == 1:
+                return self._emit(func, args[0])
+            result = args[0]
+            for arg in args[1:]:
+                result = self._emit(func, result, arg)
+            return result
+        raise FormulaError(f"Expresión no permitida: {ast.unparse(node)}")
+
+    # --- traducción a numexpr -----------------------------------------------------------------
+    def _numexpr(self, node):
+        source = self._ne(node)
+        if isinstance(node, ast.Compare):
+            source = f"where({source}, 1.0, 0.0)"
+        return source
+
+    def _ne(self, node):
+        if isinstance(node, ast.Constant):
+            return repr(float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id in self.names:
+                # Nombres neutros: numexpr no admite identificadores no ASCII
+                return f"v{self.names.index(node.id)}"
+            return repr(float(CONSTANTS[node.id]))
+        if isinstance(node, ast.UnaryOp):
+            return f"({'-' if isinstance(node.op, ast.USub) else ''}{self._ne(node.operand)})"
+        if isinstance(node, ast.BinOp):
+            return f"({self._ne(node.left)} {_BINARY[type(node.op)][1]} {self._ne(node.right)})"
+        if isinstance(node, ast.Compare):
+            return f"({self._ne(node.left)} {_COMPARE[type(node.ops[0])][1]} {self._ne(node.comparators[0])})"
+        name, args = node.func.id, [self._ne(arg) for arg in node.args]
+        if name in ("max", "min"):
+            op = ">" if name == "max" else "<"
+            result = args[0]
+            for arg in args[1:]:
+                result = f"where({result} {op} {arg}, {result}, {arg})"
+            return result
+        if name == "clip":
+            low = f"where({args[0]} > {args[1]}, {args[0]}, {args[1]})"
+            return f"where({low} < {args[2]}, {low}, {args[2]})"
+        if name == "where":
+            return f"where(({args[0]}) != 0, {args[1]}, {args[2]})"
+        return f"{name}({', '.join(args)})"
+
+    # --- evaluación ---------------------------------------------------------------------------
+    def __call__(self, samples):
+        # Como modelo de sensibilidad.sobol_indices: variables x n -> n
+        return self.evaluate(samples, np.empty(samples.shape[1]))
+
+    def evaluate(self, samples, out, scratch=None):
+        """Evalúa sobre ``samples`` (variables x n) en ``out`` (n).
+
+        ``scratch`` (al menos ``registers`` x n) evita reservar los registros en cada llamada.
+        """
+        kind, value = self.result
+        if kind == "const":
+            out.fill(value)
+            return out
+        if kind == "var":
+            np.copyto(out, samples[value])
+            return out
+        if self.numexpr is not None:
+            local = {f"v{i}": samples[i] for i in self.uses}
+            return numexpr.evaluate(self.numexpr, local_dict=local, global_dict={}, out=out, casting="unsafe")
+        size = out.shape[0]
+        if scratch is None or scratch.shape[0] < self.registers or scratch.shape[1] < size:
+            scratch = np.empty((self.registers, size))
+        regs = scratch[:, :size]
+        last = len(self.program) - 1
+        for step, (func, args, dest) in enumerate(self.program):
+            operands = [regs[v] if k == "reg" else samples[v] if k == "var" else v for k, v in args]
+            func(*operands, out=out if step == last else regs[dest])
+        return out
+
+
+def _where(condition, a, b, out):
+    # Como np.where pero escribiendo en `out`; la condición es un registro 0/1
+    np.copyto(out, b)
+    np.copyto(out, a, where=np.asarray(condition) != 0)
+    return out
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile_cached(expression, names):
+    return CompiledFormula(expression, list(names))
+
+
+def compile_formula(expression, names):
+    """Compila ``expression`` sobre los identificadores ``names`` (memorizado por proceso).
+
+    La clave es la expresión junto con los nombres de las variables, es decir,
+    la versión del proyecto que afecta a la fórmula: renombrar o añadir
+    variables produce una compilación nueva y la anterior expira del LRU.
+    """
+    if not expression or not expression.strip():
+        raise FormulaError("La fórmula está vacía")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise FormulaError(f"La fórmula supera los {MAX_EXPRESSION_LENGTH} caracteres")
+    return _compile_cached(expression.strip(), tuple(names))
+
+
+def identifiers(variables):
+    """Identificadores de ``variables`` en orden; dos variables no pueden compartir uno."""
+    names, seen = [], {}
+    for var in variables:
+        name = identifier(var.get("name"))
+        if name in seen:
+            raise FormulaError(f"Las variables {seen[name]!r} y {var.get('name')!r} "
+                               f"se escriben igual en las fórmulas ({name}); renombre una de ellas")
+        seen[name] = var.get("name")
+        names.append(name)
+    return names
+
+
+def compile_outputs(outputs, variables):
+    """Fórmulas compiladas de ``outputs`` ([{"name", "expression"}]) sobre ``variables``.
+
+    Sin salidas definidas se usa la suma de todas las variables (``DEFAULT_OUTPUT``).
+    """
+    if not outputs:
+        return [(DEFAULT_OUTPUT, None)]
+    names = identifiers(variables)
+    return [(output["name"], compile_formula(output["expression"], names)) for output in outputs]
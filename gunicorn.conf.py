@@ -0,0 +1,68 @@
+"""Configuración de gunicorn: ``gunicorn -c gunicorn.conf.py app:app``.
+
+Con ``GUNICORN_PRELOAD=1`` (por defecto) la aplicación se importa una sola vez
+en el maestro y los workers la heredan por fork (copy-on-write): arrancan al
+instante y comparten las páginas de Flask, SQLAlchemy, numpy y scipy. Es
+seguro porque el maestro no abre hilos ni procesos: los pools de simulación y
+exportación y el planificador se crean en el primer uso, y las conexiones a la
+BD se descartan tras el fork.
+
+Cada proceso registra un informe de arranque: segundos hasta estar listo, RSS
+y qué dependencias pesadas tiene cargadas (deberían aparecer solo en los
+procesos del pool que las usan).
+"""
+import gc
+import os
+import resource
+import sys
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT') or 5000}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or 2)
+threads = int(os.environ.get("GUNICORN_THREADS") or 1)
+timeout = int(os.environ.get("GUNICORN_TIMEOUT") or 120)
+preload_app = (os.environ.get("GUNICORN_PRELOAD") or "1") == "1"
+# Reciclar workers acota el crecimiento de memoria por fragmentación
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS") or 0)
+max_requests_jitter = max_requests // 10
+
+HEAVY_MODULES = ("matplotlib", "weasyprint", "docx", "apscheduler", "pandas", "seaborn", "scipy.stats")
+
+_started = time.perf_counter()
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        # Sin /proc (macOS): pico de RSS en KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _report(log, who, seconds):
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    log.info("%s listo en %.2f s, RSS %.0f MB, módulos pesados: %s", who, seconds, _rss_mb(),
+             ", ".join(loaded) or "ninguno")
+
+
+def when_ready(server):
+    _report(server.log, "Maestro" + (" (preload)" if preload_app else ""), time.perf_counter() - _started)
+    if preload_app:
+        # Los objetos ya importados salen del GC: sus recorridos no ensucian las páginas compartidas
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+    if preload_app:
+        from app import app
+        from models import db
+
+        with app.app_context():
+            # Las conexiones del maestro (si las hubo) no se comparten con el hijo
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    _report(worker.log, f"Worker {worker.pid}", time.perf_counter() - worker.boot_started)
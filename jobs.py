@@ -0,0 +1,325 @@
+"""Cola de simulaciones en segundo plano.
+
+Las simulaciones se ejecutan en un pool de procesos acotado. El estado de cada
+trabajo vive en la tabla ``simulation_jobs`` para que cualquier worker de
+gunicorn pueda responder a las consultas de estado; el proceso que encoló el
+trabajo es el único que recoge el resultado y lo persiste.
+"""
+import atexit
+import base64
+import json
+import math
+import os
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from cache import result_cache
+from metrics import metrics
+from models import db, Report, SimulationJob, SimulationResult
+from storage import artifact_store, sample_store
+from utils import simulate_monte_carlo
+
+
+class QueueFullError(RuntimeError):
+    """La cola alcanzó SIM_QUEUE_LIMIT trabajos pendientes."""
+
+
+def _run_simulation(job_id, variables, options, progress, deadline):
+    # Se ejecuta dentro del pool: sin contexto de Flask ni acceso a la BD.
+    progress[job_id] = 0.0
+
+    def report(fraction):
+        progress[job_id] = fraction
+
+    # El motor comprueba `deadline` entre bloques y libera el proceso al agotarse el tiempo
+    return simulate_monte_carlo(variables, progress=report, deadline=deadline, **options)
+
+
+def _finite(value):
+    return value if value is not None and math.isfinite(value) else None
+
+
+def store_charts(results):
+    """Guarda los PNG (base64) de ``results["charts"]`` en el almacén de artefactos.
+
+    Devuelve una copia de ``results`` con ``chart_keys`` (nombre -> clave) en
+    lugar de las imágenes; así la caché y la BD solo guardan la clave.
+    """
+    charts = results.get("charts")
+    if not charts:
+        return results
+    keys = dict(results.get("chart_keys") or {})
+    for name, encoded in charts.items():
+        keys[name] = artifact_store.put(base64.b64decode(encoded), "image/png")
+    results = {key: value for key, value in results.items() if key != "charts"}
+    results["chart_keys"] = keys
+    return results
+
+
+def _legacy_histogram(chart_data):
+    # chart_data antiguo: JSON {"histogram_density": PNG en base64}
+    try:
+        charts = json.loads(chart_data) or {}
+    except ValueError:
+        return None
+    return charts.get("histogram_density") or None
+
+
+def legacy_chart(result):
+    """Histograma en base64 de ``chart_data`` (formato antiguo) o None; no modifica nada.
+
+    Solo lee la columna diferida si el resultado no tiene clave ni bins.
+    """
+    if result is None or result.chart_key or result.histogram_json or not result.chart_data:
+        return None
+    return _legacy_histogram(result.chart_data)
+
+
+def migrate_chart_data(result):
+    """Mueve el histograma de ``chart_data`` al almacén y vacía la columna; True si lo movió."""
+    if result.chart_key or not result.chart_data:
+        return False
+    encoded = _legacy_histogram(result.chart_data)
+    if encoded:
+        result.chart_key = artifact_store.put(base64.b64decode(encoded), "image/png")
+    result.chart_data = None
+    return bool(encoded)
+
+
+def save_simulation_report(project, results):
+    """Persiste un Report + un SimulationResult por salida (``results`` ya pasó por ``store_charts``)."""
+    r = build_simulation_report(project, results)
+    db.session.add(r)
+    db.session.flush()
+    return r
+
+
+def build_simulation_report(project, results):
+    """Report con sus SimulationResult, sin añadir a la sesión (``results`` ya pasó por ``store_charts``).
+
+    Añadir varios a la vez y hacer un solo flush inserta todas las filas en
+    lotes (``simulate-batch``).
+    """
+    summary = results.get("summary", {})
+    samples = results.get("samples")
+    scenarios = results.get("scenarios")
+    r = Report(project=project, name=f"{'Escenarios' if scenarios else 'Reporte'} {project.name} "
+                                     f"{datetime.utcnow().isoformat()}",
+               iterations_used=summary.get("sample_count"), stop_reason=summary.get("stop_reason"),
+               kind="sweep" if scenarios else "simulation",
+               scenarios_json=json.dumps(scenarios) if scenarios else None)
+
+    sim_result = _result_row(0, summary, results.get("histogram"))
+    sim_result.chart_key = (results.get("chart_keys") or {}).get("histogram_density")
+    sim_result.tornado_chart_key = (results.get("chart_keys") or {}).get("tornado")
+    sim_result.sensitivity_json = json.dumps(results["sensitivity"]) if results.get("sensitivity") else None
+    sim_result.samples_file = os.path.basename(samples["path"]) if samples else None
+    sim_result.samples_columns = json.dumps(samples["columns"]) if samples else None
+    r.outputs = [sim_result] + [_result_row(index, output["summary"], output.get("histogram"))
+                                for index, output in enumerate(results.get("outputs") or [], start=1)]
+    return r
+
+
+def _result_row(index, summary, histogram):
+    return SimulationResult(
+        output_index=index,
+        output_name=summary.get("output"),
+        output_expression=summary.get("expression"),
+        mean_value=summary.get("mean"),
+        std_dev=summary.get("std"),
+        variance_value=summary.get("variance"),
+        min_value=summary.get("min"),
+        max_value=summary.get("max"),
+        percentile_5=summary.get("percentile_5"),
+        percentile_95=summary.get("percentile_95"),
+        median_value=summary.get("median"),
+        std_error=_finite(summary.get("std_error")),
+        sampling_method=summary.get("sampling"),
+        histogram_json=json.dumps(histogram) if histogram else None,
+    )
+
+
+class SimulationQueue:
+    """Pool de procesos + planificador que vigila los trabajos en curso.
+
+    El pool y el planificador se crean en el primer ``submit`` para que el
+    proceso maestro de gunicorn (``--preload``) no herede hilos ni procesos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._scheduler = None
+        self._manager = None
+        self._progress = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SIM_POOL_SIZE", 2)
+        app.config.setdefault("SIM_QUEUE_LIMIT", 20)
+        app.config.setdefault("SIM_JOB_TIMEOUT", 300)
+        app.config.setdefault("SIM_POLL_SECONDS", 1)
+        app.config.setdefault("SIM_ENGINE_WORKERS", 1)
+        app.config.setdefault("SIM_CHART_MODE", "png")
+        app.config.setdefault("SIM_COLUMNS_DIR", os.path.join(app.instance_path, "columns"))
+        app.config.setdefault("SIM_COLUMNS_MAX_BYTES", 2 * 1024 ** 3)
+        self.app = app
+        app.extensions["simulation_queue"] = self
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            return
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        # spawn: el proceso web tiene hilos (planificador, SQLAlchemy) y fork no es seguro
+        ctx = multiprocessing.get_context("spawn")
+        self._manager = ctx.Manager()
+        self._progress = self._manager.dict()
+        self._executor = ProcessPoolExecutor(max_workers=self.app.config["SIM_POOL_SIZE"], mp_context=ctx)
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(
+            self.poll, "interval", seconds=self.app.config["SIM_POLL_SECONDS"],
+            id="simulation-queue-poll", max_instances=1, coalesce=True,
+        )
+        self._scheduler.start()
+        atexit.register(self.shutdown)
+
+    def pending(self):
+        return sum(1 for future in self._futures.values() if not future.done())
+
+    def submit(self, project, variables, iterations, seed=None, cache_key=None, **options):
+        """Encola una simulación y devuelve el SimulationJob creado.
+
+        ``options`` se pasan tal cual a ``simulate_monte_carlo`` (p. ej. ``sampling``);
+        con ``cache_key`` el resultado se guarda en la caché al terminar.
+        """
+        with self._lock:
+            self._ensure_started()
+            if self.pending() >= self.app.config["SIM_QUEUE_LIMIT"]:
+                raise QueueFullError("La cola de simulaciones está llena, intenta más tarde")
+
+            now = datetime.utcnow()
+            job = SimulationJob(
+                id=uuid.uuid4().hex,
+                project_id=project.id,
+                iterations=iterations,
+                seed=str(seed) if seed is not None else None,
+                cache_key=cache_key,
+                timeout_at=now + timedelta(seconds=self.app.config["SIM_JOB_TIMEOUT"]),
+            )
+            db.session.add(job)
+            db.session.commit()
+
+            options = dict(options, iterations=iterations, seed=seed)
+            options.setdefault("workers", self.app.config["SIM_ENGINE_WORKERS"])
+            # Modo "bins": el navegador dibuja el histograma y el worker no rasteriza nada
+            options.setdefault("render_charts", self.app.config["SIM_CHART_MODE"] == "png")
+            if sample_store.enabled:
+                options.setdefault("samples_path", sample_store.path_for_job(job.id))
+            if options.get("incremental"):
+                options.setdefault("columns_dir", self.app.config["SIM_COLUMNS_DIR"])
+                options.setdefault("columns_max_bytes", self.app.config["SIM_COLUMNS_MAX_BYTES"])
+            deadline = time.time() + self.app.config["SIM_JOB_TIMEOUT"]
+            future = self._executor.submit(_run_simulation, job.id, variables, options, self._progress, deadline)
+            self._futures[job.id] = future
+        return job
+
+    def poll(self):
+        """Actualiza estado y progreso; persiste los trabajos terminados."""
+        with self.app.app_context():
+            now = datetime.utcnow()
+            with self._lock:
+                tracked = list(self._futures.items())
+            for job_id, future in tracked:
+                job = db.session.get(SimulationJob, job_id)
+                if job is None:
+                    self._forget(job_id)
+                    continue
+                if future.done():
+                    if job.status == "timeout":
+                        # Terminó después del plazo: el resultado se descarta
+                        sample_store.discard(f"{job_id}.npy")
+                    else:
+                        self._finish(job, future, now)
+                    self._forget(job_id)
+                elif job.status == "timeout":
+                    # Sigue ocupando un proceso del pool hasta que el motor aborte: cuenta en pending()
+                    continue
+                elif job.timeout_at and now > job.timeout_at:
+                    # El motor aborta por su cuenta al llegar al deadline; cancel() solo evita los que no empezaron
+                    job.status = "timeout"
+                    job.error = "La simulación superó el tiempo máximo permitido"
+                    job.finished_at = now
+                    sample_store.discard(f"{job_id}.npy")
+                    if future.cancel():
+                        self._forget(job_id)
+                elif future.running():
+                    if job.status == "queued":
+                        job.status = "running"
+                        job.started_at = now
+                    job.progress = float(self._progress.get(job_id, 0.0))
+            self._expire_orphans(now)
+            db.session.commit()
+
+    def _finish(self, job, future, now):
+        job.finished_at = now
+        try:
+            results = future.result()
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            sample_store.discard(f"{job.id}.npy")
+            return
+        metrics.observe_stages(results.get("timings"))
+        try:
+            with metrics.timer("simulation_stage_seconds", stage="persist"), db.session.begin_nested():
+                results = store_charts(results)
+                report = save_simulation_report(job.project, results)
+                result_cache.put(job.cache_key, job.project_id, results)
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"Error guardando resultados: {e}"
+            sample_store.discard(f"{job.id}.npy")
+            return
+        job.report_id = report.id
+        job.status = "done"
+        job.progress = 1.0
+
+    def _expire_orphans(self, now):
+        # Trabajos de otro worker que murió antes de terminarlos.
+        grace = timedelta(seconds=self.app.config["SIM_POLL_SECONDS"] * 5)
+        stale = SimulationJob.query.filter(
+            SimulationJob.status.in_(("queued", "running")),
+            SimulationJob.timeout_at < now - grace,
+        )
+        for job in stale:
+            if job.id in self._futures:
+                continue
+            job.status = "timeout"
+            job.error = job.error or "La simulación superó el tiempo máximo permitido"
+            job.finished_at = now
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if self._progress is not None:
+            self._progress.pop(job_id, None)
+
+    def shutdown(self, wait=False):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+        self._executor = self._scheduler = self._manager = self._progress = None
+
+
+simulation_queue = SimulationQueue()
@@ -0,0 +1,60 @@
+"""Paginación por clave (keyset) y búsqueda para los listados.
+
+En lugar de ``OFFSET`` cada página continúa tras la última fila de la
+anterior: ``WHERE (created_at, id) < (:c, :i) ORDER BY created_at DESC, id
+DESC LIMIT n`` recorre el índice desde ese punto, así que la página 500 cuesta
+lo mismo que la primera y las filas insertadas entre páginas no desplazan los
+resultados. El cursor es el valor de las columnas de orden de esa última fila
+(la última columna debe ser única, normalmente el id).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, tuple_
+
+CURSOR_SEPARATOR = ","
+
+
+def encode_cursor(values):
+    return CURSOR_SEPARATOR.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+
+
+def decode_cursor(cursor, columns):
+    """Valores del cursor según el tipo de cada columna; ValueError si no encaja."""
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(columns):
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return tuple(datetime.fromisoformat(part) if isinstance(column.type, DateTime) else int(part)
+                 for part, column in zip(parts, columns))
+
+
+def keyset_page(query, columns, after=None, limit=50, descending=True):
+    """Filas de ``query`` ordenadas por ``columns`` tras el cursor ``after`` y el cursor siguiente.
+
+    El cursor siguiente es None en la última página. Un cursor mal formado
+    lanza ValueError.
+    """
+    key = tuple_(*columns) if len(columns) > 1 else columns[0]
+    if after:
+        values = decode_cursor(after, columns)
+        bound = tuple_(*values) if len(values) > 1 else values[0]
+        query = query.filter(key < bound if descending else key > bound)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    # Una fila de más indica si hay página siguiente sin un COUNT(*)
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, column.key) for column in columns)
+
+
+def contains_pattern(text):
+    """Patrón ``%texto%`` para ILIKE con ``%`` y ``_`` escapados (usar con ``escape="\\\\"``)."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def day_range(column, day):
+    """Filtro de un día como rango sobre ``column``: usa el índice, a diferencia de ``date(column) = día``."""
+    start = datetime(day.year, day.month, day.day)
+    return (column >= start) & (column < start + timedelta(days=1))
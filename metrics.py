@@ -0,0 +1,231 @@
+"""Métricas en formato de exposición de Prometheus e instrumentación.
+
+Histogramas en memoria por proceso (cada worker de gunicorn expone los
+suyos) para la latencia por ruta, el número y la duración de las consultas
+SQL, las etapas del motor (los workers del pool devuelven sus tiempos con el
+resultado), la persistencia y las exportaciones. ``GET /metrics`` los sirve
+en texto plano.
+
+Con ``PROFILE_REQUESTS`` cada petición se perfila (cProfile, o pyinstrument
+si ``PROFILE_ENGINE=pyinstrument`` y está instalado) y las que superan
+``PROFILE_SLOW_MS`` se guardan en ``PROFILE_DIR``.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Segundos: de consultas SQL de milisegundos a exportaciones de minutos
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas, como los de prometheus_client."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # valores de etiquetas -> [conteo por bucket..., suma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            base = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+            for bound, count in zip(self.buckets, series):
+                labels = ",".join(base + [f'le="{bound:g}"'])
+                lines.append(f"{self.name}_bucket{{{labels}}} {count}")
+            labels = ",".join(base + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{labels}}} {series[-1]}")
+            suffix = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {series[-1]}")
+        return "\n".join(lines)
+
+
+class Metrics:
+    """Registro de histogramas + hooks de Flask y SQLAlchemy."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.histogram("http_request_duration_seconds", "Latencia de las peticiones por ruta",
+                       ("method", "endpoint", "status"))
+        self.histogram("http_request_queries", "Consultas SQL por petición", ("endpoint",), COUNT_BUCKETS)
+        self.histogram("db_query_duration_seconds", "Duración de las consultas SQL", ("operation",))
+        self.histogram("simulation_stage_seconds",
+                       "Tiempo por etapa de la simulación (sampling, evaluation, aggregation, charts, "
+                       "sensitivity, total, persist)", ("stage",))
+        self.histogram("export_render_seconds", "Generación de exportaciones PDF/DOCX", ("format",))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("PROFILE_REQUESTS", False)
+        app.config.setdefault("PROFILE_SLOW_MS", 500)
+        app.config.setdefault("PROFILE_ENGINE", "cprofile")
+        app.config.setdefault("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+        self.app = app
+        app.extensions["metrics"] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        # Eventos a nivel de clase: valen para el engine que cree Flask-SQLAlchemy
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+    # --- registro -----------------------------------------------------------------------------
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, documentation, labels, buckets)
+            return self._histograms[name]
+
+    def observe(self, name, value, **labels):
+        self._histograms[name].observe(value, **labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def observe_stages(self, timings):
+        """Tiempos por etapa que devuelve el motor (``results["timings"]``)."""
+        for stage, seconds in (timings or {}).items():
+            self.observe("simulation_stage_seconds", seconds, stage=stage)
+
+    def render(self):
+        with self._lock:
+            histograms = list(self._histograms.values())
+        return "\n".join(h.render() for h in histograms) + "\n"
+
+    # --- peticiones ---------------------------------------------------------------------------
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+        if self.app.config["PROFILE_REQUESTS"]:
+            g._metrics_profiler = _start_profiler(self.app.config["PROFILE_ENGINE"])
+
+    def _after_request(self, response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # El endpoint (no la URL) mantiene acotado el número de series
+        endpoint = request.endpoint or "404"
+        if self.app.config["METRICS_ENABLED"]:
+            self.observe("http_request_duration_seconds", elapsed, method=request.method, endpoint=endpoint,
+                         status=response.status_code)
+            self.observe("http_request_queries", g.pop("_metrics_queries", 0), endpoint=endpoint)
+        profiler = g.pop("_metrics_profiler", None)
+        if profiler is not None:
+            self._save_profile(profiler, endpoint, elapsed)
+        return response
+
+    def _save_profile(self, profiler, endpoint, elapsed):
+        engine, profile = profiler
+        if engine == "pyinstrument":
+            profile.stop()
+        else:
+            profile.disable()
+        if elapsed * 1000 < self.app.config["PROFILE_SLOW_MS"]:
+            return
+        directory = self.app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}-{elapsed * 1000:.0f}ms"
+        try:
+            if engine == "pyinstrument":
+                with open(os.path.join(directory, name + ".html"), "w") as f:
+                    f.write(profile.output_html())
+            else:
+                profile.dump_stats(os.path.join(directory, name + ".prof"))
+        except OSError as e:
+            logger.warning("No se pudo guardar el perfil de %s: %s", endpoint, e)
+
+
+def _start_profiler(engine):
+    if engine == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument no está instalado; se usa cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return "pyinstrument", profiler
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Otro perfilador activo en este hilo
+        return None
+    return "cprofile", profiler
+
+
+# --- SQLAlchemy -----------------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("_metrics_started")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    metrics.observe("db_query_duration_seconds", elapsed,
+                    operation=operation if operation in _SQL_OPERATIONS else "OTHER")
+    if has_request_context() and "_metrics_queries" in g:
+        g._metrics_queries += 1
+
+
+def _handle_error(context):
+    # La consulta falló: after_cursor_execute no llega a ejecutarse
+    stack = context.connection.info.get("_metrics_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+metrics = Metrics()
@@ -1,5 +1,10 @@
+import json
 from datetime import datetime
+from functools import cached_property
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -56,6 +61,13 @@ class Project(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     variables = db.relationship("Variable", backref="project", cascade="all, delete-orphan")
     reports = db.relationship("Report", backref="project", cascade="all, delete-orphan")
+    jobs = db.relationship("SimulationJob", backref="project", cascade="all, delete-orphan")
+    cache_entries = db.relationship("SimulationCacheEntry", cascade="all, delete-orphan")
+    correlations = db.relationship("VariableCorrelation", backref="project", cascade="all, delete-orphan")
+    outputs = db.relationship("ProjectOutput", backref="project", cascade="all, delete-orphan",
+                              order_by="ProjectOutput.id")
+    # Método para aplicar las correlaciones (ver correlation.CORRELATION_METHODS)
+    correlation_method = db.Column(db.String(20), default="cholesky")
 
 
 class Variable(db.Model):
@@ -69,10 +81,14 @@ class Variable(db.Model):
     min_value = db.Column(db.Numeric(15, 6))
     max_value = db.Column(db.Numeric(15, 6))
     mode_value = db.Column(db.Numeric(15, 6))
+    # Parámetros de distribuciones que no encajan en las columnas anteriores (JSON)
+    params_json = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     @property
     def params(self):
+        if self.params_json:
+            return json.loads(self.params_json)
         if self.distribution == "normal":
             return {"mean": float(self.mean or 0), "std": float(self.std_dev or 1)}
         elif self.distribution == "uniform":
@@ -82,42 +98,85 @@ class Variable(db.Model):
         return {}
 
 
+class VariableCorrelation(db.Model):
+    """Coeficiente de correlación entre dos variables de un proyecto (variable_a_id < variable_b_id)."""
+    __tablename__ = "project_correlations"
+    __table_args__ = (db.UniqueConstraint("variable_a_id", "variable_b_id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False, index=True)
+    variable_a_id = db.Column(db.Integer, db.ForeignKey("project_variables.id", ondelete="CASCADE"), nullable=False)
+    variable_b_id = db.Column(db.Integer, db.ForeignKey("project_variables.id", ondelete="CASCADE"), nullable=False)
+    coefficient = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProjectOutput(db.Model):
+    """Salida calculada con una fórmula sobre las variables (ver formulas.py); la primera es la principal."""
+    __tablename__ = "project_outputs"
+    __table_args__ = (db.UniqueConstraint("project_id", "name"),)
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    expression = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class Report(db.Model):
     __tablename__ = "reports"
+    # Listados: reportes de un proyecto por fecha y listado global paginado por (created_at, id)
+    __table_args__ = (db.Index("ix_reports_project_created", "project_id", "created_at"),
+                      db.Index("ix_reports_created_id", "created_at", "id"))
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False)
     name = db.Column(db.String(255), nullable=False)
+    # Iteraciones realmente ejecutadas y motivo de parada (ver engine.STOP_REASONS)
+    iterations_used = db.Column(db.Integer)
+    stop_reason = db.Column(db.String(30))
+    # "simulation" o "sweep" (barrido de escenarios: resultado del base + comparación en scenarios_json)
+    kind = db.Column(db.String(20), default="simulation")
+    scenarios_json = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    @property
+    # Un SimulationResult por salida; `result` es el de la salida principal (los antiguos no tienen índice)
+    outputs = db.relationship("SimulationResult", backref="report", cascade="all, delete-orphan",
+                              order_by="SimulationResult.output_index")
+    result = db.relationship(
+        "SimulationResult", uselist=False, viewonly=True,
+        primaryjoin="and_(Report.id == SimulationResult.report_id, "
+                    "or_(SimulationResult.output_index.is_(None), SimulationResult.output_index == 0))")
+    exports = db.relationship("ReportExport", backref="report", cascade="all, delete-orphan")
+
+    @cached_property
     def results(self):
-        result = SimulationResult.query.filter_by(report_id=self.id).first()
+        # Memorizado en la instancia: las plantillas acceden ~20 veces por render
+        # y la instancia vive lo que dura la sesión de la petición.
+        result = self.result
         if result:
-            import json
-            charts = {}
-            if result.chart_data:
-                try:
-                    charts = json.loads(result.chart_data)
-                except:
-                    charts = {}
+            # Solo la clave del gráfico: la imagen se sirve aparte desde /charts/<clave>.png
+            charts = {"histogram_density": result.chart_key} if result.chart_key else {}
+            if result.tornado_chart_key:
+                charts["tornado"] = result.tornado_chart_key
             return {
-                "summary": {
-                    "mean": float(result.mean_value or 0),
-                    "std": float(result.std_dev or 0),
-                    "variance": float(result.variance_value or 0),
-                    "min": float(result.min_value or 0),
-                    "max": float(result.max_value or 0),
-                    "median": float(result.median_value or 0),
-                    "percentile_5": float(result.percentile_5 or 0),
-                    "percentile_95": float(result.percentile_95 or 0)
-                },
-                "charts": charts
+                "summary": result.summary,
+                "charts": charts,
+                "sensitivity": json.loads(result.sensitivity_json) if result.sensitivity_json else None,
+                "scenarios": self.scenarios,
             }
-        return {"summary": {}, "charts": {}}
+        return {"summary": {}, "charts": {}, "sensitivity": None, "scenarios": self.scenarios}
+
+    @property
+    def scenarios(self):
+        return json.loads(self.scenarios_json) if self.scenarios_json else None
+
+    @cached_property
+    def extra_outputs(self):
+        """Resultados de las salidas secundarias (consulta aparte, solo en el detalle)."""
+        return [output for output in self.outputs if output.output_index]
 
 
 class SimulationResult(db.Model):
     __tablename__ = "simulation_results"
+    __table_args__ = (db.Index("ix_simulation_results_report_output", "report_id", "output_index"),)
     id = db.Column(db.Integer, primary_key=True)
     report_id = db.Column(db.Integer, db.ForeignKey("reports.id"), nullable=False)
     mean_value = db.Column(db.Numeric(15, 6))
@@ -128,5 +187,208 @@ class SimulationResult(db.Model):
     percentile_5 = db.Column(db.Numeric(15, 6))
     percentile_95 = db.Column(db.Numeric(15, 6))
     median_value = db.Column(db.Numeric(15, 6))
-    chart_data = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    std_error = db.Column(db.Numeric(15, 6))
+    sampling_method = db.Column(db.String(20))
+    # Clave SHA-256 del PNG del histograma en el almacén de artefactos (storage.py)
+    chart_key = db.Column(db.String(64))
+    # Formato antiguo (PNG en base64 dentro de JSON); solo lo lee `flask migrate-charts`
+    chart_data = db.deferred(db.Column(db.Text))
+    # Histograma de bins fijos {"counts": [...], "edges": [...]}: los gráficos se dibujan desde aquí
+    histogram_json = db.Column(db.Text)
+    # Análisis de sensibilidad por variable (sensitivity.analyze) y su diagrama de tornado
+    sensitivity_json = db.Column(db.Text)
+    tornado_chart_key = db.Column(db.String(64))
+    # Muestras completas en SIM_SAMPLES_DIR (storage.SampleStore) y nombres de sus filas
+    samples_file = db.Column(db.String(64))
+    samples_columns = db.Column(db.Text)
+    # Salida a la que corresponden estas estadísticas (0 = principal) y su fórmula
+    output_index = db.Column(db.Integer, default=0)
+    output_name = db.Column(db.String(100))
+    output_expression = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def summary(self):
+        return {
+            "mean": float(self.mean_value or 0),
+            "std": float(self.std_dev or 0),
+            "variance": float(self.variance_value or 0),
+            "min": float(self.min_value or 0),
+            "max": float(self.max_value or 0),
+            "median": float(self.median_value or 0),
+            "percentile_5": float(self.percentile_5 or 0),
+            "percentile_95": float(self.percentile_95 or 0),
+            "std_error": float(self.std_error) if self.std_error is not None else None,
+            "sampling": self.sampling_method or "random",
+            "output": self.output_name or "total",
+        }
+
+    @property
+    def sample_columns(self):
+        return json.loads(self.samples_columns) if self.samples_columns else []
+
+    @property
+    def histogram(self):
+        """(conteos, bordes) guardados o None en resultados antiguos."""
+        if not self.histogram_json:
+            return None
+        data = json.loads(self.histogram_json)
+        return data["counts"], data["edges"]
+
+
+class SimulationJob(db.Model):
+    __tablename__ = "simulation_jobs"
+    id = db.Column(db.String(32), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=False)
+    report_id = db.Column(db.Integer, db.ForeignKey("reports.id", ondelete="SET NULL"), nullable=True)
+    # queued, running, done, failed, timeout
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    progress = db.Column(db.Float, default=0.0)
+    iterations = db.Column(db.Integer)
+    seed = db.Column(db.String(50))
+    error = db.Column(db.Text)
+    # Clave de caché de resultados (None si la ejecución no es reproducible)
+    cache_key = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    timeout_at = db.Column(db.DateTime)
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed", "timeout")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "project_id": self.project_id,
+            "report_id": self.report_id,
+            "status": self.status,
+            "progress": float(self.progress or 0),
+            "iterations": self.iterations,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ReportExport(db.Model):
+    """PDF/DOCX generado de un reporte para una versión de plantilla (ver exports.py)."""
+    __tablename__ = "report_exports"
+    __table_args__ = (db.UniqueConstraint("report_id", "format", "template_hash"),)
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey("reports.id", ondelete="CASCADE"), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    template_hash = db.Column(db.String(64), nullable=False)
+    # queued, done, failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    artifact_key = db.Column(db.String(64))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "report_id": self.report_id,
+            "format": self.format,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class SimulationCacheEntry(db.Model):
+    __tablename__ = "simulation_cache"
+    key = db.Column(db.String(64), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class Artifact(db.Model):
+    """Artefacto binario direccionado por contenido (backend ``db`` de storage.py)."""
+    __tablename__ = "artifacts"
+    key = db.Column(db.String(64), primary_key=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def upgrade_schema():
+    """Crea las tablas nuevas y añade las columnas que falten en las existentes.
+
+    ``db.create_all`` no altera tablas ya creadas; esto cubre las columnas
+    añadidas a los modelos después del despliegue inicial.
+    """
+    db.create_all()
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}"))
+        # Índices añadidos después de crear la tabla
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(db.session.connection())
+    if db.engine.dialect.name == "postgresql":
+        _create_trigram_indexes()
+    db.session.commit()
+
+
+TRIGRAM_INDEXES = {"ix_projects_name_trgm": ("projects", "name")}
+
+
+def _create_trigram_indexes():
+    # Índices GIN de trigramas: sirven a ILIKE '%texto%' de las búsquedas por nombre.
+    # Requieren pg_trgm; si no se puede instalar (permisos) las búsquedas siguen funcionando sin índice.
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for name, (table, column) in TRIGRAM_INDEXES.items():
+                db.session.execute(db.text(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)"))
+    except SQLAlchemyError as e:
+        current_app.logger.warning("No se pudieron crear los índices de trigramas: %s", e)
+
+
+def project_summaries(project_ids):
+    """Número de reportes y media/p95 del último por proyecto, agregados en una sola consulta.
+
+    Devuelve ``{project_id: {...}}``; los proyectos sin reportes no aparecen.
+    """
+    if not project_ids:
+        return {}
+    partition = {"partition_by": Report.project_id}
+    ranked = (db.select(Report.project_id, Report.id.label("report_id"), Report.created_at,
+                        db.func.count().over(**partition).label("runs"),
+                        db.func.row_number().over(order_by=(Report.created_at.desc(), Report.id.desc()),
+                                                  **partition).label("position"))
+              .where(Report.project_id.in_(project_ids))
+              .subquery())
+    main_result = db.and_(SimulationResult.report_id == ranked.c.report_id,
+                          db.or_(SimulationResult.output_index.is_(None), SimulationResult.output_index == 0))
+    rows = db.session.execute(
+        db.select(ranked, SimulationResult.mean_value, SimulationResult.percentile_95)
+        .outerjoin(SimulationResult, main_result)
+        .where(ranked.c.position == 1))
+    return {
+        row.project_id: {
+            "runs": row.runs,
+            "latest_report_id": row.report_id,
+            "latest_at": row.created_at.isoformat() if row.created_at else None,
+            "latest_mean": float(row.mean_value) if row.mean_value is not None else None,
+            "latest_p95": float(row.percentile_95) if row.percentile_95 is not None else None,
+        }
+        for row in rows
+    }
+
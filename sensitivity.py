@@ -0,0 +1,109 @@
+"""Análisis de sensibilidad del total respecto a cada variable.
+
+Reutiliza lo que el motor ya acumuló durante la simulación (co-momentos para
+Pearson y las primeras ``SENSITIVITY_HEAD`` filas para Spearman) y estima los
+índices de Sobol con un diseño de Saltelli: dos matrices base A y B de ``n``
+filas y, para cada variable, A con esa columna tomada de B. Solo A y B se
+muestrean; el resto son evaluaciones vectorizadas del modelo, n·(k + 2) en
+total, sin una simulación completa por variable.
+
+Saltelli/Jansen suponen entradas independientes: si el proyecto define
+correlaciones, el modelo simulado no es el que describirían los índices, así
+que no se calculan y el análisis lo explica en ``sobol_note``.
+"""
+import numpy as np
+
+from engine import prepare_variables
+
+# Filas de las matrices base A y B del diseño de Saltelli
+SOBOL_SAMPLES = 4096
+CORRELATED_NOTE = ("Índices de Sobol no calculados: las variables están correlacionadas y los estimadores de "
+                   "Saltelli / Jansen suponen entradas independientes; use Pearson y Spearman.")
+
+
+def total_model(samples):
+    """Salida por defecto del proyecto: suma de las variables (variables x n -> n)."""
+    return samples.sum(axis=0)
+
+
+def spearman(head):
+    """Correlación de rangos de cada fila de ``head`` con la última (el total)."""
+    from scipy.stats import rankdata
+
+    ranks = rankdata(head, axis=1)
+    ranks -= ranks.mean(axis=1, keepdims=True)
+    inputs, output = ranks[:-1], ranks[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return inputs @ output / np.sqrt(np.einsum("ij,ij->i", inputs, inputs) * np.dot(output, output))
+
+
+def sobol_indices(variables, seed_seq, n=SOBOL_SAMPLES, model=total_model):
+    """Índices de primer orden (Saltelli 2010) y totales (Jansen) de cada variable."""
+    prepared = prepare_variables(variables)
+    rng = np.random.default_rng(seed_seq)
+    a = np.empty((len(prepared), n))
+    b = np.empty((len(prepared), n))
+    for row_a, row_b, (dist, params) in zip(a, b, prepared):
+        dist.sample(rng, params, row_a)
+        dist.sample(rng, params, row_b)
+    # Salidas centradas: el estimador de primer orden es muy ruidoso si la media no es ~0
+    y_a = model(a)
+    y_b = model(b)
+    outputs = np.concatenate((y_a, y_b))
+    center = outputs.mean()
+    variance = np.var(outputs, ddof=1)
+    y_a -= center
+    y_b -= center
+
+    first = np.full(len(prepared), np.nan)
+    total = np.full(len(prepared), np.nan)
+    if not variance > 0:
+        return first, total
+    saved = np.empty(n)
+    for i in range(len(prepared)):
+        # A_B^(i): A con la columna i de B; se intercambia en sitio para no copiar A
+        saved[:] = a[i]
+        a[i] = b[i]
+        y_ab = model(a) - center
+        a[i] = saved
+        first[i] = np.mean(y_b * (y_ab - y_a)) / variance
+        total[i] = 0.5 * np.mean((y_a - y_ab) ** 2) / variance
+    return first, total
+
+
+def analyze(variables, partial, seed_seq, n=SOBOL_SAMPLES, model=total_model, correlation=None):
+    """Sensibilidad por variable de la salida ``model``, ordenada de mayor a menor influencia.
+
+    Con ``correlation`` (entradas dependientes) los índices de Sobol quedan en None.
+    """
+    pearson = partial.comoments.pearson()
+    rank = spearman(partial.head)
+    # Contribución a la varianza: ρ² de Spearman normalizada, con el signo de ρ
+    squared = np.nan_to_num(rank) ** 2
+    contribution = np.sign(rank) * squared / squared.sum() if squared.sum() > 0 else np.zeros_like(squared)
+    if correlation is None:
+        first, total = sobol_indices(variables, seed_seq, n, model)
+        note = None
+    else:
+        first = total = np.full(len(variables), np.nan)
+        n, note = None, CORRELATED_NOTE
+    variance = partial.comoments.variance_x
+
+    rows = []
+    for i, var in enumerate(variables):
+        rows.append({
+            "name": var.get("name"),
+            "pearson": _number(pearson[i]),
+            "spearman": _number(rank[i]),
+            "contribution": _number(contribution[i]),
+            "first_order": _number(first[i]),
+            "total_order": _number(total[i]),
+            "variance": _number(variance[i]),
+        })
+    rows.sort(key=lambda row: abs(row["spearman"] or 0), reverse=True)
+    return {"variables": rows, "sobol_samples": n, "sobol_note": note, "rank_samples": int(partial.head.shape[1])}
+
+
+def _number(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
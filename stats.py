@@ -0,0 +1,201 @@
+"""Acumuladores en streaming para el motor Monte Carlo.
+
+Todos los acumuladores se pueden combinar (``merge``), de modo que el motor
+puede procesar la simulación en bloques de tamaño fijo sin guardar las
+muestras y, si hace falta, repartir los bloques entre varios procesos.
+"""
+import math
+
+import numpy as np
+
+
+class StreamingStats:
+    """Conteo, media, varianza (Welford por bloques / fusión de Chan), mín y máx."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        n = values.size
+        if n == 0:
+            return
+        block_mean = float(values.mean())
+        deviations = values - block_mean
+        block_m2 = float(np.dot(deviations, deviations))
+        self._combine(n, block_mean, block_m2, float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, n, mean, m2, min_value, max_value):
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, min_value)
+        self.max = max(self.max, max_value)
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return float("nan")
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class TDigest:
+    """t-digest combinable (Dunning) con compresión vectorizada.
+
+    Mientras el total de puntos no supere ``buffer_size`` se conservan los
+    valores exactos y los cuantiles coinciden con ``np.percentile``; a partir de
+    ahí los puntos se agrupan en centroides según la función de escala k1, que
+    da más resolución en las colas (p5/p95) que en el centro.
+    """
+
+    def __init__(self, delta=500, buffer_size=100_000):
+        self.delta = delta
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.exact = True
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._add(values, np.ones(values.size), exact=True)
+
+    def merge(self, other):
+        if other.means.size == 0:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._add(other.means, other.weights, exact=other.exact)
+
+    def _add(self, means, weights, exact):
+        self.means = np.concatenate((self.means, means))
+        self.weights = np.concatenate((self.weights, weights))
+        self.exact = self.exact and exact
+        if self.means.size > self.buffer_size:
+            self._compress()
+
+    def _compress(self):
+        order = np.argsort(self.means, kind="stable")
+        means = self.means[order]
+        weights = self.weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.delta / (2 * math.pi) * np.arcsin(2 * q - 1)
+        groups = np.floor(k)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1))
+        new_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / new_weights
+        self.weights = new_weights
+        self.exact = False
+
+    def _knots(self):
+        """Centroides ordenados con sus rangos acumulados (para interpolar)."""
+        order = np.argsort(self.means, kind="stable")
+        means = self.means[order]
+        weights = self.weights[order]
+        cumulative = np.cumsum(weights)
+        ranks = np.concatenate(([0.0], cumulative - weights / 2, [cumulative[-1]]))
+        values = np.concatenate(([self.min], means, [self.max]))
+        return ranks, values
+
+    def quantile(self, q):
+        """Cuantil(es) para ``q`` en [0, 1]."""
+        if self.means.size == 0:
+            return float("nan")
+        if self.exact:
+            return np.percentile(self.means, np.asarray(q) * 100)
+        ranks, values = self._knots()
+        return np.interp(np.asarray(q) * ranks[-1], ranks, values)
+
+    def cdf(self, x):
+        if self.means.size == 0:
+            return np.zeros_like(np.asarray(x, dtype=float))
+        if self.exact:
+            return np.searchsorted(np.sort(self.means), x, side="right") / self.means.size
+        ranks, values = self._knots()
+        return np.interp(x, values, ranks) / ranks[-1]
+
+    def histogram(self, bins=30):
+        """Histograma de ``bins`` intervalos entre mín y máx: (conteos, bordes)."""
+        edges = np.linspace(self.min, self.max, bins + 1)
+        if self.exact:
+            counts, edges = np.histogram(self.means, bins=edges)
+            return counts.astype(np.float64), edges
+        return np.diff(self.cdf(edges)) * self.count, edges
+
+
+class CoMoments:
+    """Medias, varianzas y covarianzas de ``k`` entradas con una salida, combinables.
+
+    Da la correlación de Pearson de cada variable con el total sin guardar
+    las muestras (la misma fusión de Chan que ``StreamingStats``).
+    """
+
+    def __init__(self, k):
+        self.count = 0
+        self.mean_x = np.zeros(k)
+        self.mean_y = 0.0
+        self.m2_x = np.zeros(k)
+        self.m2_y = 0.0
+        self.c_xy = np.zeros(k)
+
+    def update(self, x, y):
+        """``x``: variables x n, ``y``: n."""
+        n = y.size
+        if n == 0:
+            return
+        mean_x = x.mean(axis=1)
+        mean_y = float(y.mean())
+        dx = x - mean_x[:, None]
+        dy = y - mean_y
+        self._combine(n, mean_x, mean_y, np.einsum("ij,ij->i", dx, dx), float(np.dot(dy, dy)), dx @ dy)
+
+    def merge(self, other):
+        self._combine(other.count, other.mean_x, other.mean_y, other.m2_x, other.m2_y, other.c_xy)
+
+    def _combine(self, n, mean_x, mean_y, m2_x, m2_y, c_xy):
+        if n == 0:
+            return
+        total = self.count + n
+        delta_x = mean_x - self.mean_x
+        delta_y = mean_y - self.mean_y
+        factor = self.count * n / total
+        self.m2_x = self.m2_x + m2_x + delta_x * delta_x * factor
+        self.m2_y += m2_y + delta_y * delta_y * factor
+        self.c_xy = self.c_xy + c_xy + delta_x * delta_y * factor
+        self.mean_x = self.mean_x + delta_x * n / total
+        self.mean_y += delta_y * n / total
+        self.count = total
+
+    @property
+    def variance_x(self):
+        return self.m2_x / (self.count - 1) if self.count > 1 else np.full_like(self.m2_x, np.nan)
+
+    def pearson(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.c_xy / np.sqrt(self.m2_x * self.m2_y)
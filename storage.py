@@ -0,0 +1,214 @@
+"""Almacenes de artefactos binarios (gráficos, exportaciones) y de muestras.
+
+Los artefactos se direccionan por contenido: la clave es el SHA-256 de los
+bytes, así que guardar dos veces la misma imagen no duplica nada y la clave
+sirve directamente como ETag. Hay dos backends:
+
+- ``fs`` (por defecto): archivos bajo ``ARTIFACT_DIR``.
+- ``db``: tabla ``artifacts`` (bytea), para despliegues con disco efímero.
+
+``SampleStore`` guarda, si se activa, todas las muestras de cada simulación
+en un ``.npy`` float32 (una fila por variable más el total) que se abre con
+``mmap``: percentiles, histogramas y exportaciones se calculan por bloques
+sin volver a simular ni cargar el archivo entero en memoria.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Artifact, SimulationResult
+from stats import TDigest
+
+KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+SAMPLE_FILE_RE = re.compile(r"^[0-9a-f]{32}\.npy$")
+
+
+class ArtifactStore:
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ARTIFACT_BACKEND", "fs")
+        app.config.setdefault("ARTIFACT_DIR", os.path.join(app.instance_path, "artifacts"))
+        self.app = app
+        app.extensions["artifact_store"] = self
+
+    @property
+    def backend(self):
+        return self.app.config["ARTIFACT_BACKEND"]
+
+    @property
+    def root(self):
+        return self.app.config["ARTIFACT_DIR"]
+
+    @staticmethod
+    def valid_key(key):
+        return bool(key) and KEY_RE.match(key) is not None
+
+    def local_path(self, key):
+        """Ruta en disco del artefacto (solo backend ``fs``)."""
+        if self.backend != "fs" or not self.valid_key(key):
+            return None
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, data, content_type="application/octet-stream"):
+        """Guarda ``data`` y devuelve su clave; idempotente."""
+        key = hashlib.sha256(data).hexdigest()
+        if self.backend == "fs":
+            path = self.local_path(key)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Escritura atómica: varios workers pueden guardar la misma clave a la vez
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+        elif db.session.get(Artifact, key) is None:
+            db.session.add(Artifact(key=key, content_type=content_type, size_bytes=len(data), data=data))
+            db.session.flush()
+        return key
+
+    def exists(self, key):
+        if not self.valid_key(key):
+            return False
+        if self.backend == "fs":
+            return os.path.exists(self.local_path(key))
+        return db.session.query(Artifact.key).filter_by(key=key).first() is not None
+
+    def get(self, key):
+        """Bytes del artefacto o None si no existe."""
+        if not self.valid_key(key):
+            return None
+        if self.backend == "fs":
+            try:
+                with open(self.local_path(key), "rb") as fh:
+                    return fh.read()
+            except FileNotFoundError:
+                return None
+        artifact = db.session.get(Artifact, key)
+        return artifact.data if artifact else None
+
+    def open(self, key):
+        """Archivo binario de solo lectura con el artefacto (None si no existe)."""
+        path = self.local_path(key)
+        if path is not None:
+            return open(path, "rb") if os.path.exists(path) else None
+        data = self.get(key)
+        return io.BytesIO(data) if data is not None else None
+
+
+artifact_store = ArtifactStore()
+
+
+class SampleStore:
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SIM_STORE_SAMPLES", False)
+        app.config.setdefault("SIM_SAMPLES_DIR", os.path.join(app.instance_path, "samples"))
+        app.config.setdefault("SIM_SAMPLES_CHUNK", 262144)
+        self.app = app
+        app.extensions["sample_store"] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config["SIM_STORE_SAMPLES"]
+
+    @property
+    def chunk_size(self):
+        return self.app.config["SIM_SAMPLES_CHUNK"]
+
+    def path(self, name):
+        if not name or SAMPLE_FILE_RE.match(name) is None:
+            return None
+        return os.path.join(self.app.config["SIM_SAMPLES_DIR"], name)
+
+    def path_for_job(self, job_id):
+        """Ruta donde el motor escribe las muestras del trabajo ``job_id``."""
+        os.makedirs(self.app.config["SIM_SAMPLES_DIR"], exist_ok=True)
+        return self.path(f"{job_id}.npy")
+
+    def open(self, name):
+        """Memmap de solo lectura (columnas x iteraciones) o None si no existe."""
+        path = self.path(name)
+        if path is None or not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def discard(self, name):
+        path = self.path(name)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def _chunks(self, row):
+        for start in range(0, row.shape[0], self.chunk_size):
+            # np.asarray sobre el tramo: solo ese bloque pasa a memoria
+            yield np.asarray(row[start:start + self.chunk_size], dtype=np.float64)
+
+    def quantiles(self, samples, column, q):
+        """Cuantiles de una columna (exactos hasta 100k muestras, t-digest por encima)."""
+        digest = TDigest()
+        for chunk in self._chunks(samples[column]):
+            digest.update(chunk)
+        return np.atleast_1d(digest.quantile(np.asarray(q, dtype=np.float64)))
+
+    def histogram(self, samples, column, bins=30, range=None):
+        """(conteos, bordes) de una columna con ``bins`` intervalos, en dos pasadas."""
+        if range is None:
+            low, high = np.inf, -np.inf
+            for chunk in self._chunks(samples[column]):
+                low, high = min(low, chunk.min()), max(high, chunk.max())
+            range = (low, high)
+        edges = np.linspace(range[0], range[1], bins + 1)
+        counts = np.zeros(bins)
+        for chunk in self._chunks(samples[column]):
+            counts += np.histogram(chunk, bins=edges)[0]
+        return counts, edges
+
+    def iter_csv(self, samples, columns):
+        """CSV (una fila por iteración) generado por bloques para respuestas en streaming."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["iteration"] + list(columns))
+        for start in range(0, samples.shape[1], self.chunk_size):
+            # str de float32 da la representación más corta que conserva el valor
+            block = np.asarray(samples[:, start:start + self.chunk_size]).astype(str)
+            writer.writerows(zip(range(start, start + block.shape[1]), *block.tolist()))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+
+sample_store = SampleStore()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_deleted_samples(session, flush_context):
+    # Los archivos se borran solo si la transacción se confirma
+    for obj in session.deleted:
+        if isinstance(obj, SimulationResult) and obj.samples_file:
+            session.info.setdefault("doomed_samples", []).append(obj.samples_file)
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_deleted_samples(session):
+    for name in session.info.pop("doomed_samples", []):
+        if sample_store.app is not None:
+            sample_store.discard(name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_deleted_samples(session):
+    session.info.pop("doomed_samples", None)
@@ -0,0 +1,117 @@
+"""Aplicación sobre SQLite temporal para las pruebas; sin red ni Postgres."""
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py lee la configuración del entorno al importarse
+_tmp = tempfile.mkdtemp(prefix="montecarlo-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "test.db")
+os.environ["ARTIFACT_DIR"] = os.path.join(_tmp, "artifacts")
+os.environ["SIM_SAMPLES_DIR"] = os.path.join(_tmp, "samples")
+os.environ["SIM_COLUMNS_DIR"] = os.path.join(_tmp, "columns")
+os.environ["PROFILE_REQUESTS"] = "0"
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import comparison  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from cache import result_cache  # noqa: E402
+from models import Project, Report, SimulationResult, User, Variable, db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    # Sin contexto activo durante las peticiones: cada una abre su sesión, como en producción
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(email="test@montecarlo.com", first_name="Test", last_name="User",
+                    password=generate_password_hash("secret", method="pbkdf2:sha256"))
+        db.session.add(user)
+        db.session.commit()
+    # Las cachés en memoria sobreviven a la base de cada prueba
+    result_cache._memory.clear()
+    comparison._responses.clear()
+    return flask_app
+
+
+@pytest.fixture
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post("/login", data={"email": "test@montecarlo.com", "password": "secret"})
+    return client
+
+
+def seed_projects(app, count, variables=3, reports=2):
+    """``count`` proyectos con sus variables y reportes (cada uno con su resultado)."""
+    with app.app_context():
+        _seed(count, variables, reports)
+
+
+def _seed(count, variables, reports):
+    histogram = json.dumps({"counts": [1, 3, 5, 3, 1], "edges": [0, 1, 2, 3, 4, 5]})
+    for i in range(count):
+        project = Project(name=f"Proyecto {i}")
+        db.session.add(project)
+        for j in range(variables):
+            project.variables.append(Variable(name=f"v{j}", distribution="normal", mean=10 + j, std_dev=2))
+        for k in range(reports):
+            report = Report(project=project, name=f"Reporte {i}-{k}", iterations_used=1000, stop_reason="fixed")
+            report.outputs = [SimulationResult(output_index=0, mean_value=10 + k, std_dev=1, variance_value=1,
+                                               min_value=0, max_value=20, percentile_5=8, percentile_95=12,
+                                               median_value=10, histogram_json=histogram)]
+            db.session.add(report)
+    db.session.commit()
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque (sin ``engine`` requiere app context).
+
+        with QueryCounter() as queries:
+            client.get("/reports")
+        assert queries.count <= 3, queries.statements
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.engine = self.engine or db.engine
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+        return False
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Falla con AssertionError si el bloque ejecuta más de ``limit`` consultas."""
+    with QueryCounter(engine) as queries:
+        yield queries
+    if queries.count > limit:
+        listing = "\n".join(f"  {i + 1}. {sql}" for i, sql in enumerate(queries.statements))
+        raise AssertionError(f"{queries.count} consultas ejecutadas (máximo {limit}):\n{listing}")
@@ -0,0 +1,53 @@
+"""Lotes por NDJSON: validación de los elementos y lo ya simulado se guarda aunque el cliente se desconecte."""
+import json
+
+import pytest
+
+from batch import batch_runner
+from conftest import seed_projects
+from models import Report, db
+
+
+@pytest.fixture
+def runner(app):
+    # Un solo proceso: los elementos terminan en orden; sin commits por tiempo durante la prueba
+    app.config.update(BATCH_POOL_SIZE=1, BATCH_COMMIT_SECONDS=60)
+    yield batch_runner
+    batch_runner.shutdown(wait=True)
+
+
+def test_disconnect_persists_finished_reports(app, client, runner):
+    seed_projects(app, 1, reports=0)
+    inline = {"name": "en línea", "variables": [{"name": "x", "distribution": "normal",
+                                                  "params": {"mean": 0, "std": 1}}]}
+    payload = {"items": [{"project_id": 1}, inline], "defaults": {"iterations": 2000, "seed": 1}}
+    response = client.post("/api/simulations/batch", json=payload, buffered=False)
+    lines = response.response
+    first = json.loads(next(iter(lines)))
+    # El elemento en línea sale en cuanto termina; el reporte del proyecto espera al commit del grupo
+    assert first["name"] == "en línea" and first["status"] == "done"
+    response.close()
+
+    with app.app_context():
+        assert db.session.query(Report).filter_by(project_id=1).count() == 1
+
+
+def _failures(client, items):
+    response = client.post("/api/simulations/batch", json={"items": items, "defaults": {"iterations": 500}})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {line["index"]: line.get("error") for line in lines if line.get("status") == "failed"}
+
+
+@pytest.mark.parametrize("precision", [0, -1, "nan", "inf", "uno"])
+def test_rejects_invalid_target_precision(client, runner, precision):
+    inline = {"variables": [{"name": "x", "distribution": "normal"}], "target_precision": precision}
+    errors = _failures(client, [inline])
+    assert "target_precision" in errors[0]
+
+
+def test_rejects_unknown_inline_params(client, runner):
+    variables = [{"name": "x", "distribution": "normal", "params": {"mean": 1, "sd": 2}}]
+    valid = [{"name": "y", "distribution": "normal", "params": {"mean": 1, "std": 2}}]
+    errors = _failures(client, [{"variables": variables}, {"variables": valid, "target_precision": "2.5"}])
+    assert list(errors) == [0]
+    assert "sd" in errors[0] and "x" in errors[0]
@@ -0,0 +1,92 @@
+"""Caché de resultados: aciertos con semilla, fallos al cambiar opciones e invalidación por variables."""
+import pytest
+
+from cache import cache_key, result_cache
+from conftest import seed_projects
+from models import Variable, db
+from utils import simulate_monte_carlo
+
+VARIABLES = [{"name": "a", "distribution": "normal", "params": {"mean": 1, "std": 2}}]
+
+
+class _Job:
+    id = "job"
+
+    def to_dict(self):
+        return {"id": self.id}
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    import app as app_module
+
+    calls = []
+    monkeypatch.setattr(app_module.simulation_queue, "submit", lambda *a, **kw: calls.append(kw) or _Job())
+    return calls
+
+
+def _simulate(client, **form):
+    data = dict({"iterations": "1000", "seed": "3", "sampling": "random"}, **form)
+    return client.post("/projects/1/simulate", data=data, headers={"Accept": "application/json"})
+
+
+def _finish(app, key):
+    # Lo que hace la cola al terminar: guarda el resultado bajo la clave del trabajo
+    with app.app_context():
+        result_cache.put(key, 1, simulate_monte_carlo(VARIABLES, 1000, seed=3, render_charts=False))
+        db.session.commit()
+
+
+def test_cache_key_requires_a_reproducible_run():
+    assert cache_key(VARIABLES, {"seed": None, "iterations": 10}) is None
+    assert cache_key(VARIABLES, {"seed": 1, "iterations": 10, "max_seconds": 5}) is None
+    key = cache_key(VARIABLES, {"seed": 1, "iterations": 10})
+    assert key == cache_key(VARIABLES, {"seed": "1", "iterations": 10})
+    assert key != cache_key(VARIABLES, {"seed": 2, "iterations": 10})
+    assert key != cache_key(VARIABLES, {"seed": 1, "iterations": 11})
+    assert key != cache_key(VARIABLES, {"seed": 1, "iterations": 10, "sampling": "lhs"})
+    changed = [dict(VARIABLES[0], params={"mean": 1, "std": 3})]
+    assert key != cache_key(changed, {"seed": 1, "iterations": 10})
+
+
+def test_identical_seeded_run_hits_the_cache(app, client, submitted):
+    seed_projects(app, 1, reports=0)
+    assert _simulate(client).status_code == 202
+    _finish(app, submitted[0]["cache_key"])
+
+    response = _simulate(client)
+    assert response.status_code == 201 and response.json["cached"] is True
+    assert len(submitted) == 1
+
+    # Sin el nivel en memoria la entrada sale de la tabla simulation_cache
+    result_cache._memory.clear()
+    hits = result_cache.counters["db_hits"]
+    assert _simulate(client).status_code == 201
+    assert result_cache.counters["db_hits"] == hits + 1
+
+
+@pytest.mark.parametrize("form", [{"seed": "4"}, {"sampling": "lhs"}, {"iterations": "2000"}, {"seed": ""}])
+def test_different_seed_or_option_misses(app, client, submitted, form):
+    seed_projects(app, 1, reports=0)
+    _simulate(client)
+    _finish(app, submitted[0]["cache_key"])
+
+    assert _simulate(client, **form).status_code == 202
+    assert len(submitted) == 2
+
+
+def test_editing_a_variable_invalidates_the_project(app, client, submitted):
+    seed_projects(app, 1, reports=0)
+    _simulate(client)
+    _finish(app, submitted[0]["cache_key"])
+    assert _simulate(client).status_code == 201
+
+    with app.app_context():
+        variable = db.session.get(Variable, 1)
+        variable.mean = variable.mean + 1
+        db.session.commit()
+        # Borrada en ambos niveles por el evento del mapper, no solo por el cambio de clave
+        assert result_cache.get(submitted[0]["cache_key"]) is None
+
+    assert _simulate(client).status_code == 202
+    assert len(submitted) == 2
@@ -0,0 +1,47 @@
+"""Gráficos de reportes anteriores al almacén de artefactos."""
+import base64
+import json
+
+from conftest import QueryCounter, seed_projects
+from models import Report, SimulationResult, db
+
+PNG = b"\x89PNG\r\n\x1a\nlegacy"
+
+
+def _legacy_report(app):
+    seed_projects(app, 1, reports=0)
+    with app.app_context():
+        report = Report(project_id=1, name="Antiguo")
+        report.outputs = [SimulationResult(mean_value=1, std_dev=1, variance_value=1, min_value=0, max_value=2,
+                                           percentile_5=0, percentile_95=2, median_value=1,
+                                           chart_data=json.dumps({"histogram_density": base64.b64encode(PNG).decode()}))]
+        db.session.add(report)
+        db.session.commit()
+        return report.id
+
+
+def test_legacy_chart_is_shown_without_writing(app, client, engine):
+    report_id = _legacy_report(app)
+
+    with QueryCounter(engine) as queries:
+        response = client.get(f"/reports/{report_id}")
+    assert response.status_code == 200
+    assert f"data:image/png;base64,{base64.b64encode(PNG).decode()}" in response.data.decode()
+    # Una vista no modifica la base
+    assert all(sql.lstrip().upper().startswith("SELECT") for sql in queries.statements), queries.statements
+    with app.app_context():
+        result = db.session.get(Report, report_id).result
+        assert result.chart_key is None and result.chart_data is not None
+
+
+def test_migrate_charts_moves_legacy_chart(app, client):
+    report_id = _legacy_report(app)
+
+    output = app.test_cli_runner().invoke(args=["migrate-charts"]).output
+    assert "1 gráficos migrados" in output
+    with app.app_context():
+        result = db.session.get(Report, report_id).result
+        assert result.chart_key and result.chart_data is None
+        key = result.chart_key
+    assert client.get(f"/charts/{key}.png").data == PNG
+    assert "data:image/png" not in client.get(f"/reports/{report_id}").data.decode()
@@ -0,0 +1,97 @@
+"""Re-simulación incremental: columnas reutilizadas, totales derivados, reconstrucción y limpieza."""
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from columns import MANIFEST_ENTRIES, MAX_DERIVATIONS, STALE_TMP_SECONDS, ColumnStore
+from utils import simulate_monte_carlo
+
+
+def _variables(count=4):
+    return [{"id": i, "name": name, "distribution": "normal", "params": {"mean": 10 * i, "std": i}}
+            for i, name in enumerate("abcdefgh"[:count], 1)]
+
+
+def _run(variables, columns_dir):
+    return simulate_monte_carlo(variables, 5_000, seed=9, chunk_size=1_500, render_charts=False,
+                                incremental=True, columns_dir=str(columns_dir))
+
+
+def _assert_same_as_fresh(result, variables, tmp_path):
+    # Un total derivado coincide con sumar las columnas desde cero (directorio vacío)
+    fresh = _run(variables, tmp_path / "fresh")
+    assert fresh["columns"]["total"] == "summed"
+    assert result["summary"]["mean"] == pytest.approx(fresh["summary"]["mean"], rel=1e-12)
+    assert result["summary"]["std"] == pytest.approx(fresh["summary"]["std"], rel=1e-9)
+    assert result["summary"]["percentile_95"] == pytest.approx(fresh["summary"]["percentile_95"], rel=1e-9)
+
+
+def test_only_new_or_changed_columns_are_sampled(tmp_path):
+    variables = _variables()
+    assert _run(variables, tmp_path / "cols")["columns"] == {
+        "reused": 0, "sampled": ["a", "b", "c", "d"], "total": "summed"}
+    assert _run(variables, tmp_path / "cols")["columns"] == {"reused": 4, "sampled": [], "total": "cached"}
+
+    variables[1]["params"]["std"] = 7
+    changed = _run(variables, tmp_path / "cols")
+    assert changed["columns"] == {"reused": 3, "sampled": ["b"], "total": "derived"}
+    _assert_same_as_fresh(changed, variables, tmp_path)
+
+    variables = variables + _variables(5)[4:]
+    added = _run(variables, tmp_path / "cols")
+    assert added["columns"] == {"reused": 4, "sampled": ["e"], "total": "derived"}
+
+
+def test_removed_variable_is_subtracted(tmp_path):
+    variables = _variables(5)
+    _run(variables, tmp_path / "cols")
+    removed = _run(variables[:2] + variables[3:], tmp_path / "cols")
+    assert removed["columns"] == {"reused": 4, "sampled": [], "total": "derived"}
+    _assert_same_as_fresh(removed, variables[:2] + variables[3:], tmp_path)
+
+
+def test_total_is_rebuilt_after_max_derivations(tmp_path):
+    variables = _variables()
+    store = tmp_path / "cols"
+    how = []
+    for step in range(MAX_DERIVATIONS + MANIFEST_ENTRIES):
+        variables[0]["params"]["mean"] = 100 + step
+        how.append(_run(variables, store)["columns"]["total"])
+        manifest, = [name for name in os.listdir(store) if name.endswith(".json")]
+        with open(store / manifest) as f:
+            generations = [entry["generation"] for entry in json.load(f)]
+        assert max(generations) < MAX_DERIVATIONS
+    assert how[:MAX_DERIVATIONS] == ["summed"] + ["derived"] * (MAX_DERIVATIONS - 1)
+    # Cuando todos los totales recordados agotaron sus derivaciones se vuelve a sumar
+    assert "summed" in how[MAX_DERIVATIONS:]
+    _assert_same_as_fresh(_run(variables, store), variables, tmp_path)
+
+
+def test_prune_keeps_recent_tmp_and_deletes_stale(tmp_path):
+    store = ColumnStore(str(tmp_path))
+    recent = tmp_path / "nueva.npy.123.tmp"
+    stale = tmp_path / "abandonada.npy.456.tmp"
+    for path in (recent, stale):
+        path.write_bytes(b"\0" * 64)
+    old = time.time() - STALE_TMP_SECONDS - 60
+    os.utime(stale, (old, old))
+    assert store.prune() == 1
+    assert recent.exists() and not stale.exists()
+
+
+def test_prune_evicts_least_recently_used_columns(tmp_path):
+    store = ColumnStore(str(tmp_path), max_bytes=3 * 8_000)
+    for age, key in enumerate(["vieja", "media", "nueva", "actual"]):
+        column = store.create(key, 1_000)
+        column[:] = age
+        store.commit(key, column)
+        stamp = time.time() - 1_000 + age
+        os.utime(store.path(key), (stamp, stamp))
+    # Las claves en uso nunca se borran aunque sean las más antiguas
+    assert store.prune(keep=["vieja"]) == 2
+    assert store.get("vieja") is not None and store.get("actual") is not None
+    assert store.get("media") is None and store.get("nueva") is None
+    np.testing.assert_array_equal(store.get("actual"), np.full(1_000, 3.0))
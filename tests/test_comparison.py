@@ -0,0 +1,79 @@
+"""Percentiles, CDF y tendencias calculados desde los histogramas guardados."""
+import numpy as np
+import pytest
+
+from comparison import cdf_at, compare, drift, quantiles
+from conftest import seed_projects
+
+UNIFORM = ([1, 1, 1, 1], [0, 1, 2, 3, 4])
+SHIFTED = ([0, 2, 6, 2], [10, 12, 14, 16, 18])
+POINT = ([5], [7, 7])
+
+
+def _row(i, histogram, p95, mean=None):
+    summary = {"mean": mean if mean is not None else p95 - 1, "median": p95 - 2, "percentile_5": p95 - 4,
+               "percentile_95": p95, "std": 1.0}
+    return {"id": i, "name": f"R{i}", "created_at": None, "summary": summary, "histogram": histogram}
+
+
+def test_quantiles_invert_linear_cdf():
+    values = quantiles([UNIFORM, SHIFTED], [1, 25, 50, 90, 100])
+    np.testing.assert_allclose(values[0], [0.04, 1, 2, 3.6, 4])
+    # SHIFTED: 2 en [12,14), 6 en [14,16), 2 en [16,18) de 10; el primer bin vacío se salta
+    np.testing.assert_allclose(values[1], [12.1, 14 + 2 * 0.5 / 6, 15, 16 + 2 * 0.5, 18])
+
+
+def test_cdf_is_piecewise_linear_and_handles_point_mass():
+    grid = np.array([-1, 0, 0.5, 2, 3.25, 4, 9])
+    cdf = cdf_at([UNIFORM, POINT], grid)
+    np.testing.assert_allclose(cdf[0], [0, 0, 0.125, 0.5, 0.8125, 1, 1])
+    np.testing.assert_array_equal(cdf[1], [0, 0, 0, 0, 0, 0, 1])
+
+
+def test_quantiles_and_cdf_are_inverse():
+    percents = np.linspace(5, 95, 19)
+    values = quantiles([SHIFTED], percents)[0]
+    np.testing.assert_allclose(cdf_at([SHIFTED], values)[0], percents / 100)
+
+
+def test_drift_reports_change_and_slope():
+    assert drift([]) is None
+    assert drift([5])["slope_per_run"] == 0.0
+    result = drift([10, 12, 14, 16])
+    assert result["change"] == 6 and result["relative_change"] == pytest.approx(0.6)
+    assert result["slope_per_run"] == pytest.approx(2)
+    assert (result["min"], result["max"]) == (10, 16)
+    assert drift([0, 3])["relative_change"] is None
+
+
+def test_compare_overlays_and_trends():
+    rows = [_row(1, UNIFORM, 4), _row(2, None, 10), _row(3, SHIFTED, 16)]
+    result = compare(rows, bins=18, percents=(50, 90))
+    assert [r["has_histogram"] for r in result["reports"]] == [True, False, True]
+    # Las tendencias incluyen los reportes sin histograma; la superposición no
+    assert result["trend"]["percentile_95"] == [4, 10, 16]
+    assert result["drift"]["slope_per_run"] == pytest.approx(6)
+    assert set(result["densities"]) == {"1", "3"}
+    edges = np.array(result["edges"])
+    assert edges[0] == 0 and edges[-1] == 18 and len(edges) == 19
+    for density in result["densities"].values():
+        assert np.sum(np.array(density) * np.diff(edges)) == pytest.approx(1)
+    assert np.sum(np.array(result["pooled"]) * np.diff(edges)) == pytest.approx(1)
+    assert result["percentiles"]["50"] == {"1": pytest.approx(2), "3": pytest.approx(15)}
+    assert result["percentiles"]["90"]["1"] == pytest.approx(3.6)
+
+
+def test_compare_without_histograms():
+    result = compare([_row(1, None, 5)])
+    assert result["edges"] == [] and result["densities"] == {} and result["percentiles"] == {}
+    assert result["trend"]["mean"] == [4]
+
+
+def test_compare_endpoint_uses_stored_histograms(app, client):
+    seed_projects(app, 1, variables=1, reports=3)
+    body = client.get("/projects/1/compare.json?q=50,95&bins=10").json
+    assert [r["name"] for r in body["reports"]] == ["Reporte 0-0", "Reporte 0-1", "Reporte 0-2"]
+    assert body["trend"]["mean"] == [10, 11, 12]
+    # Histograma sembrado simétrico en [0, 5]: mediana 2.5
+    assert list(body["percentiles"]["50"].values()) == pytest.approx([2.5] * 3)
+    assert client.get("/projects/1/compare.json?q=150").status_code == 400
@@ -0,0 +1,80 @@
+"""Reparación de matrices no semidefinidas y correlación de rangos alcanzada por Cholesky e Iman-Conover."""
+import numpy as np
+import pytest
+from scipy.stats import spearmanr
+
+from correlation import cached_factor, correlation_matrix, factorize, is_psd, nearest_psd
+from engine import simulate_partial
+
+VARIABLES = [
+    {"name": "a", "distribution": "normal", "params": {"mean": 10, "std": 2}},
+    {"name": "b", "distribution": "lognormal", "params": {"mu": 0, "sigma": 0.5}},
+    {"name": "c", "distribution": "uniform", "params": {"low": 0, "high": 5}},
+]
+TARGET = correlation_matrix(3, [(0, 1, 0.7), (0, 2, -0.4), (1, 2, -0.2)])
+# Inconsistente: a~b y a~c muy positivas pero b~c muy negativa
+INVALID = correlation_matrix(3, [(0, 1, 0.9), (0, 2, 0.9), (1, 2, -0.9)])
+
+
+def _ranks(method, matrix=TARGET, sampling="random", seed=3):
+    factor = factorize(matrix)
+    partial = simulate_partial(VARIABLES, 20_000, np.random.SeedSequence(seed), sampling=sampling,
+                               sensitivity=True, correlation={"method": method, "lower": factor["lower"]})
+    return spearmanr(partial.head[:-1], axis=1).statistic, partial
+
+
+def test_nearest_psd_returns_valid_correlation_matrix():
+    assert not is_psd(INVALID)
+    repaired = nearest_psd(INVALID)
+    np.testing.assert_allclose(repaired, repaired.T)
+    np.testing.assert_allclose(np.diag(repaired), 1)
+    assert np.linalg.eigvalsh(repaired).min() >= -1e-8
+    assert np.abs(repaired).max() <= 1 + 1e-12
+    # Una matriz ya válida no se toca
+    np.testing.assert_allclose(nearest_psd(TARGET), TARGET, atol=1e-12)
+
+
+def test_factorize_repairs_and_reconstructs():
+    factor = factorize(INVALID)
+    assert factor["repaired"] is True
+    assert factor["min_eigenvalue"] >= -1e-8
+    np.testing.assert_allclose(factor["lower"] @ factor["lower"].T, factor["matrix"], atol=1e-10)
+    assert factorize(TARGET)["repaired"] is False
+
+
+def test_singular_matrix_is_factorized():
+    factor = factorize(correlation_matrix(2, [(0, 1, 1.0)]))
+    np.testing.assert_allclose(factor["lower"] @ factor["lower"].T, np.ones((2, 2)), atol=1e-10)
+
+
+def test_cached_factor_is_memoized_per_project():
+    first = cached_factor(1, TARGET)
+    assert cached_factor(1, TARGET.copy()) is first
+    assert cached_factor(2, TARGET) is not first
+
+
+@pytest.mark.parametrize("sampling", ["random", "lhs"])
+def test_iman_conover_reaches_rank_correlation(sampling):
+    ranks, _ = _ranks("iman_conover", sampling=sampling)
+    np.testing.assert_allclose(ranks, TARGET, atol=0.03)
+
+
+@pytest.mark.parametrize("sampling", ["random", "sobol"])
+def test_cholesky_reaches_rank_correlation(sampling):
+    ranks, _ = _ranks("cholesky", sampling=sampling)
+    # Cópula gaussiana: ρ_S = 6/π · asin(ρ / 2)
+    np.testing.assert_allclose(ranks, 6 / np.pi * np.arcsin(TARGET / 2), atol=0.03)
+
+
+@pytest.mark.parametrize("method", ["cholesky", "iman_conover"])
+def test_marginals_are_preserved(method):
+    _, partial = _ranks(method)
+    a, b, c = partial.head[:-1]
+    assert a.mean() == pytest.approx(10, abs=0.1) and a.std() == pytest.approx(2, abs=0.1)
+    assert b.mean() == pytest.approx(np.exp(0.125), abs=0.02)
+    assert c.min() >= 0 and c.max() <= 5
+
+
+def test_repaired_matrix_is_reached():
+    ranks, _ = _ranks("iman_conover", matrix=INVALID)
+    np.testing.assert_allclose(ranks, factorize(INVALID)["matrix"], atol=0.03)
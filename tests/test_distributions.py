@@ -0,0 +1,94 @@
+"""Registro de distribuciones: búsqueda, parámetros, muestreo e inversa de la CDF."""
+import numpy as np
+import pytest
+from scipy import stats
+
+from distributions import DISTRIBUTIONS, get_distribution
+
+# Nombre -> (parámetros, distribución de referencia de scipy)
+REFERENCE = {
+    "normal": ({"mean": 5, "std": 2}, stats.norm(5, 2)),
+    "uniform": ({"low": -1, "high": 3}, stats.uniform(-1, 4)),
+    "triangular": ({"left": 0, "mode": 2, "right": 10}, stats.triang(0.2, 0, 10)),
+    "lognormal": ({"mu": 0.5, "sigma": 0.4}, stats.lognorm(0.4, scale=np.exp(0.5))),
+    "beta": ({"alpha": 2, "beta": 5, "low": 10, "high": 20}, stats.beta(2, 5, 10, 10)),
+    "pert": ({"left": 0, "mode": 3, "right": 10}, stats.beta(1 + 4 * 0.3, 1 + 4 * 0.7, 0, 10)),
+    "gamma": ({"shape": 3, "scale": 2}, stats.gamma(3, scale=2)),
+    "poisson": ({"lam": 4}, stats.poisson(4)),
+    "empirical": ({"values": [1, 2, 2, 7]}, stats.rv_discrete(values=([1, 2, 7], [0.25, 0.5, 0.25]))),
+    "discrete": ({"values": [10, 0, 5], "probs": [1, 2, 1]},
+                 stats.rv_discrete(values=([0, 5, 10], [0.5, 0.25, 0.25]))),
+}
+
+
+def test_every_registered_distribution_is_covered():
+    assert set(DISTRIBUTIONS) == set(REFERENCE)
+
+
+@pytest.mark.parametrize("name", [" Normal ", "NORMAL", "normal"])
+def test_get_distribution_folds_case_and_spaces(name):
+    assert get_distribution(name) is DISTRIBUTIONS["normal"]
+
+
+@pytest.mark.parametrize("name", ["weibull", "", None])
+def test_get_distribution_rejects_unknown_names(name):
+    with pytest.raises(ValueError, match="Distribución desconocida"):
+        get_distribution(name)
+
+
+def test_parse_params_fills_defaults():
+    assert get_distribution("normal").parse_params({"mean": "7", "std": ""}) == {"mean": 7.0, "std": 15.0}
+    assert get_distribution("triangular").parse_params(None) == {"left": 10.0, "mode": 50.0, "right": 90.0}
+
+
+def test_parse_params_parses_lists():
+    params = get_distribution("discrete").parse_params({"values": "1, 2;3", "probs": ["0.2", 0.3, "0.5"]})
+    assert params == {"values": [1.0, 2.0, 3.0], "probs": [0.2, 0.3, 0.5]}
+
+
+@pytest.mark.parametrize("name,raw,message", [
+    ("normal", {"std": -1}, "std no puede ser negativa"),
+    ("uniform", {"low": 5, "high": 1}, "low debe ser menor o igual que high"),
+    ("triangular", {"left": 0, "mode": 20, "right": 10}, "mínimo <= moda <= máximo"),
+    ("lognormal", {"sigma": 0}, "sigma debe ser mayor que 0"),
+    ("beta", {"alpha": -1}, "alpha debe ser mayor que 0"),
+    ("gamma", {"scale": 0}, "scale debe ser mayor que 0"),
+    ("poisson", {"lam": -2}, "lam no puede ser negativa"),
+    ("empirical", {"values": ""}, "al menos un valor"),
+    ("discrete", {"values": "1,2", "probs": "1"}, "una probabilidad no negativa por valor"),
+])
+def test_parse_params_validates(name, raw, message):
+    with pytest.raises(ValueError, match=message):
+        get_distribution(name).parse_params(raw)
+
+
+def test_parse_params_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        get_distribution("normal").parse_params({"mean": "abc"})
+
+
+@pytest.mark.parametrize("name", REFERENCE)
+def test_sampler_matches_reference_moments(name):
+    raw, reference = REFERENCE[name]
+    dist = get_distribution(name)
+    n = 200_000
+    out = dist.sample(np.random.default_rng(3), dist.parse_params(raw), np.empty(n))
+    std = reference.std()
+    assert abs(out.mean() - reference.mean()) < 5 * std / np.sqrt(n)
+    assert out.std() == pytest.approx(std, rel=0.02)
+    support = reference.support()
+    assert out.min() >= support[0] - 1e-9 and out.max() <= support[1] + 1e-9
+
+
+@pytest.mark.parametrize("name", REFERENCE)
+def test_ppf_matches_reference(name):
+    raw, reference = REFERENCE[name]
+    dist = get_distribution(name)
+    # Fuera de los saltos de las CDF discretas, donde el convenio del extremo no importa
+    u = np.array([0.01, 0.1, 0.3, 0.45, 0.6, 0.9, 0.99])
+    expected = reference.ppf(u)
+    # La inversa puede escribir sobre su propia entrada
+    out = dist.ppf(dist.parse_params(raw), u.copy(), np.empty_like(u))
+    np.testing.assert_allclose(out, expected, rtol=1e-6)
+    in_place = u.copy()
+    np.testing.assert_allclose(dist.ppf(dist.parse_params(raw), in_place, in_place), expected, rtol=1e-6)
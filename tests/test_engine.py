@@ -0,0 +1,44 @@
+"""Motor en paralelo: semillas por worker derivadas de SeedSequence."""
+import numpy as np
+import pytest
+
+from utils import simulate_monte_carlo
+
+VARIABLES = [
+    {"name": "a", "distribution": "normal", "params": {"mean": 10, "std": 2}},
+    {"name": "b", "distribution": "uniform", "params": {"low": 0, "high": 6}},
+]
+# Media y desviación típica exactas de a + b
+MEAN, STD = 13.0, np.sqrt(4 + 3)
+
+
+def _run(**options):
+    return simulate_monte_carlo(VARIABLES, render_charts=False, **options)
+
+
+def _summary(**options):
+    return _run(**options)["summary"]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_same_seed_and_workers_is_reproducible(workers):
+    first = _run(iterations=60_000, seed=11, workers=workers, chunk_size=7_000)
+    second = _run(iterations=60_000, seed=11, workers=workers, chunk_size=7_000)
+    assert first["summary"] == second["summary"]
+    assert first["histogram"] == second["histogram"]
+
+
+def test_different_seeds_differ():
+    assert _summary(iterations=10_000, seed=1)["mean"] != _summary(iterations=10_000, seed=2)["mean"]
+
+
+def test_worker_counts_are_statistically_consistent():
+    n = 200_000
+    summaries = [_summary(iterations=n, seed=5, workers=workers) for workers in (1, 2, 4)]
+    for summary in summaries:
+        assert summary["sample_count"] == n
+        # Cinco errores estándar alrededor de la media exacta
+        assert abs(summary["mean"] - MEAN) < 5 * STD / np.sqrt(n)
+        assert summary["std"] == pytest.approx(STD, rel=0.01)
+    # Otro reparto de generadores: mismos momentos, otros números
+    assert summaries[0]["mean"] != summaries[1]["mean"]
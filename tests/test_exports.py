@@ -0,0 +1,20 @@
+"""Zip de exportaciones en streaming."""
+import io
+import zipfile
+
+from exports import MISSING_ENTRY, iter_zip
+
+
+def test_iter_zip_lists_missing_artifacts(caplog):
+    entries = [("a.pdf", io.BytesIO(b"%PDF-a")), ("b.pdf", None), ("c.pdf", io.BytesIO(b"%PDF-c")), ("d.pdf", None)]
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(entries, chunk_size=2))))
+
+    assert archive.namelist() == ["a.pdf", "c.pdf", MISSING_ENTRY]
+    assert archive.read("c.pdf") == b"%PDF-c"
+    assert archive.read(MISSING_ENTRY).decode().splitlines()[1:] == ["b.pdf", "d.pdf"]
+    assert "sin 2 archivo(s)" in caplog.text
+
+
+def test_iter_zip_without_missing_artifacts():
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip([("a.docx", io.BytesIO(b"docx"))]))))
+    assert archive.namelist() == ["a.docx"]
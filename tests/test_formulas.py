@@ -0,0 +1,117 @@
+"""Validación, reutilización de registros y equivalencia de los dos evaluadores de fórmulas."""
+import numpy as np
+import pytest
+
+from formulas import CompiledFormula, FormulaError, _where, compile_outputs
+
+NAMES = ["a", "b", "c"]
+
+# Fórmula -> referencia con numpy sobre (a, b, c)
+CASES = {
+    "a * b - c": lambda a, b, c: a * b - c,
+    "-a + 2 ** 3 / b": lambda a, b, c: -a + 8 / b,
+    "max(0, a - b, c)": lambda a, b, c: np.maximum(np.maximum(0, a - b), c),
+    "min(a, b)": lambda a, b, c: np.minimum(a, b),
+    "abs(a - b) + sqrt(abs(c))": lambda a, b, c: np.abs(a - b) + np.sqrt(np.abs(c)),
+    "exp(a / 10) * log(abs(b) + 1)": lambda a, b, c: np.exp(a / 10) * np.log(np.abs(b) + 1),
+    "a % 3": lambda a, b, c: np.mod(a, 3),
+    "a > b": lambda a, b, c: (a > b).astype(float),
+    "where(a > b, a - b, 0)": lambda a, b, c: np.where(a > b, a - b, 0),
+    "clip(a * b, 0, c)": lambda a, b, c: np.minimum(np.maximum(a * b, 0), c),
+    "clip(a - b, b, a + c) * where(a > 0, a, b)":
+        lambda a, b, c: np.minimum(np.maximum(a - b, b), a + c) * np.where(a > 0, a, b),
+    "a * b + b * c + c * a": lambda a, b, c: a * b + b * c + c * a,
+    "pi * a": lambda a, b, c: np.pi * a,
+    "b": lambda a, b, c: b,
+    "2 * 3": lambda a, b, c: np.full_like(a, 6.0),
+}
+
+
+@pytest.fixture
+def samples():
+    return np.random.default_rng(7).normal(size=(3, 1000)) * 5
+
+
+def _ufuncs(expression):
+    formula = CompiledFormula(expression, NAMES)
+    formula.numexpr = None
+    return formula
+
+
+@pytest.mark.parametrize("expression", [
+    "a.real", "a[0]", "__import__('os')", "open('x')", "a if b else c", "lambda: a",
+    "a and b", "not a", "a < b < c", "a << 2", "[a, b]", "'texto'", "True", "max(a=1, b=2)",
+    "a.__class__", "d + 1", "floor()", "where(a, b)", "(a)(b)",
+])
+def test_rejects_disallowed_nodes(expression):
+    with pytest.raises(FormulaError):
+        CompiledFormula(expression, NAMES)
+
+
+def test_rejects_syntax_errors():
+    with pytest.raises(FormulaError, match="Fórmula inválida"):
+        CompiledFormula("a +", NAMES)
+
+
+@pytest.mark.parametrize("expression,reference", CASES.items())
+def test_ufunc_program_matches_numpy(samples, expression, reference):
+    out = _ufuncs(expression).evaluate(samples, np.empty(samples.shape[1]))
+    np.testing.assert_allclose(out, reference(*samples), equal_nan=True)
+
+
+@pytest.mark.parametrize("expression", CASES)
+def test_numexpr_matches_ufunc_program(samples, expression):
+    fused = CompiledFormula(expression, NAMES)
+    assert fused.numexpr is not None
+    expected = _ufuncs(expression).evaluate(samples, np.empty(samples.shape[1]))
+    out = fused.evaluate(samples, np.empty(samples.shape[1]))
+    np.testing.assert_allclose(out, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_clip_reuses_one_register():
+    formula = _ufuncs("clip(a * b, 0, c)")
+    assert formula.registers == 1
+    assert {dest for _, _, dest in formula.program} == {0}
+
+
+def test_where_does_not_overwrite_its_inputs():
+    # _where copia `b` en la salida antes de leer la condición: la salida no puede ser una entrada
+    formula = _ufuncs("clip(a - b, b, a + c) * where(a > 0, a, b)")
+    for func, args, dest in formula.program:
+        if func is _where:
+            assert ("reg", dest) not in args
+    assert formula.registers == 3
+
+
+def test_scratch_is_reused_between_calls(samples):
+    formula = _ufuncs("where(a > b, a - b, 0) + clip(c, 0, 1)")
+    scratch = np.empty((formula.registers, samples.shape[1]))
+    out = np.empty(samples.shape[1])
+    first = formula.evaluate(samples, out, scratch).copy()
+    np.testing.assert_array_equal(formula.evaluate(samples, out, scratch), first)
+    # Un bloque más corto usa una vista del mismo scratch
+    np.testing.assert_array_equal(formula.evaluate(samples[:, :10], out[:10], scratch), first[:10])
+
+
+def test_compile_outputs_rejects_duplicate_identifiers():
+    variables = [{"name": "costo fijo"}, {"name": "costo-fijo"}]
+    with pytest.raises(FormulaError, match="costo_fijo"):
+        compile_outputs([{"name": "margen", "expression": "costo_fijo * 2"}], variables)
+    # Sin fórmulas se suma todo y los nombres no importan
+    assert compile_outputs([], variables) == [("total", None)]
+
+
+def test_output_add_rejects_duplicate_identifiers(app, client):
+    from models import Project, Variable, db
+
+    with app.app_context():
+        project = Project(name="Duplicados")
+        project.variables = [Variable(name=name, distribution="normal", mean=0, std_dev=1)
+                             for name in ("costo fijo", "costo-fijo")]
+        db.session.add(project)
+        db.session.commit()
+        project_id = project.id
+    response = client.post(f"/projects/{project_id}/outputs/add",
+                           data={"output_name": "margen", "expression": "costo_fijo * 2"})
+    assert response.json["success"] is False
+    assert "costo_fijo" in response.json["message"]
@@ -0,0 +1,53 @@
+"""Cola de simulaciones: trabajos que superan el plazo mientras se ejecutan."""
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from conftest import seed_projects
+from jobs import SimulationQueue
+from models import SimulationJob, db
+
+
+def _timed_out_job(app, job_id):
+    seed_projects(app, 1, reports=0)
+    with app.app_context():
+        db.session.add(SimulationJob(id=job_id, project_id=1, status="running",
+                                     timeout_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+
+
+def _queue(app, future):
+    queue = SimulationQueue()
+    queue.app = app
+    queue._futures["job"] = future
+    return queue
+
+
+def test_running_future_counts_until_it_finishes(app):
+    _timed_out_job(app, "job")
+    future = Future()
+    future.set_running_or_notify_cancel()
+    queue = _queue(app, future)
+
+    queue.poll()
+    with app.app_context():
+        assert db.session.get(SimulationJob, "job").status == "timeout"
+    # cancel() no detiene un futuro en ejecución: sigue ocupando el pool
+    assert queue.pending() == 1
+    queue.poll()
+    assert queue.pending() == 1
+
+    future.set_result({"summary": {}})
+    queue.poll()
+    assert queue.pending() == 0 and "job" not in queue._futures
+    with app.app_context():
+        job = db.session.get(SimulationJob, "job")
+        # El resultado tardío se descarta
+        assert job.status == "timeout" and job.report_id is None
+
+
+def test_queued_future_is_cancelled(app):
+    _timed_out_job(app, "job")
+    queue = _queue(app, Future())
+
+    queue.poll()
+    assert queue.pending() == 0 and "job" not in queue._futures
@@ -0,0 +1,88 @@
+"""Paginación por clave: cursores estables, sin duplicados ni huecos con fechas iguales."""
+from datetime import datetime
+
+import pytest
+
+from conftest import seed_projects
+from listing import decode_cursor, encode_cursor, keyset_page
+from models import Project, Report, db
+
+# Varios reportes por instante: el id desempata
+STAMPS = [datetime(2024, 5, 1, 12, 0, 0)] * 5 + [datetime(2024, 5, 2, 9, 30, 0, 250000)] * 4 + \
+    [datetime(2024, 5, 3)] * 3
+
+
+@pytest.fixture
+def reports(app):
+    with app.app_context():
+        project = Project(name="Paginado")
+        db.session.add(project)
+        for i, stamp in enumerate(STAMPS):
+            db.session.add(Report(project=project, name=f"R{i}", created_at=stamp))
+        db.session.commit()
+    return app
+
+
+def _walk(columns, limit, descending=True):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(Report.query, columns, cursor, limit, descending)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 12, 50])
+def test_equal_timestamps_have_no_duplicates_or_gaps(reports, limit):
+    with reports.app_context():
+        expected = [r.id for r in Report.query.order_by(Report.created_at.desc(), Report.id.desc())]
+        pages = _walk([Report.created_at, Report.id], limit)
+    assert [i for page in pages for i in page] == expected
+    assert all(len(page) == limit for page in pages[:-1]) and 0 < len(pages[-1]) <= limit
+
+
+def test_ascending_single_column(reports):
+    with reports.app_context():
+        expected = sorted(r.id for r in Report.query)
+        assert [i for page in _walk([Report.id], 5, descending=False) for i in page] == expected
+
+
+def test_cursor_is_stable_when_rows_are_inserted(reports):
+    with reports.app_context():
+        first, cursor = keyset_page(Report.query, [Report.created_at, Report.id], None, 4)
+        rest, _ = keyset_page(Report.query, [Report.created_at, Report.id], cursor, 4)
+        # Un reporte nuevo (más reciente) no desplaza la página siguiente
+        db.session.add(Report(project_id=first[0].project_id, name="Nuevo", created_at=datetime(2024, 6, 1)))
+        db.session.commit()
+        again, _ = keyset_page(Report.query, [Report.created_at, Report.id], cursor, 4)
+        assert [r.id for r in again] == [r.id for r in rest]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2024, 5, 2, 9, 30, 0, 250000), 17])
+    assert cursor == "2024-05-02T09:30:00.250000,17"
+    assert decode_cursor(cursor, [Report.created_at, Report.id]) == (datetime(2024, 5, 2, 9, 30, 0, 250000), 17)
+
+
+@pytest.mark.parametrize("cursor", ["", "17", "17,3", "ayer,3", "2024-05-02T09:30:00,x", "1,2,3"])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [Report.created_at, Report.id])
+
+
+def test_api_pages_follow_next_and_reject_bad_cursor(app, client):
+    seed_projects(app, 7, variables=1, reports=0)
+    seen, url = [], "/api/projects?limit=3"
+    while url:
+        body = client.get(url).json
+        seen += [p["id"] for p in body["projects"]]
+        url = body["next_url"]
+    assert seen == sorted(seen, reverse=True) and len(seen) == len(set(seen)) == 7
+    response = client.get("/api/projects?after=abc")
+    assert response.status_code == 400 and response.json["success"] is False
+
+
+def test_html_list_falls_back_to_first_page_on_bad_cursor(reports, client):
+    response = client.get("/reports?after=no-es-un-cursor")
+    assert response.status_code == 200
+    assert b"R11" in response.data
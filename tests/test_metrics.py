@@ -0,0 +1,63 @@
+"""Formato de exposición de texto de Prometheus y el endpoint /metrics."""
+import re
+
+from metrics import Histogram
+
+# Línea de muestra: nombre{etiquetas} valor
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? [0-9.e+-]+$')
+
+
+def _lines(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demostración", ("route",), buckets=(0.1, 1, 10))
+    for value in (0.05, 0.5, 0.5, 5, 50):
+        histogram.observe(value, route="/a")
+    text = histogram.render()
+    assert text.splitlines()[:2] == ["# HELP demo_seconds Demostración", "# TYPE demo_seconds histogram"]
+    assert _lines(text, "demo_seconds_bucket") == [
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1"} 3',
+        'demo_seconds_bucket{route="/a",le="10"} 4',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 5',
+    ]
+    assert 'demo_seconds_sum{route="/a"} 56.050000' in text
+    assert 'demo_seconds_count{route="/a"} 5' in text
+
+
+def test_histogram_escapes_labels_and_omits_empty_braces():
+    labelled = Histogram("demo_total", "Demo", ("name",), buckets=(1,))
+    labelled.observe(1, name='di "hola"\\\n')
+    assert 'name="di \\"hola\\"\\\\\\n"' in labelled.render()
+    plain = Histogram("plain_seconds", "Sin etiquetas", buckets=(1,))
+    plain.observe(2)
+    assert "plain_seconds_sum 2.000000" in plain.render()
+    assert 'plain_seconds_bucket{le="+Inf"} 1' in plain.render()
+    for line in (labelled.render() + "\n" + plain.render()).splitlines():
+        assert line.startswith("#") or SAMPLE.match(line), line
+
+
+def test_metrics_endpoint_exposes_requests_and_queries(client):
+    client.get("/projects")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "version=0.0.4" in response.content_type
+    text = response.get_data(as_text=True)
+    assert text.endswith("\n")
+    assert re.search(r'http_request_duration_seconds_count\{method="GET",endpoint="projects_list",status="200"\} \d+',
+                     text)
+    assert re.search(r'db_query_duration_seconds_count\{operation="SELECT"\} [1-9]', text)
+    for line in text.splitlines():
+        assert line.startswith("#") or SAMPLE.match(line), line
+
+
+def test_metrics_token_and_disable(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3creto")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3creto"}).status_code == 200
+    monkeypatch.setitem(app.config, "METRICS_ENABLED", False)
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3creto"}).status_code == 404
@@ -0,0 +1,45 @@
+"""Número de consultas por vista: no debe crecer con el número de filas (N+1)."""
+import pytest
+
+from conftest import QueryCounter, assert_max_queries, seed_projects
+
+# Máximo por petición, contando la carga del usuario de la sesión
+ROUTES = [
+    ("/projects", 5),  # proyectos + variables, correlaciones y salidas (selectinload)
+    ("/reports", 2),
+    ("/reports?project=Proyecto", 2),
+    ("/reports?date=2020-01-01", 2),
+    ("/simulaciones", 2),
+    ("/users", 2),
+    ("/api/projects", 3),
+    ("/reports/1", 3),
+    ("/reports/1/histogram.json", 2),
+    ("/projects/1/compare", 2),
+    ("/projects/1/compare.json", 4),
+]
+
+
+@pytest.mark.parametrize("url,limit", ROUTES)
+def test_query_count_is_bounded(app, client, engine, url, limit):
+    seed_projects(app, 3)
+    with assert_max_queries(limit, engine):
+        response = client.get(url)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("url,limit", ROUTES)
+def test_query_count_does_not_grow_with_rows(app, client, engine, url, limit):
+    seed_projects(app, 2)
+    with QueryCounter(engine) as few:
+        client.get(url)
+    seed_projects(app, 20, reports=3)
+    # compare.json memoriza por conjunto de reportes: con más reportes el conjunto cambia
+    with QueryCounter(engine) as many:
+        client.get(url)
+    assert many.count <= few.count, many.statements
+
+
+def test_assert_max_queries_reports_statements(app, client, engine):
+    with pytest.raises(AssertionError, match="consultas ejecutadas"):
+        with assert_max_queries(0, engine):
+            client.get("/reports")
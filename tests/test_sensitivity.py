@@ -0,0 +1,61 @@
+"""Sensibilidad sobre un modelo aditivo conocido: Sobol, Spearman, tornado y entradas correlacionadas."""
+import numpy as np
+import pytest
+
+from utils import render_tornado_png, simulate_monte_carlo
+
+# Total = a + b + c con normales independientes: S_i = ST_i = var_i / Σ var
+STDS = {"a": 1.0, "b": 2.0, "c": 4.0}
+VARIABLES = [{"name": name, "distribution": "normal", "params": {"mean": 0, "std": std}}
+             for name, std in STDS.items()]
+SHARE = {name: std ** 2 / sum(s ** 2 for s in STDS.values()) for name, std in STDS.items()}
+
+
+def _analysis(**kwargs):
+    result = simulate_monte_carlo(VARIABLES, 20_000, seed=11, sensitivity=True, sobol_samples=8192, **kwargs)
+    return result, {row["name"]: row for row in result["sensitivity"]["variables"]}
+
+
+@pytest.fixture(scope="module")
+def additive():
+    return _analysis()
+
+
+def test_sobol_indices_match_variance_shares(additive):
+    _, rows = additive
+    for name, share in SHARE.items():
+        assert rows[name]["first_order"] == pytest.approx(share, abs=0.05)
+        assert rows[name]["total_order"] == pytest.approx(share, abs=0.05)
+        # Sin interacciones el total no puede quedar muy por encima del primer orden
+        assert rows[name]["total_order"] - rows[name]["first_order"] < 0.05
+
+
+def test_rows_are_ordered_by_spearman(additive):
+    result, rows = additive
+    names = [row["name"] for row in result["sensitivity"]["variables"]]
+    assert names == ["c", "b", "a"]
+    for name, share in SHARE.items():
+        # En un modelo lineal gaussiano ρ ≈ σ_i / σ_total
+        assert rows[name]["spearman"] == pytest.approx(np.sqrt(share), abs=0.03)
+        assert rows[name]["pearson"] == pytest.approx(np.sqrt(share), abs=0.03)
+    assert sum(row["contribution"] for row in rows.values()) == pytest.approx(1)
+    assert result["sensitivity"]["sobol_samples"] == 8192
+    assert result["sensitivity"]["sobol_note"] is None
+
+
+def test_tornado_chart_is_png(additive):
+    result, _ = additive
+    assert render_tornado_png(result["sensitivity"]).startswith(b"\x89PNG")
+    assert "tornado" in result["charts"]
+
+
+def test_correlated_inputs_skip_sobol():
+    lower = np.linalg.cholesky(np.array([[1, 0.6, 0], [0.6, 1, 0], [0, 0, 1]]))
+    result, rows = _analysis(correlation={"method": "cholesky", "lower": lower.tolist()})
+    analysis = result["sensitivity"]
+    assert analysis["sobol_samples"] is None
+    assert "correlacionadas" in analysis["sobol_note"]
+    assert all(row["first_order"] is None and row["total_order"] is None for row in rows.values())
+    # Spearman y el tornado siguen disponibles
+    assert all(row["spearman"] is not None for row in rows.values())
+    assert "tornado" in result["charts"]
@@ -0,0 +1,85 @@
+"""Validación del formulario de simulación y convergencia de la precisión objetivo."""
+import json
+
+import pytest
+
+from conftest import seed_projects
+from utils import simulate_monte_carlo
+
+
+@pytest.mark.parametrize("field,value", [
+    ("target_precision", "abc"), ("target_precision", "-1"), ("target_precision", "nan"),
+    ("iterations", "mil"), ("iterations", "0"),
+])
+def test_simulate_rejects_invalid_numbers(app, client, field, value):
+    seed_projects(app, 1, reports=0)
+    data = {"iterations": "1000", "target_precision": "1", "max_seconds": "5", field: value}
+    response = client.post("/projects/1/simulate", data=data, headers={"Accept": "application/json"})
+    assert response.status_code == 400
+    assert field in response.json["message"]
+
+
+def test_simulate_flashes_invalid_max_seconds(app, client):
+    seed_projects(app, 1, reports=0)
+    response = client.post("/projects/1/simulate", data={"target_precision": "1", "max_seconds": "pronto"})
+    assert response.status_code == 302
+    assert "open_config=1" in response.location
+
+
+def test_target_precision_converges_with_zero_mean():
+    variables = [{"name": "x", "distribution": "normal", "params": {"mean": 0.0, "std": 1.0}}]
+    results = simulate_monte_carlo(variables, iterations=500_000, seed=3, target_precision=0.05,
+                                   render_charts=False)
+    assert results["summary"]["stop_reason"] == "precision"
+    assert results["summary"]["sample_count"] < 500_000
+
+
+class _Job:
+    id = "job"
+
+    def to_dict(self):
+        return {"id": self.id}
+
+
+@pytest.mark.parametrize("seed", ["abc", "-1", "1.5"])
+def test_sweep_rejects_invalid_seed(app, client, seed):
+    seed_projects(app, 1, reports=0)
+    payload = {"grid": [{"variable": "v0", "param": "mean", "factors": [1.5]}], "seed": seed}
+    response = client.post("/projects/1/sweep", json=payload, headers={"Accept": "application/json"})
+    assert response.status_code == 400
+    assert "semilla" in response.json["message"]
+
+
+def test_sweep_seed_zero_is_reproducible(app, client, monkeypatch):
+    import app as app_module
+
+    submitted = []
+    monkeypatch.setattr(app_module.simulation_queue, "submit", lambda *a, **kw: submitted.append(kw) or _Job())
+    seed_projects(app, 1, reports=0)
+    payload = {"grid": [{"variable": "v0", "param": "mean", "factors": [1.5]}], "seed": 0}
+    response = client.post("/projects/1/sweep", json=payload, headers={"Accept": "application/json"})
+    assert response.status_code == 202
+    assert submitted[0]["seed"] == 0
+    assert submitted[0]["cache_key"] is not None
+
+
+def test_simulate_normalizes_seed(app, client, monkeypatch):
+    import app as app_module
+
+    submitted = []
+    monkeypatch.setattr(app_module.simulation_queue, "submit", lambda *a, **kw: submitted.append(kw) or _Job())
+    seed_projects(app, 1, reports=0)
+    for seed in ("7", "07", " 7 "):
+        response = client.post("/projects/1/simulate", data={"iterations": "1000", "seed": seed},
+                               headers={"Accept": "application/json"})
+        assert response.status_code == 202
+    # La misma ejecución comparte semilla y entrada de caché
+    assert [kw["seed"] for kw in submitted] == [7, 7, 7]
+    assert len({kw["cache_key"] for kw in submitted}) == 1
+
+
+def test_batch_rejects_invalid_seed(app, client):
+    seed_projects(app, 1, reports=0)
+    response = client.post("/api/simulations/batch", json={"items": [{"project_id": 1, "seed": "abc"}]})
+    line = json.loads(response.data.decode().splitlines()[0])
+    assert line["status"] == "failed" and "semilla" in line["error"]
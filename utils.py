@@ -1,152 +1,475 @@
 import numpy as np
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
 import base64
 import io
-from statistics import mean, stdev, variance
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+from formulas import compile_outputs
+from sensitivity import SOBOL_SAMPLES, analyze, total_model
+from columns import ColumnStore
+from engine import (ADAPTIVE_BATCH, CHUNK_SIZE, INCREMENTAL_SAMPLING, QMC_REPLICATES, SAMPLING_METHODS,
+                    create_sample_file, simulate_incremental, simulate_partial, simulate_scenarios, split_iterations,
+                    truncate_sample_file)
 
-def simulate_monte_carlo(variables, iterations=1000, seed=None):
+logger = logging.getLogger(__name__)
+
+
+def simulate_monte_carlo(variables, iterations=1000, seed=None, chunk_size=CHUNK_SIZE,
+                         progress=None, deadline=None, workers=1, sampling="random",
+                         target_precision=None, max_seconds=None, batch_size=ADAPTIVE_BATCH,
+                         render_charts=True, samples_path=None, sensitivity=False, sobol_samples=SOBOL_SAMPLES,
+                         correlation=None, outputs=None, scenarios=None, incremental=False, columns_dir=None,
+                         columns_max_bytes=2 * 1024 ** 3):
     """variables: list of dicts with keys: name, distribution, params
     returns: dict with summary metrics and sample array
+
+    Samples are drawn in blocks of ``chunk_size`` and folded into streaming
+    accumulators, so peak memory does not depend on ``iterations``.
+    ``progress(fraction)`` is called as work completes; ``deadline`` is an
+    epoch timestamp after which the run aborts with TimeoutError.
+
+    With ``workers > 1`` the iterations are split across worker processes,
+    each with its own Generator spawned from ``SeedSequence(seed)``; results
+    are reproducible for a given seed and worker count.
+
+    ``sampling`` selects the strategy (see engine.SAMPLING_METHODS): plain
+    pseudo-random, Latin Hypercube, scrambled Sobol or antithetic pairs.
+    The achieved standard error of the mean is reported as ``std_error``.
+
+    When ``target_precision`` (relative error, e.g. 0.01) is given the run
+    is adaptive: batches of ``batch_size`` are drawn until the 95% confidence
+    intervals of the mean, p5 and p95 are within the target, or until
+    ``iterations`` or ``max_seconds`` run out. ``sample_count`` and
+    ``stop_reason`` report what actually happened.
+
+    The 30-bin histogram is returned as ``histogram`` (counts/edges); with
+    ``render_charts=False`` no PNG is rasterized and clients draw the bins.
+
+    With ``samples_path`` every per-variable sample and the total are written
+    to a float32 ``.npy`` file (one row per column, memory-mappable) and
+    described in ``samples`` (path, columns, count).
+
+    ``sensitivity`` adds per-variable Pearson/Spearman correlations with the
+    total, contribution to variance and Sobol indices (``sobol_samples`` base
+    rows), reusing the sampled matrix, plus a tornado chart.
+
+    ``correlation`` ({"method", "lower", ...}, see correlation.py) samples the
+    variables with the given dependence, via Gaussian copula or Iman-Conover.
+
+    ``outputs`` ([{"name", "expression"}], see formulas.py) replaces the sum of
+    the variables with user formulas. The first one is the main output
+    (``summary``, charts, sensitivity, adaptive stop); every other output gets
+    its own summary and histogram in ``outputs``.
+
+    ``scenarios`` (list of ``{"label", "overrides": {variable: {param: value}}}``)
+    runs a parameter sweep instead, see ``simulate_sweep``.
+
+    ``incremental`` samples each variable from its own stream (seeded by
+    ``seed`` and the variable ``id``) and keeps its column in ``columns_dir``,
+    so a re-run only resamples the variables that changed and derives the
+    total from the previous one; ``columns`` reports what was reused. It
+    needs a seed, fixed iterations, no correlation and random/LHS/antithetic
+    sampling; otherwise the run is a normal one. ``workers`` is ignored.
+
+    ``timings`` reports seconds per stage (sampling, evaluation, aggregation
+    summed over workers; charts, sensitivity and the wall-clock total).
     """
-    if seed is not None:
-        np.random.seed(int(seed))
-
-    # create a DataFrame of results for each iteration
-    data = {}
-    for var in variables:
-        dist = var.get("distribution", "Normal")
-        params = var.get("params") or {}
-        if dist == "Normal":
-            mu = float(params.get("mean", 50))
-            sigma = float(params.get("std", 15))
-            samples = np.random.normal(loc=mu, scale=sigma, size=iterations)
-        elif dist == "Uniform":
-            low = float(params.get("low", 0))
-            high = float(params.get("high", 100))
-            samples = np.random.uniform(low=low, high=high, size=iterations)
-        elif dist == "Triangular":
-            left = float(params.get("left", 10))
-            mode = float(params.get("mode", 50))
-            right = float(params.get("right", 90))
-            samples = np.random.triangular(left, mode, right, size=iterations)
-        else:
-            # fallback to uniform
-            samples = np.random.uniform(0, 1, size=iterations)
+    iterations = int(iterations)
+    if iterations < 1:
+        raise ValueError("El número de iteraciones debe ser mayor que 0")
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Método de muestreo desconocido: {sampling}")
+
+    if scenarios:
+        return simulate_sweep(variables, scenarios, iterations, seed, chunk_size, progress, deadline, workers,
+                              sampling, render_charts, correlation, outputs)
+
+    started = time.perf_counter()
+    # Valida y compila las fórmulas antes de lanzar workers
+    formulas = compile_outputs(outputs, variables)
+    if samples_path:
+        create_sample_file(samples_path, len(variables) + len(formulas), iterations)
+
+    root = np.random.SeedSequence(int(seed) if seed is not None else None)
+    columns = None
+    if incremental and _incremental_supported(variables, seed, sampling, target_precision, correlation):
+        replicates = min(QMC_REPLICATES, iterations) if sampling == "lhs" else 1
+        result = simulate_incremental(variables, iterations, int(seed), ColumnStore(columns_dir, columns_max_bytes),
+                                      chunk_size, progress, deadline, sampling, replicates,
+                                      (samples_path, 0) if samples_path else None, sensitivity, outputs)
+        stop_reason, columns = "fixed", result.columns
+    elif target_precision:
+        result, stop_reason = _run_adaptive(variables, iterations, root, chunk_size, progress, deadline,
+                                            sampling, float(target_precision), max_seconds, batch_size,
+                                            samples_path, sensitivity, correlation, outputs)
+    else:
+        result = _run_fixed(variables, iterations, root, chunk_size, progress, deadline, workers, sampling,
+                            samples_path, sensitivity, correlation, outputs)
+        stop_reason = "fixed"
+
+    samples = None
+    if samples_path:
+        count = int(result.stats.count)
+        truncate_sample_file(samples_path, count)
+        samples = {"path": samples_path, "count": count,
+                   "columns": [var.get("name") for var in variables] + [name for name, _ in formulas]}
 
-        data[var.get("name")] = samples
+    summary, histogram = _summarize(result, sampling, stop_reason, target_precision)
+    summary.update(_output_info(*formulas[0]))
+    timings = dict(result.timings)
+    # El PNG (opcional) se dibuja a partir de los bins ya calculados
+    mark = time.perf_counter()
+    charts = generate_charts(histogram=(histogram["counts"], histogram["edges"])) if render_charts else {}
+    timings["charts"] = time.perf_counter() - mark
 
-    df = pd.DataFrame(data)
+    analysis = None
+    if sensitivity and result.comoments is not None:
+        mark = time.perf_counter()
+        # Semilla propia para el diseño de Saltelli: no altera las muestras anteriores
+        analysis = analyze(variables, result, root.spawn(1)[0], int(sobol_samples), formulas[0][1] or total_model,
+                           correlation)
+        timings["sensitivity"] = time.perf_counter() - mark
+        if render_charts:
+            mark = time.perf_counter()
+            charts["tornado"] = base64.b64encode(render_tornado_png(analysis)).decode()
+            timings["charts"] += time.perf_counter() - mark
 
-    # Example combined metric: sum across variables per iteration
-    df["_total"] = df.sum(axis=1)
+    extra = []
+    for (name, formula), partial in zip(formulas[1:], result.outputs):
+        output_summary, output_histogram = _summarize(partial, sampling, stop_reason, target_precision)
+        output_summary.update(_output_info(name, formula))
+        extra.append({"name": name, "summary": output_summary, "histogram": output_histogram})
 
-    total = df["_total"].values
+    return {"summary": summary, "samples_preview": result.preview, "histogram": histogram, "charts": charts,
+            "samples": samples, "sensitivity": analysis, "outputs": extra, "columns": columns,
+            "timings": dict(timings, total=time.perf_counter() - started)}
+
+
+def simulate_sweep(variables, scenarios, iterations=1000, seed=None, chunk_size=CHUNK_SIZE, progress=None,
+                   deadline=None, workers=1, sampling="random", render_charts=True, correlation=None,
+                   outputs=None):
+    """Ejecuta una rejilla de escenarios en una sola pasada con números aleatorios comunes.
+
+    Devuelve el formato de ``simulate_monte_carlo`` para el primer escenario (el
+    base) más ``scenarios``: etiqueta, parámetros cambiados, resumen e histograma
+    de cada uno. Siempre con iteraciones fijas y sin sensibilidad ni muestras.
+    """
+    iterations = int(iterations)
+    if iterations < 1:
+        raise ValueError("El número de iteraciones debe ser mayor que 0")
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Método de muestreo desconocido: {sampling}")
+    started = time.perf_counter()
+    formulas = compile_outputs(outputs, variables)
+    overrides = [scenario.get("overrides") or {} for scenario in scenarios]
+
+    root = np.random.SeedSequence(int(seed) if seed is not None else None)
+    replicates, jobs, children = _split_work(iterations, root, chunk_size, workers, sampling)
+    if len(jobs) == 1:
+        partials = [simulate_scenarios(variables, overrides, iterations, children[0], chunk_size, progress,
+                                       deadline, sampling, replicates, correlation, outputs)]
+    else:
+        partials = _run_pool(simulate_scenarios, jobs, children, iterations, progress, variables, overrides,
+                             chunk_size=chunk_size, deadline=deadline, sampling=sampling, correlation=correlation,
+                             outputs=outputs)
+    # Fusión por escenario, en orden fijo de worker
+    merged = partials[0]
+    for partial in partials[1:]:
+        for mine, theirs in zip(merged, partial):
+            mine.merge(theirs)
+
+    results = []
+    for scenario, result in zip(scenarios, merged):
+        summary, histogram = _summarize(result, sampling, "fixed", None)
+        summary.update(_output_info(*formulas[0]))
+        extra = []
+        for (name, formula), partial in zip(formulas[1:], result.outputs):
+            output_summary, output_histogram = _summarize(partial, sampling, "fixed", None)
+            output_summary.update(_output_info(name, formula))
+            extra.append({"name": name, "summary": output_summary, "histogram": output_histogram})
+        results.append({"label": scenario.get("label"), "overrides": scenario.get("overrides") or {},
+                        "summary": summary, "histogram": histogram, "outputs": extra})
+
+    base = results[0]
+    timings = dict(merged[0].timings)
+    charts = {}
+    if render_charts:
+        mark = time.perf_counter()
+        charts = generate_charts(histogram=(base["histogram"]["counts"], base["histogram"]["edges"]))
+        timings["charts"] = time.perf_counter() - mark
+    return {"summary": base["summary"], "samples_preview": merged[0].preview, "histogram": base["histogram"],
+            "charts": charts, "samples": None, "sensitivity": None, "outputs": base["outputs"],
+            "scenarios": results, "timings": dict(timings, total=time.perf_counter() - started)}
+
+
+def _incremental_supported(variables, seed, sampling, target_precision, correlation):
+    # Columnas independientes por variable: sin correlación (muestreo conjunto) ni Sobol
+    return (seed is not None and not target_precision and correlation is None
+            and sampling in INCREMENTAL_SAMPLING and bool(variables)
+            and all(var.get("id") is not None for var in variables))
+
+
+def _output_info(name, formula):
+    return {"output": name, "expression": formula.expression if formula is not None else None}
+
+
+def _summarize(result, sampling, stop_reason, target_precision):
+    """Resumen e histograma de 30 bins de una salida a partir de sus acumuladores."""
+    stats, digest = result.stats, result.digest
+    p5, p25, p50, p75, p95 = (float(v) for v in digest.quantile([0.05, 0.25, 0.50, 0.75, 0.95]))
     summary = {
-        "mean": float(np.mean(total)),
-        "std": float(np.std(total, ddof=1)),
-        "variance": float(np.var(total, ddof=1)),
-        "min": float(np.min(total)),
-        "max": float(np.max(total)),
-        "percentiles": {
-            "p5": float(np.percentile(total, 5)),
-            "p25": float(np.percentile(total, 25)),
-            "p50": float(np.percentile(total, 50)),
-            "p75": float(np.percentile(total, 75)),
-            "p95": float(np.percentile(total, 95)),
-        },
-        "sample_count": int(iterations),
+        "mean": float(stats.mean),
+        "std": float(stats.std),
+        "variance": float(stats.variance),
+        "min": float(stats.min),
+        "max": float(stats.max),
+        "percentiles": {"p5": p5, "p25": p25, "p50": p50, "p75": p75, "p95": p95},
+        "sample_count": int(stats.count),
+        "sampling": sampling,
+        "std_error": float(result.standard_error(sampling)),
+        "stop_reason": stop_reason,
+        "relative_error": result.relative_error(sampling),
+        "target_precision": float(target_precision) if target_precision else None,
+        # Percentiles individuales
+        "percentile_5": p5,
+        "percentile_95": p95,
+        "median": p50,
     }
+    counts, edges = digest.histogram(30)
+    return summary, {"counts": counts.tolist(), "edges": edges.tolist()}
+
+
+def _split_work(iterations, root, chunk_size, workers, sampling):
+    """Reparte el trabajo en ``(iteraciones, réplicas)`` por worker, cada uno con su semilla."""
+    # LHS y Sobol se ejecutan en réplicas independientes; el resto en bloques
+    replicates = min(QMC_REPLICATES, iterations) if sampling in ("lhs", "sobol") else 1
+    units = replicates if replicates > 1 else -(-iterations // chunk_size)
+    # No tiene sentido usar más procesos que réplicas o bloques
+    workers = max(1, min(int(workers or 1), units))
+    children = root.spawn(workers)
+
+    if replicates > 1:
+        replicate_sizes = split_iterations(iterations, replicates)
+        per_worker = split_iterations(replicates, workers)
+        bounds = np.cumsum([0] + per_worker)
+        jobs = [(sum(replicate_sizes[bounds[i]:bounds[i + 1]]), per_worker[i]) for i in range(workers)]
+    else:
+        jobs = [(n, 1) for n in split_iterations(iterations, workers)]
+    return replicates, jobs, children
+
+
+def _run_pool(task, jobs, children, iterations, progress, *args, per_worker=None, **kwargs):
+    """Ejecuta ``task(*args, n, semilla, replicates=r, **kwargs)`` por worker en procesos spawn.
+
+    ``per_worker`` añade argumentos con nombre propios de cada worker.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(jobs), mp_context=ctx) as pool:
+        futures = [pool.submit(task, *args, n, child, replicates=reps, **kwargs,
+                               **(per_worker[i] if per_worker else {}))
+                   for i, ((n, reps), child) in enumerate(zip(jobs, children))]
+        completed = 0
+        for future, (n, _) in zip(futures, jobs):
+            future.result()
+            completed += n
+            if progress is not None:
+                progress(completed / iterations)
+        return [future.result() for future in futures]
+
+
+def _run_fixed(variables, iterations, root, chunk_size, progress, deadline, workers, sampling, samples_path=None,
+               sensitivity=False, correlation=None, outputs=None):
+    replicates, jobs, children = _split_work(iterations, root, chunk_size, workers, sampling)
+
+    # Cada worker escribe sus muestras en su propio tramo del archivo
+    offsets = np.cumsum([0] + [n for n, _ in jobs])[:-1]
+    files = [(samples_path, int(offset)) if samples_path else None for offset in offsets]
+
+    if len(jobs) == 1:
+        partials = [simulate_partial(variables, iterations, children[0], chunk_size, progress, deadline,
+                                     sampling, replicates, files[0], sensitivity, correlation, outputs)]
+    else:
+        partials = _run_pool(simulate_partial, jobs, children, iterations, progress, variables,
+                             per_worker=[{"sample_file": sample_file} for sample_file in files],
+                             chunk_size=chunk_size, deadline=deadline, sampling=sampling,
+                             sensitivity=sensitivity, correlation=correlation, outputs=outputs)
+
+    # Fusión en orden fijo de worker para que el resultado sea determinista
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
+
+
+def _run_adaptive(variables, max_iterations, root, chunk_size, progress, deadline, sampling,
+                  target_precision, max_seconds, batch_size, samples_path=None, sensitivity=False,
+                  correlation=None, outputs=None):
+    """Ejecuta lotes hasta alcanzar la precisión objetivo o agotar el presupuesto.
+
+    Cada lote usa su propia semilla derivada de `root` (y es una réplica
+    independiente en LHS/Sobol), así que el resultado es reproducible.
+    """
+    started = time.monotonic()
+    result = None
+    # Con LHS/Sobol el error estándar necesita al menos dos réplicas
+    min_batches = 2 if sampling in ("lhs", "sobol") else 1
+    batches = 0
+    while True:
+        done = int(result.stats.count) if result else 0
+        size = min(batch_size, max_iterations - done)
+        batch = simulate_partial(variables, size, root.spawn(1)[0], chunk_size, None, deadline, sampling, 1,
+                                 (samples_path, done) if samples_path else None, sensitivity, correlation, outputs)
+        if result is None:
+            result = batch
+        else:
+            result.merge(batch)
+        batches += 1
+
+        elapsed = time.monotonic() - started
+        if progress is not None:
+            fraction = result.stats.count / max_iterations
+            if max_seconds:
+                fraction = max(fraction, elapsed / max_seconds)
+            progress(min(fraction, 1.0))
+        # Todas las salidas deben alcanzar la precisión
+        error = max(partial.relative_error(sampling) for partial in (result, *result.outputs))
+        if batches >= min_batches and error <= target_precision:
+            return result, "precision"
+        if result.stats.count >= max_iterations:
+            return result, "max_iterations"
+        if max_seconds and elapsed >= max_seconds:
+            return result, "time_budget"
+
+
+def _figure(figsize):
+    # matplotlib solo se importa al dibujar: la web y el motor arrancan sin él
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _render_png(fig):
+    # Sin pyplot: la figura tiene su propio canvas Agg y no deja estado global
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _hist_bars(ax, counts, edges, **style):
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, edgecolor='black', **style)
 
-    # Generar gráficos
-    charts = generate_charts(total)
-    
-    # Actualizar summary con percentiles individuales
-    summary.update({
-        "percentile_5": summary["percentiles"]["p5"],
-        "percentile_95": summary["percentiles"]["p95"],
-        "median": summary["percentiles"]["p50"]
-    })
-    
-    return {"summary": summary, "samples_preview": total[:200].tolist(), "charts": charts}
-
-
-def generate_charts(data):
-    """Genera histograma y curva de densidad como imágenes base64"""
+
+def render_histogram_png(counts, edges):
+    """PNG (bytes) con histograma y densidad a partir de bins ya calculados."""
+    counts = np.asarray(counts, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    widths = np.diff(edges)
+    total = counts.sum()
+    density = counts / (total * widths) if total > 0 else counts
+
+    fig = _figure((12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Histograma
+    _hist_bars(ax1, counts, edges, color='skyblue')
+    ax1.set_title('Histograma de Resultados')
+    ax1.set_xlabel('Valor')
+    ax1.set_ylabel('Frecuencia')
+    ax1.grid(True, alpha=0.3)
+
+    # Densidad: mismos bins normalizados por área
+    _hist_bars(ax2, density, edges, color='lightgreen')
+    ax2.set_title('Distribución de Densidad')
+    ax2.set_xlabel('Valor')
+    ax2.set_ylabel('Densidad')
+    ax2.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    return _render_png(fig)
+
+
+def render_tornado_png(analysis):
+    """PNG (bytes) del diagrama de tornado: correlación de Spearman de cada variable."""
+    rows = [row for row in analysis["variables"] if row["spearman"] is not None][::-1]
+    fig = _figure((10, max(2.5, 0.4 * len(rows) + 1.5)))
+    ax = fig.subplots()
+    values = [row["spearman"] for row in rows]
+    ax.barh([row["name"] for row in rows], values, alpha=0.8, edgecolor='black',
+            color=['indianred' if value < 0 else 'steelblue' for value in values])
+    ax.axvline(0, color='black', linewidth=0.8)
+    ax.set_xlim(-1, 1)
+    ax.set_title('Sensibilidad (correlación de rangos con el resultado)')
+    ax.set_xlabel('ρ de Spearman')
+    ax.grid(True, axis='x', alpha=0.3)
+    fig.tight_layout()
+    return _render_png(fig)
+
+
+def histogram_bins(data=None, histogram=None, bins=30):
+    """(conteos, bordes) a partir de las muestras o de un histograma ya calculado."""
+    if histogram is not None:
+        return histogram
+    return np.histogram(np.asarray(data, dtype=np.float64), bins=bins)
+
+
+def generate_charts(data=None, histogram=None):
+    """Genera histograma y curva de densidad como imágenes base64
+
+    Acepta las muestras (`data`) o un histograma ya calculado
+    (`histogram` = (conteos, bordes)) como el que produce TDigest; en ambos
+    casos los bins se calculan una sola vez y los comparten los dos paneles.
+    """
     try:
-        plt.style.use('default')
-        
-        # Crear figura
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        
-        # Histograma
-        ax1.hist(data, bins=30, alpha=0.7, color='skyblue', edgecolor='black')
-        ax1.set_title('Histograma de Resultados')
-        ax1.set_xlabel('Valor')
-        ax1.set_ylabel('Frecuencia')
-        ax1.grid(True, alpha=0.3)
-        
-        # Curva de densidad (simplificada)
-        ax2.hist(data, bins=30, density=True, alpha=0.7, color='lightgreen', edgecolor='black')
-        ax2.set_title('Distribución de Densidad')
-        ax2.set_xlabel('Valor')
-        ax2.set_ylabel('Densidad')
-        ax2.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        chart_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
+        counts, edges = histogram_bins(data, histogram)
+        chart_base64 = base64.b64encode(render_histogram_png(counts, edges)).decode()
         return {"histogram_density": chart_base64}
     except Exception as e:
-        print(f"Error generando gráficos: {e}")
+        logger.warning("Error generando gráficos: %s", e)
         return {}
 
 
+def _normal_bins(mean, std, bins=30, count=1000):
+    # Conteos esperados de una normal en ±3σ (resultados sin bins guardados)
+    edges = np.linspace(mean - 3 * std, mean + 3 * std, bins + 1)
+    cdf = np.array([0.5 * (1 + math.erf((x - mean) / (std * math.sqrt(2)))) for x in edges])
+    return np.diff(cdf) * count, edges
+
+
 def generate_simple_chart(simulation_result):
     """Genera un gráfico simple basado en los resultados guardados"""
     try:
-        # Crear datos simulados basados en las estadísticas guardadas
         mean = float(simulation_result.mean_value or 0)
         std = float(simulation_result.std_dev or 1)
-        
-        # Generar datos de muestra para el gráfico
-        import numpy as np
-        data = np.random.normal(mean, std, 1000)
-        
-        # Crear gráfico simple
-        fig, ax = plt.subplots(1, 1, figsize=(10, 6))
-        ax.hist(data, bins=30, alpha=0.7, color='skyblue', edgecolor='black')
+
+        # Bins guardados con el resultado; sin ellos, la normal equivalente
+        histogram = simulation_result.histogram
+        if histogram is None:
+            histogram = _normal_bins(mean, std if std > 0 else 1)
+        counts, edges = histogram
+
+        fig = _figure((10, 6))
+        ax = fig.subplots()
+        _hist_bars(ax, counts, edges, color='skyblue')
         ax.set_title('Distribución de Resultados Monte Carlo')
         ax.set_xlabel('Valor')
         ax.set_ylabel('Frecuencia')
         ax.grid(True, alpha=0.3)
-        
+
         # Añadir líneas de estadísticas
         ax.axvline(mean, color='red', linestyle='--', label=f'Media: {mean:.2f}')
         ax.axvline(mean - std, color='orange', linestyle='--', alpha=0.7, label=f'-1σ: {mean-std:.2f}')
         ax.axvline(mean + std, color='orange', linestyle='--', alpha=0.7, label=f'+1σ: {mean+std:.2f}')
         ax.legend()
-        
-        plt.tight_layout()
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        chart_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
+
+        fig.tight_layout()
+        chart_base64 = base64.b64encode(_render_png(fig)).decode()
         return {"histogram_density": chart_base64}
     except Exception as e:
-        print(f"Error generando gráfico simple: {e}")
+        logger.warning("Error generando gráfico simple: %s", e)
         return {}